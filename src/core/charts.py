@@ -0,0 +1,57 @@
+"""Plotly charts drawn in the browser from compact JSON figure specs.
+
+The figures are built with plotly in Python but only their JSON spec is sent in the page, in a
+`data-plotly-figure` attribute drawn by `js/components/charts.js`. The plotly.js bundle is the
+`plotly/plotly.min.js` static file, found in the installed plotly package by `PlotlyFinder` so it
+always matches the specs version, and fingerprinted and cached by the browser like the other static files.
+"""
+
+import hashlib
+import json
+import os
+
+import plotly
+from django.contrib.staticfiles.finders import BaseFinder
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+
+CHART_CACHE_TIMEOUT = 60 * 60 * 24  # 1 day
+
+PLOTLY_JS_PREFIX = "plotly"
+PLOTLY_JS_NAME = "plotly.min.js"
+
+
+def get_chart_spec(name: str, data, build) -> str:
+    """Return the JSON spec of a chart, cached per chart and data hash.
+
+    Args:
+        name (str): The chart name, part of the cache key.
+        data: The JSON serializable data of the chart.
+        build: The function returning the plotly figure of the data.
+    """
+    data_hash = hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+    key = f"chart:{name}:{plotly.__version__}:{data_hash}"
+
+    spec = cache.get(key)
+    if spec is None:
+        spec = build(data).to_json()
+        cache.set(key, spec, timeout=CHART_CACHE_TIMEOUT)
+    return spec
+
+
+class PlotlyFinder(BaseFinder):
+    """Static files finder of the plotly.js bundle of the installed plotly package"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.storage = FileSystemStorage(location=os.path.join(os.path.dirname(plotly.__file__), "package_data"))
+        self.storage.prefix = PLOTLY_JS_PREFIX
+
+    def find(self, path, all=False):
+        if path != f"{PLOTLY_JS_PREFIX}/{PLOTLY_JS_NAME}":
+            return []
+        match = self.storage.path(PLOTLY_JS_NAME)
+        return [match] if all else match
+
+    def list(self, ignore_patterns):
+        yield PLOTLY_JS_NAME, self.storage
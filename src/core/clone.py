@@ -0,0 +1,55 @@
+"""Bulk copy of model trees.
+
+A tree (ex: a monthly report activities, locations and disaggregations) is copied level by level:
+each level is inserted with one `bulk_create` and returns the map of its old to new primary keys,
+which the next level uses to point its copies to the new parents.
+"""
+
+CLONE_BATCH_SIZE = 1000
+
+
+def bulk_clone(queryset, values: dict | None = None, parents: dict | None = None, m2m=(), batch_size=CLONE_BATCH_SIZE):
+    """Copy the rows of a queryset with `bulk_create` and return the map of their old to new primary keys.
+
+    Args:
+        queryset: The rows to copy.
+        values (dict): The fields values set on every copy, ex: `{"project": new_project}`.
+        parents (dict): The foreign keys to remap, as `{attname: {old id: new id}}` from the parent levels
+            copies. The rows whose parent was not copied are skipped.
+        m2m (list): The many-to-many fields to copy, with one insert in their through table.
+        batch_size (int): The number of rows per INSERT query.
+    """
+    values = values or {}
+    parents = parents or {}
+    model = queryset.model
+
+    old_pks = []
+    copies = []
+    for obj in queryset.order_by("pk"):
+        if any(getattr(obj, attname) not in mapping for attname, mapping in parents.items()):
+            continue
+
+        old_pks.append(obj.pk)
+        for attname, mapping in parents.items():
+            setattr(obj, attname, mapping[getattr(obj, attname)])
+        for field, value in values.items():
+            setattr(obj, field, value)
+        obj.pk = None
+        obj._state.adding = True
+        copies.append(obj)
+
+    model.objects.bulk_create(copies, batch_size=batch_size)
+    pks_map = {old_pk: obj.pk for old_pk, obj in zip(old_pks, copies)}
+
+    for name in m2m:
+        field = model._meta.get_field(name)
+        through = field.remote_field.through
+        source = f"{field.m2m_field_name()}_id"
+        target = f"{field.m2m_reverse_field_name()}_id"
+        rows = through.objects.filter(**{f"{source}__in": old_pks}).values_list(source, target)
+        through.objects.bulk_create(
+            [through(**{source: pks_map[source_id], target: target_id}) for source_id, target_id in rows],
+            batch_size=batch_size,
+        )
+
+    return pks_map
@@ -0,0 +1,240 @@
+"""Application metrics exposed in the Prometheus text format.
+
+`core.middleware.InstrumentationMiddleware` records the latency, the SQL queries count and time and
+the response size of every request, labelled by the resolved URL name. Each gunicorn worker keeps its
+metrics in memory and writes them to a JSON file in `METRICS_DIR` every `METRICS_FLUSH_INTERVAL`
+seconds. The `/metrics` endpoint merges the files of all the workers. The files of the dead workers
+are added to the archive file and deleted, so the counters never go down.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS_FLUSH_INTERVAL = 5  # seconds
+
+METRICS_PREFIX = "rh_http"
+
+DURATION_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+QUERIES_BUCKETS = [1, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+# Counters per (view, method, status)
+COUNTERS = {
+    "requests_total": "Total number of requests.",
+    "request_db_queries_total": "Total number of SQL queries run by the requests.",
+    "request_db_duration_seconds_total": "Total time spent in SQL queries by the requests.",
+    "response_size_bytes_total": "Total size of the responses bodies.",
+    "query_budget_exceeded_total": "Number of requests that ran more SQL queries than the view budget.",
+}
+
+# Histograms per view
+HISTOGRAMS = {
+    "request_duration_seconds": ("Requests latency.", DURATION_BUCKETS),
+    "request_db_queries": ("SQL queries per request.", QUERIES_BUCKETS),
+}
+
+METRICS_ARCHIVE_FILE = "archive.json"
+
+_lock = threading.Lock()
+_metrics = {"counters": defaultdict(float), "histograms": {}}
+_last_flush = 0.0
+# (pid, start time) of this worker, a reused pid does not overwrite the file of a dead worker
+_worker = (None, None)
+
+
+def _empty_histogram(buckets):
+    return {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+
+
+def _observe(name, view, value):
+    buckets = HISTOGRAMS[name][1]
+    key = json.dumps([name, view])
+    histogram = _metrics["histograms"].setdefault(key, _empty_histogram(buckets))
+    for idx, bound in enumerate(buckets):
+        if value <= bound:
+            histogram["buckets"][idx] += 1
+    histogram["sum"] += value
+    histogram["count"] += 1
+
+
+def record_request(view, method, status, duration, queries, db_duration, size, over_budget=False):
+    """Record the metrics of a request and write them to the worker file from time to time"""
+    labels = [view, method, str(status)]
+    with _lock:
+        counters = _metrics["counters"]
+        counters[json.dumps(["requests_total", *labels])] += 1
+        counters[json.dumps(["request_db_queries_total", *labels])] += queries
+        counters[json.dumps(["request_db_duration_seconds_total", *labels])] += db_duration
+        counters[json.dumps(["response_size_bytes_total", *labels])] += size
+        if over_budget:
+            counters[json.dumps(["query_budget_exceeded_total", *labels])] += 1
+
+        _observe("request_duration_seconds", view, duration)
+        _observe("request_db_queries", view, queries)
+
+    if time.monotonic() - _last_flush > METRICS_FLUSH_INTERVAL:
+        flush_metrics()
+
+
+def _worker_file():
+    global _worker
+    if _worker[0] != os.getpid():
+        _worker = (os.getpid(), time.time_ns())
+    return os.path.join(settings.METRICS_DIR, f"worker-{_worker[0]}-{_worker[1]}.json")
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _write_json(path, data):
+    """Write a JSON file atomically"""
+    fd, tmp_path = tempfile.mkstemp(dir=settings.METRICS_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(metrics, data):
+    for key, value in data["counters"].items():
+        metrics["counters"][key] += value
+    for key, histogram in data["histograms"].items():
+        merged = metrics["histograms"].setdefault(key, _empty_histogram(histogram["buckets"]))
+        merged["buckets"] = [a + b for a, b in zip(merged["buckets"], histogram["buckets"])]
+        merged["sum"] += histogram["sum"]
+        merged["count"] += histogram["count"]
+
+
+@contextmanager
+def _archive_lock(operation):
+    """Lock of the archive: one worker archives at a time, and no worker reads the files meanwhile"""
+    with open(os.path.join(settings.METRICS_DIR, "archive.lock"), "w") as lock:
+        fcntl.flock(lock, operation)
+        yield
+
+
+def archive_dead_workers():
+    """Add the metrics files of the dead workers to the archive file and delete them"""
+    dead_files = []
+    for file_name in os.listdir(settings.METRICS_DIR):
+        if file_name.startswith("worker-") and file_name.endswith(".json"):
+            pid = int(file_name.split("-")[1].split(".")[0])
+            if not _is_alive(pid):
+                dead_files.append(os.path.join(settings.METRICS_DIR, file_name))
+    if not dead_files:
+        return
+
+    with _archive_lock(fcntl.LOCK_EX):
+        archive_path = os.path.join(settings.METRICS_DIR, METRICS_ARCHIVE_FILE)
+        archive = {"counters": defaultdict(float), "histograms": {}}
+        _merge(archive, _read_json(archive_path) or {"counters": {}, "histograms": {}})
+        dead_files = [path for path in dead_files if os.path.exists(path)]
+        for path in dead_files:
+            data = _read_json(path)
+            if data is not None:
+                _merge(archive, data)
+
+        _write_json(archive_path, archive)
+        for path in dead_files:
+            os.remove(path)
+
+
+def flush_metrics():
+    """Write the metrics of this worker to its file, atomically"""
+    global _last_flush
+    _last_flush = time.monotonic()
+
+    with _lock:
+        data = json.dumps({"counters": _metrics["counters"], "histograms": _metrics["histograms"]})
+
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=settings.METRICS_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(data)
+    os.replace(path, _worker_file())
+
+
+def collect_metrics():
+    """Merge the metrics of all the workers, dead workers included"""
+    flush_metrics()
+    archive_dead_workers()
+
+    metrics = {"counters": defaultdict(float), "histograms": {}}
+    with _archive_lock(fcntl.LOCK_SH):
+        for file_name in os.listdir(settings.METRICS_DIR):
+            if file_name.endswith(".json"):
+                data = _read_json(os.path.join(settings.METRICS_DIR, file_name))
+                if data is not None:
+                    _merge(metrics, data)
+
+    return metrics["counters"], metrics["histograms"]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_metrics():
+    """Return the metrics in the Prometheus text format"""
+    counters, histograms = collect_metrics()
+
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {METRICS_PREFIX}_{name} {help_text}", f"# TYPE {METRICS_PREFIX}_{name} counter"]
+        for key, value in sorted(counters.items()):
+            metric, view, method, status = json.loads(key)
+            if metric == name:
+                labels = f'view="{_escape(view)}",method="{_escape(method)}",status="{_escape(status)}"'
+                lines.append(f"{METRICS_PREFIX}_{name}{{{labels}}} {value:g}")
+
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {METRICS_PREFIX}_{name} {help_text}", f"# TYPE {METRICS_PREFIX}_{name} histogram"]
+        for key, histogram in sorted(histograms.items()):
+            metric, view = json.loads(key)
+            if metric != name:
+                continue
+            view = _escape(view)
+            for bound, count in zip(buckets, histogram["buckets"]):
+                lines.append(f'{METRICS_PREFIX}_{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+            lines.append(f'{METRICS_PREFIX}_{name}_bucket{{view="{view}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{METRICS_PREFIX}_{name}_sum{{view="{view}"}} {histogram["sum"]:g}')
+            lines.append(f'{METRICS_PREFIX}_{name}_count{{view="{view}"}} {histogram["count"]}')
+
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, not exposed by nginx.
+    When `METRICS_TOKEN` is set, only the requests with the bearer token or of a superuser are allowed.
+    url: /metrics
+    """
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}" and not request.user.is_superuser:
+        raise PermissionDenied
+
+    return HttpResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)
@@ -1,9 +1,18 @@
+import logging
+import time
+
+from django.conf import settings
 from django.contrib.messages import get_messages
+from django.db import connection
 from django.shortcuts import redirect
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils.deprecation import MiddlewareMixin
-from extra_settings.models import Setting
+
+from .metrics import record_request
+from .settings_snapshot import get_setting
+
+logger = logging.getLogger(__name__)
 
 
 class HtmxMessageMiddleware(MiddlewareMixin):
@@ -29,7 +38,7 @@ class MaintenanceModeMiddleware:
     def __call__(self, request):
         path = request.META.get("PATH_INFO", "")
 
-        if not Setting.get("MAINTENANCE_MODE_ENABLED", default=False):
+        if not get_setting("MAINTENANCE_MODE_ENABLED", default=False):
             if path == reverse("maintenance"):
                 # Do not load maintenance page if maintenance mode is not enabled
                 return redirect("/")
@@ -40,19 +49,70 @@ class MaintenanceModeMiddleware:
         if path == reverse("maintenance"):
             return self.get_response(request)
 
-        if Setting.get("MAINTENANCE_MODE_IGNORE_SUPERUSER", default=True) and request.user.is_superuser:
+        if get_setting("MAINTENANCE_MODE_IGNORE_SUPERUSER", default=True) and request.user.is_superuser:
             return self.get_response(request)
 
-        if Setting.get("MAINTENANCE_MODE_IGNORE_STAFF", default=True) and request.user.is_staff:
+        if get_setting("MAINTENANCE_MODE_IGNORE_STAFF", default=True) and request.user.is_staff:
             return self.get_response(request)
 
         query = request.META.get("QUERY_STRING", "")
-        if Setting.get("MAINTENANCE_BYPASS_QUERY", default="godmode") in query:
+        if get_setting("MAINTENANCE_BYPASS_QUERY", default="godmode") in query:
             request.session["bypass_maintenance"] = True
 
         if request.session.get("bypass_maintenance", False):
             # Bypass the maintenance mode: continue normally bypass is correct
             return self.get_response(request)
 
-        redirect_to_url = Setting.get("MAINTENANCE_MODE_REDIRECT_ROUTE", default="maintenance")
+        redirect_to_url = get_setting("MAINTENANCE_MODE_REDIRECT_ROUTE", default="maintenance")
         return redirect(reverse(redirect_to_url))
+
+
+class InstrumentationMiddleware:
+    """Record the latency, the SQL queries and the response size of the requests for `/metrics`.
+
+    A warning is logged when a view runs more SQL queries than its `QUERY_BUDGETS` entry.
+    The queries run while a streaming response is consumed are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = {"count": 0, "duration": 0.0}
+
+        def count_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries["count"] += 1
+                queries["duration"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        view = request.resolver_match.view_name if request.resolver_match else "unresolved"
+        budget = settings.QUERY_BUDGETS.get(view, settings.QUERY_BUDGET_DEFAULT)
+        over_budget = budget is not None and queries["count"] > budget
+        if over_budget:
+            logger.warning(
+                "Query budget exceeded: %s ran %s SQL queries (budget %s) for %s",
+                view,
+                queries["count"],
+                budget,
+                request.get_full_path(),
+            )
+
+        record_request(
+            view,
+            request.method,
+            response.status_code,
+            duration,
+            queries["count"],
+            queries["duration"],
+            0 if response.streaming else len(response.content),
+            over_budget=over_budget,
+        )
+        return response
@@ -0,0 +1,164 @@
+"""List views pagination.
+
+The list views paginate with Django's `Paginator` by default, which runs a `COUNT(*)` of the
+filtered queryset and fetches the page with an OFFSET. When the `KEYSET_PAGINATION` setting is on,
+the lists are paginated on their `(updated_at, id)` keys instead: a page is fetched by seeking from
+the last row of the previous page, so deep pages cost the same as the first one and no count is run.
+Both paginators fill the `adjusted_elided_pages` used by the `components/_pagination.html` template.
+"""
+
+import base64
+import binascii
+import datetime
+import json
+from operator import attrgetter
+
+from django.core.paginator import Page, Paginator
+from django.db.models import F, Q
+
+from .settings_snapshot import get_setting
+
+
+def paginate(request, queryset, key: str = "updated_at", per_page=None, count: int | None = None):
+    """Return the requested page of the queryset for a list view.
+
+    Args:
+        request: The list request, with the `page` and `per_page` parameters.
+        queryset: The filtered queryset to paginate.
+        key (str): The keyset ordering field, the primary key is used as the tie-breaker.
+        per_page (int): The page size, the `per_page` parameter or `RECORDS_PER_PAGE` setting by default.
+        count (int): The total number of objects when it is already known, to skip the `COUNT(*)` query.
+    """
+    if per_page is None:
+        per_page = request.GET.get("per_page", get_setting("RECORDS_PER_PAGE", default=10))
+    page = request.GET.get("page", 1)
+
+    if get_setting("KEYSET_PAGINATION", default=False):
+        paginator = KeysetPaginator(queryset, per_page, key=key)
+    else:
+        paginator = Paginator(queryset, per_page=per_page)
+        if count is not None:
+            paginator.count = count
+
+    page_obj = paginator.get_page(page)
+    page_obj.adjusted_elided_pages = paginator.get_elided_page_range(page)
+    return page_obj
+
+
+class KeysetPaginator:
+    """Paginate a queryset from the newest to the oldest `key`, without OFFSET and COUNT(*) queries.
+
+    The `page` parameter is a cursor holding the keys of the first or last row of the current page,
+    the direction to seek in and the page number. The queryset ordering is replaced by the keyset one.
+    """
+
+    ELLIPSIS = Paginator.ELLIPSIS
+
+    # The pagination template does not show the total and the pages links of keyset pages
+    keyset = True
+    count = None
+
+    def __init__(self, object_list, per_page, key: str = "updated_at"):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.key = key
+        self.get_key = attrgetter(key.replace("__", "."))
+
+    def get_page(self, cursor):
+        """Return the page of the cursor, or the first page when the cursor is missing or invalid"""
+        direction, keys, number = self.decode_cursor(cursor)
+        backwards = direction == "previous"
+
+        queryset = self.object_list.order_by(*self.get_ordering(backwards))
+        if keys is not None:
+            queryset = queryset.filter(self.get_seek_filter(keys, backwards))
+
+        rows = list(queryset[: self.per_page + 1])
+        # The rows of the cursor were deleted or moved, start over from the first page
+        if not rows and keys is not None:
+            return self.get_page(None)
+
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+
+        if backwards:
+            rows.reverse()
+            # Rows were deleted since the cursor was made, this is the first page now
+            if not has_more:
+                number = 1
+            return KeysetPage(rows, number, self, has_previous=has_more, has_next=True)
+
+        return KeysetPage(rows, number, self, has_previous=keys is not None, has_next=has_more)
+
+    def get_elided_page_range(self, cursor):
+        return []
+
+    def get_ordering(self, backwards: bool):
+        if backwards:
+            return [F(self.key).asc(nulls_first=True), "pk"]
+        return [F(self.key).desc(nulls_last=True), "-pk"]
+
+    def get_seek_filter(self, keys, backwards: bool) -> Q:
+        """Filter the rows after (or before) the `keys` in the keyset ordering"""
+        value, pk = keys
+        if backwards:
+            if value is None:
+                return Q(**{f"{self.key}__isnull": True, "pk__gt": pk}) | Q(**{f"{self.key}__isnull": False})
+            return Q(**{f"{self.key}__gt": value}) | Q(**{self.key: value, "pk__gt": pk})
+
+        if value is None:
+            return Q(**{f"{self.key}__isnull": True, "pk__lt": pk})
+        return (
+            Q(**{f"{self.key}__lt": value}) | Q(**{self.key: value, "pk__lt": pk}) | Q(**{f"{self.key}__isnull": True})
+        )
+
+    def encode_cursor(self, direction: str, obj, number: int) -> str:
+        value = self.get_key(obj)
+        if isinstance(value, datetime.datetime | datetime.date):
+            value = value.isoformat()
+        data = json.dumps({"d": direction, "k": [value, obj.pk], "n": number}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(str(cursor) + "=" * (-len(str(cursor)) % 4)))
+            direction = data["d"]
+            value, pk = data["k"]
+            number = int(data["n"])
+            if direction not in ["next", "previous"] or number < 1:
+                raise ValueError
+            if isinstance(value, str):
+                value = datetime.datetime.fromisoformat(value)
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError, KeyError):
+            return "next", None, 1
+
+        return direction, (value, pk), number
+
+
+class KeysetPage(Page):
+    """A keyset page, the previous and next "page numbers" are the cursors of the neighbour pages"""
+
+    def __init__(self, object_list, number, paginator, has_previous: bool, has_next: bool):
+        super().__init__(object_list, number, paginator)
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_page_number(self):
+        return self.paginator.encode_cursor("next", self.object_list[-1], self.number + 1)
+
+    def previous_page_number(self):
+        return self.paginator.encode_cursor("previous", self.object_list[0], self.number - 1)
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
@@ -1,5 +1,6 @@
 import os
 import sys
+import tempfile
 from pathlib import Path
 
 import environ
@@ -46,11 +47,13 @@ INSTALLED_APPS = [
 USE_DJANGO_JQUERY = True
 
 MIDDLEWARE = [
+    "core.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "users.middleware.AuthContextMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django_htmx.middleware.HtmxMiddleware",
@@ -83,7 +86,7 @@ DATA_UPLOAD_MAX_NUMBER_FIELDS = 50240
 
 
 AUTHENTICATION_BACKENDS = [
-    "django.contrib.auth.backends.ModelBackend",
+    "users.backends.ProfileBackend",
     "users.backends.EmailBackend",
 ]
 
@@ -111,6 +114,8 @@ USE_TZ = True
 STATICFILES_FINDERS = [
     "django.contrib.staticfiles.finders.FileSystemFinder",
     "django.contrib.staticfiles.finders.AppDirectoriesFinder",
+    # plotly.js bundle of the installed plotly package
+    "core.charts.PlotlyFinder",
 ]
 
 
@@ -180,8 +185,23 @@ EXTRA_SETTINGS_DEFAULTS = [
         "value": 10,
         "description": "No of items in a paginated results.",
     },
+    {
+        "name": "KEYSET_PAGINATION",
+        "type": "bool",
+        "value": False,
+        "description": "if True the large lists are paginated on (updated_at, id) without counting the results.",
+    },
 ]
 
+# Application metrics scraped by Prometheus on /metrics
+METRICS_DIR = env("METRICS_DIR", default=os.path.join(tempfile.gettempdir(), "rh-metrics"))
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
+# Log a warning when a view runs more SQL queries than its budget, by URL name.
+# ex: {"projects-list": 20}
+QUERY_BUDGETS = {}
+QUERY_BUDGET_DEFAULT = env.int("QUERY_BUDGET_DEFAULT", default=None)
+
 # MDEditor
 X_FRAME_OPTIONS = "SAMEORIGIN"
 MEDIA_URL = "/media/"
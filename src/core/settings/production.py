@@ -20,6 +20,8 @@ SECURE_HSTS_INCLUDE_SUBDOMAINS = env("SECURE_HSTS_INCLUDE_SUBDOMAINS", default=T
 SESSION_COOKIE_SECURE = env("SESSION_COOKIE_SECURE", default=True)
 CSRF_COOKIE_SECURE = env("CSRF_COOKIE_SECURE", default=True)
 SECURE_SSL_REDIRECT = env("SECURE_SSL_REDIRECT", default=True)
+# Prometheus scrapes the django container over plain HTTP
+SECURE_REDIRECT_EXEMPT = [r"^metrics$"]
 CSRF_TRUSTED_ORIGINS = env(
     "CSRF_TRUSTED_ORIGINS", default=["http://localhost", "https://localhost", "https://127.0.0.1", "http://127.0.0.1"]
 )
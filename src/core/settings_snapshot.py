@@ -0,0 +1,57 @@
+"""In-process snapshot of the extra settings.
+
+`Setting.get` reads the settings from the cache, or from the database when the cache is empty or
+disabled, on every call. The snapshot loads every setting in one query and serves them from the
+process memory. After `SETTINGS_SNAPSHOT_TTL` seconds the snapshot checks the settings version in
+the shared cache and reloads when a setting was saved or deleted since it was loaded, or when the
+snapshot is older than `SETTINGS_SNAPSHOT_MAX_AGE` in case the version was lost.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from extra_settings.models import Setting
+
+SETTINGS_SNAPSHOT_TTL = 30  # seconds
+
+SETTINGS_SNAPSHOT_MAX_AGE = 60 * 10  # 10 minutes
+
+SETTINGS_SNAPSHOT_VERSION_KEY = "settings_snapshot_version"
+
+_snapshot = {"version": None, "loaded_at": None, "checked_at": None, "values": {}}
+
+
+def _load_snapshot(version, now):
+    _snapshot["values"] = {setting.name: setting.value for setting in Setting.objects.all()}
+    _snapshot["version"] = version
+    _snapshot["loaded_at"] = now
+
+
+def get_setting(name: str, default=None):
+    """Return the value of an extra setting, like `Setting.get`"""
+    now = time.monotonic()
+    if _snapshot["checked_at"] is None or now - _snapshot["checked_at"] > SETTINGS_SNAPSHOT_TTL:
+        version = cache.get(SETTINGS_SNAPSHOT_VERSION_KEY, 0)
+        if (
+            _snapshot["checked_at"] is None
+            or version != _snapshot["version"]
+            or now - _snapshot["loaded_at"] > SETTINGS_SNAPSHOT_MAX_AGE
+        ):
+            _load_snapshot(version, now)
+        _snapshot["checked_at"] = now
+
+    return _snapshot["values"].get(name, default)
+
+
+def invalidate_settings_snapshot():
+    """Reload the settings in every process"""
+    cache.set(SETTINGS_SNAPSHOT_VERSION_KEY, time.time_ns(), timeout=None)
+    _snapshot["checked_at"] = None
+
+
+@receiver(post_save, sender=Setting)
+@receiver(post_delete, sender=Setting)
+def post_change_setting(sender, instance, **kwargs):
+    invalidate_settings_snapshot()
@@ -4,6 +4,8 @@ from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import TemplateView
 
+from .metrics import metrics_view
+
 admin.site.site_header = f"{settings.APP_NAME} Admin"
 admin.site.site_title = settings.APP_NAME
 
@@ -14,6 +16,7 @@ urlpatterns = [
     path("", include("project_reports.urls")),
     path("", include("guides.urls")),
     path("maintenance/", TemplateView.as_view(template_name="maintenance.html"), name="maintenance"),
+    path("metrics", metrics_view, name="metrics"),
     path("admin/", admin.site.urls),
     path(r"mdeditor/", include("mdeditor.urls")),
 ]
@@ -0,0 +1,77 @@
+"""Excel export writer built on openpyxl write-only worksheets.
+
+Rows are streamed to the file as they are appended, so the memory used does not grow with the
+number of rows. A write-only workbook can only be saved once and its rows must be written in order.
+"""
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Rows written between two calls of the progress callback
+XLSX_PROGRESS_STEP = 500
+
+header_font = Font(bold=True)
+
+
+def create_workbook() -> Workbook:
+    """Returns a new write-only workbook"""
+    return Workbook(write_only=True)
+
+
+def clean_value(value):
+    """Remove the characters not allowed in Excel files from a string value"""
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS_RE.sub("", value)
+    return value
+
+
+def write_sheet(workbook: Workbook, title: str, columns: list, rows=(), progress=None, freeze_header=True):
+    """Write a sheet with a styled header row and the column widths and formats.
+
+    Args:
+        workbook (Workbook): A write-only workbook.
+        title (str): The sheet title.
+        columns (list): The columns as dicts with `header`, `type` and `width` keys.
+        rows (iterable): The rows values, consumed lazily.
+        progress (callable): Called with the number of rows written every `XLSX_PROGRESS_STEP` rows.
+        freeze_header (bool): Keep the header row visible while scrolling.
+    """
+    sheet = workbook.create_sheet(title)
+
+    # Columns dimensions must be set before the first row is written
+    for idx, column in enumerate(columns, start=1):
+        column_letter = get_column_letter(idx)
+        if column["type"] == "number":
+            sheet.column_dimensions[column_letter].number_format = "General"
+        elif column["type"] == "date":
+            sheet.column_dimensions[column_letter].number_format = "mm-dd-yyyy"
+
+        sheet.column_dimensions[column_letter].width = column["width"]
+
+    if freeze_header:
+        sheet.freeze_panes = "A2"
+
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=column["header"])
+        cell.font = header_font
+        header.append(cell)
+    sheet.append(header)
+
+    write_rows(sheet, rows, progress)
+    return sheet
+
+
+def write_rows(sheet, rows, progress=None):
+    """Append the rows to a write-only sheet"""
+    count = 0
+    for count, row in enumerate(rows, start=1):
+        sheet.append([clean_value(value) for value in row])
+        if progress and count % XLSX_PROGRESS_STEP == 0:
+            progress(count)
+    return count
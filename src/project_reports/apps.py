@@ -5,3 +5,7 @@ class ProjectReportsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "project_reports"
     verbose_name = "Reports"
+
+    def ready(self):
+        # ruff: noqa
+        import project_reports.signals
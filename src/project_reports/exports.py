@@ -9,10 +9,11 @@ from openpyxl.styles import Font, NamedStyle
 
 from project_reports.filters import MonthlyReportsFilter, Organization5WFilter
 from rh.models import Cluster, Organization, Project
+from users.authorization import get_auth_context
 from users.utils import is_cluster_lead
 
 from .models import ActivityPlanReport, DisaggregationLocationReport, ProjectMonthlyReport, TargetLocationReport
-from .utils import write_focal_persons_to_csv, write_projects_organization_to_csv, write_projects_reports_to_csv
+from .utils import stream_projects_reports_csv, write_focal_persons_to_csv, write_projects_organization_to_csv
 
 #############################################
 ############### Export Views #################
@@ -44,44 +45,16 @@ def cluster_5w_dashboard_export(request, code):
     ):
         raise PermissionDenied
 
-    try:
-        project_reports = (
-            ProjectMonthlyReport.objects.select_related("project")
-            .prefetch_related(
-                Prefetch(
-                    "activityplanreport_set",
-                    queryset=ActivityPlanReport.objects.prefetch_related(
-                        Prefetch(
-                            "targetlocationreport_set",
-                            queryset=TargetLocationReport.objects.prefetch_related(
-                                Prefetch(
-                                    "disaggregationlocationreport_set",
-                                    DisaggregationLocationReport.objects.select_related("disaggregation"),
-                                )
-                            ),
-                        )
-                    ),
-                )
-            )
-            .filter(**filter_params)
-            .distinct()
-        )
-
-        monthly_reports_filter = Organization5WFilter(request.GET, queryset=project_reports, user=request.user)
-
-        today = datetime.datetime.now()
-        today_date = today.today().strftime("%d-%m-%Y")
+    project_reports = ProjectMonthlyReport.objects.filter(**filter_params).distinct()
 
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = f"attachment; filename={cluster.code}_5w_reports_data_{today_date}.csv"
+    monthly_reports_filter = Organization5WFilter(request.GET, queryset=project_reports, user=request.user)
 
-        write_projects_reports_to_csv(monthly_reports_filter.qs, response)
-
-        return response
+    today = datetime.datetime.now()
+    today_date = today.today().strftime("%d-%m-%Y")
 
-    except Exception as e:
-        response = {"error": str(e)}
-        return HttpResponse(response, status=500)
+    return stream_projects_reports_csv(
+        monthly_reports_filter.qs, filename=f"{cluster.code}_5w_reports_data_{today_date}.csv"
+    )
 
 
 def export_organization_partners(request, code):
@@ -202,49 +175,21 @@ def export_focal_persons(request, code):
 def org_5w_dashboard_export(request, code):
     org = get_object_or_404(Organization, code=code)
 
-    if not org.code == request.user.profile.organization.code and not is_cluster_lead(
+    if not org.pk == get_auth_context(request.user).organization_id and not is_cluster_lead(
         request.user, org.clusters.values_list("code", flat=True)
     ):
         raise PermissionDenied
 
-    try:
-        project_reports = (
-            ProjectMonthlyReport.objects.select_related("project")
-            .prefetch_related(
-                Prefetch(
-                    "activityplanreport_set",
-                    queryset=ActivityPlanReport.objects.prefetch_related(
-                        Prefetch(
-                            "targetlocationreport_set",
-                            queryset=TargetLocationReport.objects.prefetch_related(
-                                Prefetch(
-                                    "disaggregationlocationreport_set",
-                                    DisaggregationLocationReport.objects.select_related("disaggregation"),
-                                )
-                            ),
-                        )
-                    ),
-                )
-            )
-            .filter(project__organization=org)
-            .distinct()
-        )
-
-        monthly_reports_filter = Organization5WFilter(request.GET, queryset=project_reports, user=request.user)
+    project_reports = ProjectMonthlyReport.objects.filter(project__organization=org).distinct()
 
-        today = datetime.datetime.now()
-        today_date = today.today().strftime("%d-%m-%Y")
-        monthly_reports_queryset = monthly_reports_filter.qs
-
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = f"attachment; filename={org.code}_5w_reports_data_{today_date}.csv"
+    monthly_reports_filter = Organization5WFilter(request.GET, queryset=project_reports, user=request.user)
 
-        write_projects_reports_to_csv(monthly_reports_queryset, response)
+    today = datetime.datetime.now()
+    today_date = today.today().strftime("%d-%m-%Y")
 
-        return response
-    except Exception as e:
-        print(f"Error: {e}")
-        return HttpResponse(status=500, content=e)
+    return stream_projects_reports_csv(
+        monthly_reports_filter.qs, filename=f"{org.code}_5w_reports_data_{today_date}.csv"
+    )
 
 
 # export monthly report for single project
@@ -253,26 +198,8 @@ def export_monthly_report_view(request, pk):
     # set the query
     project = get_object_or_404(Project, pk=pk)
 
-    monthly_progress_report = (
-        ProjectMonthlyReport.objects.select_related("project")
-        .prefetch_related(
-            Prefetch(
-                "activityplanreport_set",
-                queryset=ActivityPlanReport.objects.prefetch_related(
-                    Prefetch(
-                        "targetlocationreport_set",
-                        queryset=TargetLocationReport.objects.prefetch_related(
-                            Prefetch(
-                                "disaggregationlocationreport_set",
-                                DisaggregationLocationReport.objects.select_related("disaggregation"),
-                            )
-                        ),
-                    )
-                ),
-            )
-        )
-        .filter(project=project, state="completed")
-        .order_by("-from_date")
+    monthly_progress_report = ProjectMonthlyReport.objects.filter(project=project, state="completed").order_by(
+        "-from_date"
     )
     reports_filter = MonthlyReportsFilter(
         request.GET,
@@ -281,11 +208,5 @@ def export_monthly_report_view(request, pk):
     )
     today = datetime.datetime.now()
     today_date = today.today().strftime("%d-%m-%Y")
-    try:
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = f"attachment; filename=project_monthly_reports_{today_date}.csv"
-        write_projects_reports_to_csv(reports_filter.qs, response)
-        return response
-    except Exception as e:
-        response = {"error": str(e)}
-        return HttpResponse(response, status=500)
+
+    return stream_projects_reports_csv(reports_filter.qs, filename=f"project_monthly_reports_{today_date}.csv")
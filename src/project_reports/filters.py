@@ -11,7 +11,7 @@ from rh.models import (
     Project,
 )
 
-from .models import ActivityPlanReport, ProjectMonthlyReport, ResponseType, TargetLocationReport
+from .models import ActivityPlanReport, ProjectMonthlyReport, ReachFact, ResponseType, TargetLocationReport
 
 
 class MonthlyReportsFilter(django_filters.FilterSet):
@@ -152,3 +152,57 @@ class Organization5WFilter(django_filters.FilterSet):
         user = kwargs.pop("user", None)
         super().__init__(data, *args, **kwargs)
         self.form.fields["project"].queryset = Project.objects.filter(organization=user.profile.organization)
+
+
+class ReachFactFilter(django_filters.FilterSet):
+    """Applies the `Organization5WFilter` parameters to the 5W reach facts"""
+
+    cluster = django_filters.ModelMultipleChoiceFilter(
+        queryset=Cluster.objects.all(),
+        field_name="activity_domain__clusters",
+    )
+    project = django_filters.ModelMultipleChoiceFilter(
+        field_name="project",
+        queryset=Project.objects.none(),
+    )
+    province = django_filters.ModelMultipleChoiceFilter(
+        field_name="province",
+        queryset=Location.objects.filter(level=1),
+    )
+    district = django_filters.ModelMultipleChoiceFilter(
+        field_name="district",
+        queryset=Location.objects.filter(level=2),
+    )
+    disaggregations = django_filters.ModelMultipleChoiceFilter(
+        field_name="disaggregation__name",
+        queryset=Disaggregation.objects.all(),
+    )
+    response_type = django_filters.ModelMultipleChoiceFilter(
+        field_name="activity_plan_report__response_types",
+        queryset=ResponseType.objects.all(),
+    )
+    activity_type = django_filters.ModelMultipleChoiceFilter(
+        field_name="activity_type",
+        queryset=ActivityType.objects.all(),
+    )
+    to_date = django_filters.DateFilter(field_name="monthly_report__to_date")
+    from_date = django_filters.DateFilter(field_name="from_date")
+
+    class Meta:
+        model = ReachFact
+        fields = [
+            "from_date",
+            "to_date",
+            "cluster",
+            "project",
+            "response_type",
+            "activity_type",
+            "province",
+            "district",
+            "disaggregations",
+        ]
+
+    def __init__(self, data=None, *args, **kwargs):
+        user = kwargs.pop("user", None)
+        super().__init__(data, *args, **kwargs)
+        self.form.fields["project"].queryset = Project.objects.filter(organization=user.profile.organization)
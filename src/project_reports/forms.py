@@ -163,7 +163,6 @@ class DisaggregationLocationReportForm(forms.ModelForm):
         self.fields["disaggregation"].widget = forms.Select(
             attrs={
                 "data-init": "true",
-                "data-url": reverse_lazy("get_target_and_reached_of_disaggregationlocation"),
                 "disabled": "disabled",
             }
         )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from project_reports.utils import generate_reporting_periods
+from rh.models import Project
+
+
+class Command(BaseCommand):
+    help = "Create the missing monthly reports of all in-progress projects, up to the current month."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of projects processed per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        projects = Project.objects.filter(state="in-progress").only("id", "start_date", "end_date").order_by("id")
+
+        totals = {"created": 0, "deleted": 0, "updated": 0}
+        batch = []
+        for project in projects.iterator(chunk_size=batch_size):
+            batch.append(project)
+            if len(batch) >= batch_size:
+                self._generate(batch, totals)
+                batch = []
+        self._generate(batch, totals)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{totals['created']} monthly reports created, {totals['updated']} marked pending "
+                f"and {totals['deleted']} deleted."
+            )
+        )
+
+    def _generate(self, projects, totals):
+        for key, count in generate_reporting_periods(projects).items():
+            totals[key] += count
+        if projects:
+            self.stdout.write(f"Processed the projects up to #{projects[-1].pk}")
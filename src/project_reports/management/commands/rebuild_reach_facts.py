@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from project_reports.models import ProjectMonthlyReport, ReachFact
+from project_reports.utils import REACH_REPORT_STATES, refresh_monthly_report_reach_facts
+
+
+class Command(BaseCommand):
+    help = "Rebuild the 5W reach facts of all submitted and approved monthly reports."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Number of monthly reports refreshed per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        # Facts of reports that are no longer submitted or approved
+        ReachFact.objects.exclude(monthly_report__state__in=REACH_REPORT_STATES).delete()
+
+        report_ids = list(
+            ProjectMonthlyReport.objects.filter(state__in=REACH_REPORT_STATES)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        for start in range(0, len(report_ids), batch_size):
+            refresh_monthly_report_reach_facts(report_ids[start : start + batch_size])
+            self.stdout.write(f"Refreshed {min(start + batch_size, len(report_ids))}/{len(report_ids)} reports")
+
+        self.stdout.write(self.style.SUCCESS(f"{ReachFact.objects.count()} reach facts rebuilt."))
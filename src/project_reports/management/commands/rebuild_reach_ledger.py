@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from project_reports.models import ReachLedger, TargetLocationReport
+from project_reports.utils import refresh_reach_ledger
+
+
+class Command(BaseCommand):
+    help = "Verify the reach ledger running totals against the disaggregation reports and repair the drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of target locations verified per query.",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report the rows out of sync, fail when there are some.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        repair = not options["check"]
+
+        # Target locations with reports or ledger rows
+        target_location_ids = sorted(
+            set(TargetLocationReport.objects.values_list("target_location_id", flat=True).distinct()).union(
+                ReachLedger.objects.values_list("target_location_id", flat=True).distinct()
+            )
+        )
+
+        drift = 0
+        for start in range(0, len(target_location_ids), batch_size):
+            drift += refresh_reach_ledger(target_location_ids[start : start + batch_size], repair=repair)
+            self.stdout.write(
+                f"Verified {min(start + batch_size, len(target_location_ids))}/{len(target_location_ids)} target locations"
+            )
+
+        if not repair and drift:
+            raise CommandError(f"{drift} reach ledger rows out of sync.")
+        if repair:
+            self.stdout.write(self.style.SUCCESS(f"{drift} reach ledger rows out of sync repaired."))
+        else:
+            self.stdout.write(self.style.SUCCESS("The reach ledger is in sync."))
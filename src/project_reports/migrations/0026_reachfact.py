@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_reports', '0025_targetlocationreport_safe_space'),
+        ('rh', '0036_alter_disaggregationlocation_disaggregation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReachFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(blank=True, choices=[('todo', 'Todo'), ('pending', 'Pending'), ('submited', 'Submitted'), ('rejected', 'Rejected'), ('completed', 'Completed'), ('archived', 'Archived')], max_length=15, null=True)),
+                ('from_date', models.DateField(blank=True, null=True)),
+                ('beneficiary_status', models.CharField(blank=True, max_length=25, null=True)),
+                ('reached', models.IntegerField(blank=True, default=0, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('activity_domain', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='rh.activitydomain')),
+                ('activity_plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rh.activityplan')),
+                ('activity_plan_report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='project_reports.activityplanreport')),
+                ('activity_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='rh.activitytype')),
+                ('disaggregation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='rh.disaggregation')),
+                ('disaggregation_location_report', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reach_fact', to='project_reports.disaggregationlocationreport')),
+                ('district', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rh.location')),
+                ('implementing_partner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rh.organization')),
+                ('indicator', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='rh.indicator')),
+                ('monthly_report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='project_reports.projectmonthlyreport')),
+                ('project', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='rh.project')),
+                ('province', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rh.location')),
+                ('target_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rh.targetlocation')),
+                ('target_location_report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='project_reports.targetlocationreport')),
+            ],
+            options={
+                'verbose_name': 'Reach Fact',
+                'verbose_name_plural': 'Reach Facts',
+                'indexes': [models.Index(fields=['project', 'from_date'], name='project_rep_project_2e7d42_idx')],
+            },
+        ),
+    ]
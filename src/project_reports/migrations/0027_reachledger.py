@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_reports', '0026_reachfact'),
+        ('rh', '0039_organizationstats_locations_map'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReachLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('beneficiary_status', models.CharField(blank=True, default='', max_length=25)),
+                ('reached', models.IntegerField(default=0)),
+                ('reported_reached', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('disaggregation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rh.disaggregation')),
+                ('target_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rh.targetlocation')),
+            ],
+            options={
+                'verbose_name': 'Reach Ledger',
+                'verbose_name_plural': 'Reach Ledgers',
+                'constraints': [models.UniqueConstraint(fields=('target_location', 'disaggregation', 'beneficiary_status'), name='unique_reach_ledger')],
+            },
+        ),
+    ]
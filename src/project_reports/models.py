@@ -2,14 +2,18 @@ from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
 from rh.models import (
+    ActivityDomain,
     ActivityPlan,
+    ActivityType,
     Cluster,
     Currency,
     Disaggregation,
     GrantType,
     ImplementationModalityType,
     Indicator,
+    Location,
     LocationType,
+    Organization,
     PackageType,
     Project,
     TargetLocation,
@@ -148,3 +152,87 @@ class DisaggregationLocationReport(models.Model):
     class Meta:
         verbose_name = "Disaggregation Location Report"
         verbose_name_plural = "Disaggregation Location Reports"
+
+
+# ##############################################
+# ############### Reporting Facts ##############
+# ##############################################
+
+
+class ReachFact(models.Model):
+    """Denormalized reach of a submitted or approved monthly report.
+
+    One row per (monthly report, activity plan, target location, disaggregation), kept in sync
+    by `project_reports.utils.refresh_reach_facts` so the 5W dashboards aggregate this table only.
+    """
+
+    disaggregation_location_report = models.OneToOneField(
+        DisaggregationLocationReport, on_delete=models.CASCADE, related_name="reach_fact"
+    )
+    monthly_report = models.ForeignKey(ProjectMonthlyReport, on_delete=models.CASCADE)
+    activity_plan_report = models.ForeignKey(ActivityPlanReport, on_delete=models.CASCADE)
+    target_location_report = models.ForeignKey(TargetLocationReport, on_delete=models.CASCADE)
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True)
+    activity_plan = models.ForeignKey(ActivityPlan, on_delete=models.CASCADE)
+    activity_domain = models.ForeignKey(ActivityDomain, on_delete=models.SET_NULL, null=True, blank=True)
+    activity_type = models.ForeignKey(ActivityType, on_delete=models.SET_NULL, null=True, blank=True)
+    indicator = models.ForeignKey(Indicator, on_delete=models.SET_NULL, null=True, blank=True)
+
+    target_location = models.ForeignKey(TargetLocation, on_delete=models.CASCADE)
+    implementing_partner = models.ForeignKey(
+        Organization, related_name="+", on_delete=models.SET_NULL, null=True, blank=True
+    )
+    province = models.ForeignKey(Location, related_name="+", on_delete=models.SET_NULL, null=True, blank=True)
+    district = models.ForeignKey(Location, related_name="+", on_delete=models.SET_NULL, null=True, blank=True)
+
+    disaggregation = models.ForeignKey(Disaggregation, on_delete=models.SET_NULL, null=True, blank=True)
+
+    state = models.CharField(max_length=15, choices=ProjectMonthlyReport.REPORT_STATES, null=True, blank=True)
+    from_date = models.DateField(blank=True, null=True)
+    beneficiary_status = models.CharField(max_length=25, null=True, blank=True)
+    reached = models.IntegerField(default=0, null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    def __str__(self):
+        return f"Reach Fact: {self.disaggregation_location_report_id}"
+
+    class Meta:
+        verbose_name = "Reach Fact"
+        verbose_name_plural = "Reach Facts"
+        indexes = [
+            models.Index(fields=["project", "from_date"]),
+        ]
+
+
+class ReachLedger(models.Model):
+    """Running totals of the reached beneficiaries of a target location disaggregation.
+
+    One row per (target location, disaggregation, beneficiary status), updated in the same transaction
+    as the disaggregation reports and monthly reports changes (see `project_reports.signals`), so the
+    cumulative reach is read from one row instead of summing every report of the project.
+    """
+
+    target_location = models.ForeignKey(TargetLocation, on_delete=models.CASCADE)
+    disaggregation = models.ForeignKey(Disaggregation, on_delete=models.CASCADE)
+    beneficiary_status = models.CharField(max_length=25, blank=True, default="")
+
+    # Reached of all the monthly reports
+    reached = models.IntegerField(default=0)
+    # Reached of the submitted and approved monthly reports
+    reported_reached = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    def __str__(self):
+        return f"Reach Ledger: {self.target_location_id}, {self.disaggregation_id}, {self.beneficiary_status}"
+
+    class Meta:
+        verbose_name = "Reach Ledger"
+        verbose_name_plural = "Reach Ledgers"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["target_location", "disaggregation", "beneficiary_status"], name="unique_reach_ledger"
+            )
+        ]
@@ -0,0 +1,168 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from rh.models import ActivityPlan, Project, TargetLocation
+from rh.utils import invalidate_dashboard_cache, schedule_organization_stats_refresh
+
+from .models import ActivityPlanReport, DisaggregationLocationReport, ProjectMonthlyReport, TargetLocationReport
+from .utils import (
+    REACH_REPORT_STATES,
+    refresh_deleted_reach_ledger_reports,
+    refresh_monthly_report_reach_facts,
+    refresh_reach_facts,
+    refresh_reach_ledger,
+    track_deleted_reach_ledger_reports,
+    update_monthly_report_reach_ledger,
+    update_reach_ledger,
+)
+
+DASHBOARD_REPORT_STATES = REACH_REPORT_STATES + ["rejected"]
+
+
+@receiver(post_init, sender=ProjectMonthlyReport)
+def post_init_monthly_report(sender, instance, **kwargs):
+    instance._initial_state = instance.__dict__.get("state")
+    instance._initial_from_date = instance.__dict__.get("from_date")
+
+
+@receiver(post_save, sender=ProjectMonthlyReport)
+def post_save_monthly_report(sender, instance, created, **kwargs):
+    # The reach facts copy the report month for the dashboards dates filters
+    reach_month_changed = instance.from_date != instance._initial_from_date and instance.state in REACH_REPORT_STATES
+
+    # Submitted, approved and rejected reports enter or leave the 5W reach facts
+    if instance.state != instance._initial_state and (
+        instance.state in REACH_REPORT_STATES or instance._initial_state in REACH_REPORT_STATES
+    ):
+        refresh_monthly_report_reach_facts(instance)
+
+        # The reach ledger reported totals follow the same states
+        if (instance.state in REACH_REPORT_STATES) != (instance._initial_state in REACH_REPORT_STATES):
+            update_monthly_report_reach_ledger(instance, 1 if instance.state in REACH_REPORT_STATES else -1)
+    elif reach_month_changed:
+        refresh_monthly_report_reach_facts(instance)
+
+    # Cached cluster and organization dashboards of the project are outdated
+    if instance.project_id is not None and (
+        reach_month_changed
+        or instance.state != instance._initial_state
+        and (instance.state in DASHBOARD_REPORT_STATES or instance._initial_state in REACH_REPORT_STATES)
+    ):
+        invalidate_dashboard_cache(
+            [f"organization:{instance.project.organization_id}"]
+            + [
+                f"cluster:{cluster_id}"
+                for cluster_id in Project.clusters.through.objects.filter(project_id=instance.project_id).values_list(
+                    "cluster_id", flat=True
+                )
+            ]
+        )
+
+    # Pending reports counter of the organization home stats
+    if (created and instance.state == "pending") or (
+        instance.state != instance._initial_state and "pending" in [instance.state, instance._initial_state]
+    ):
+        schedule_organization_stats_refresh(project_ids=[instance.project_id])
+
+    instance._initial_state = instance.state
+    instance._initial_from_date = instance.from_date
+
+
+@receiver(post_delete, sender=ProjectMonthlyReport)
+def post_delete_monthly_report(sender, instance, **kwargs):
+    if instance.state == "pending":
+        schedule_organization_stats_refresh(project_ids=[instance.project_id])
+
+
+def _reach_ledger_entry(instance):
+    return (
+        instance.__dict__.get("target_location_report_id"),
+        instance.__dict__.get("disaggregation_id"),
+        instance.__dict__.get("reached") or 0,
+    )
+
+
+@receiver(post_init, sender=DisaggregationLocationReport)
+def post_init_disaggregation_location_report(sender, instance, **kwargs):
+    instance._initial_ledger_entry = _reach_ledger_entry(instance)
+
+
+@receiver(post_save, sender=DisaggregationLocationReport)
+def post_save_disaggregation_location_report(sender, instance, created, **kwargs):
+    refresh_reach_facts(DisaggregationLocationReport.objects.filter(pk=instance.pk))
+
+    # Move the reached from the previous to the new running totals of the reach ledger
+    entry = _reach_ledger_entry(instance)
+    if created:
+        update_reach_ledger([(*entry, 1)])
+    elif entry != instance._initial_ledger_entry:
+        update_reach_ledger([(*instance._initial_ledger_entry, -1), (*entry, 1)])
+    instance._initial_ledger_entry = entry
+
+
+@receiver(pre_delete, sender=DisaggregationLocationReport)
+def pre_delete_disaggregation_location_report(sender, instance, **kwargs):
+    track_deleted_reach_ledger_reports(instance.__dict__.get("target_location_report_id"))
+
+
+@receiver(post_delete, sender=DisaggregationLocationReport)
+def post_delete_disaggregation_location_report(sender, instance, **kwargs):
+    # All the disaggregation reports of the delete are gone before their first post_delete, the ledger rows
+    # of their target locations are recomputed once in the deleting transaction
+    refresh_deleted_reach_ledger_reports()
+
+
+@receiver(post_init, sender=TargetLocationReport)
+def post_init_target_location_report(sender, instance, **kwargs):
+    instance._initial_ledger_key = (
+        instance.__dict__.get("target_location_id"),
+        instance.__dict__.get("beneficiary_status"),
+    )
+
+
+@receiver(post_save, sender=TargetLocationReport)
+def post_save_target_location_report(sender, instance, created, **kwargs):
+    if not created:
+        refresh_reach_facts(DisaggregationLocationReport.objects.filter(target_location_report=instance))
+
+        # The disaggregation reports moved to other running totals of the reach ledger
+        initial_target_location_id, initial_beneficiary_status = instance._initial_ledger_key
+        if (initial_target_location_id, initial_beneficiary_status) != (
+            instance.target_location_id,
+            instance.beneficiary_status,
+        ):
+            refresh_reach_ledger({initial_target_location_id, instance.target_location_id} - {None})
+
+    instance._initial_ledger_key = (instance.target_location_id, instance.beneficiary_status)
+
+
+@receiver(pre_delete, sender=TargetLocationReport)
+def pre_delete_target_location_report(sender, instance, **kwargs):
+    # The location report can be deleted before its disaggregation reports
+    track_deleted_reach_ledger_reports(instance.pk, instance.__dict__.get("target_location_id"))
+
+
+@receiver(post_save, sender=ActivityPlanReport)
+def post_save_activity_plan_report(sender, instance, created, **kwargs):
+    if not created:
+        refresh_reach_facts(
+            DisaggregationLocationReport.objects.filter(target_location_report__activity_plan_report=instance)
+        )
+
+
+@receiver(post_save, sender=TargetLocation)
+def post_save_target_location(sender, instance, created, **kwargs):
+    if not created:
+        refresh_reach_facts(
+            DisaggregationLocationReport.objects.filter(target_location_report__target_location=instance)
+        )
+
+
+@receiver(post_save, sender=ActivityPlan)
+def post_save_activity_plan(sender, instance, created, **kwargs):
+    if not created:
+        refresh_reach_facts(
+            DisaggregationLocationReport.objects.filter(
+                target_location_report__activity_plan_report__activity_plan=instance
+            )
+        )
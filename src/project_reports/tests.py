@@ -1 +1,457 @@
-# Create your tests here.
+import datetime
+import io
+import json
+
+import pandas as pd
+from django.contrib.auth.models import Group, User
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from project_reports.models import (
+    ActivityPlanReport,
+    DisaggregationLocationReport,
+    ProjectMonthlyReport,
+    ReachFact,
+    ReachLedger,
+    TargetLocationReport,
+)
+from project_reports.utils import (
+    copy_monthly_report_activities,
+    generate_reporting_periods,
+    get_disaggregations_target_and_reached,
+    refresh_reach_ledger,
+)
+from project_reports.views.monthly_reports import import_monthly_reports
+from rh.models import (
+    ActivityDomain,
+    ActivityPlan,
+    ActivityType,
+    Cluster,
+    Disaggregation,
+    DisaggregationLocation,
+    Indicator,
+    Location,
+    Organization,
+    Project,
+    TargetLocation,
+)
+from rh.utils import get_dashboard_cache_stats, get_organization_stats
+from users.models import Profile
+
+
+class Reports5WTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+        country = Location.objects.create(name="Afghanistan", code="AF", parent=None)
+        province = Location.objects.create(name="Kabul", code="AF01", parent=country, level=1)
+        district = Location.objects.create(name="Paghman", code="AF0102", parent=province, level=2)
+        self.cluster = Cluster.objects.create(name="ESNFI", code="esnfi", title="ESNFI")
+        org = Organization.objects.create(name="immap", code="immap")
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        Profile.objects.create(user=self.user, organization=org, country=country)
+        self.user.groups.add(Group.objects.get(name="ESNFI_CLUSTER_LEADS"))
+
+        activity_domain = ActivityDomain.objects.create(name="Shelter", code="shelter")
+        activity_domain.clusters.add(self.cluster)
+        activity_type = ActivityType.objects.create(name="Tents", code="tents", activity_domain=activity_domain)
+        indicator = Indicator.objects.create(name="Tents distributed")
+        disaggregations = [Disaggregation.objects.create(name=name) for name in ["Men", "Women"]]
+
+        today = timezone.now()
+        project = Project.objects.create(
+            organization=org,
+            user=self.user,
+            title="Winterization",
+            code="winter-1",
+            start_date=today,
+            end_date=today + datetime.timedelta(days=90),
+        )
+        project.clusters.add(self.cluster)
+        self.plan = plan = ActivityPlan.objects.create(
+            project=project, activity_domain=activity_domain, activity_type=activity_type, indicator=indicator
+        )
+        target_location = TargetLocation.objects.create(
+            project=project, activity_plan=plan, country=country, province=province, district=district
+        )
+
+        for month in range(3):
+            report = ProjectMonthlyReport.objects.create(
+                project=project,
+                state="completed",
+                from_date=datetime.date(2024, month + 1, 1),
+                to_date=datetime.date(2024, month + 1, 28),
+            )
+            plan_report = ActivityPlanReport.objects.create(monthly_report=report, activity_plan=plan)
+            location_report = TargetLocationReport.objects.create(
+                activity_plan_report=plan_report,
+                target_location=target_location,
+                beneficiary_status="new_beneficiary",
+            )
+            for disaggregation in disaggregations:
+                DisaggregationLocationReport.objects.create(
+                    target_location_report=location_report, disaggregation=disaggregation, reached=10
+                )
+
+        self.client.login(username="testuser", password="testpassword")
+
+
+class TestCluster5WExport(Reports5WTestCase):
+    def test_export_is_streamed(self):
+        response = self.client.get(reverse("export-cluster-5w-dashboard", args=[self.cluster.code]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].endswith("Men,Women"))
+        self.assertTrue(lines[1].endswith(",10,10"))
+
+
+class TestImportReportTemplate(Reports5WTestCase):
+    def test_template_lists_the_report_activities(self):
+        report = ProjectMonthlyReport.objects.order_by("pk").first()
+        response = self.client.get(reverse("export_monthly_report_template", args=[report.pk]))
+        self.assertEqual(response.status_code, 200)
+
+        workbook = load_workbook(io.BytesIO(response.content))
+        sheet = workbook["Import Template"]
+        self.assertIsNone(sheet.freeze_panes)
+        self.assertEqual(sheet["A1"].value, "project_code")
+        self.assertTrue(sheet["A1"].font.b)
+        self.assertEqual(
+            [sheet["A2"].value, sheet["B2"].value, sheet["C2"].value, sheet["U2"].value, sheet["W2"].value],
+            ["winter-1", "Tents distributed", "Shelter", "AF01", "AF0102"],
+        )
+
+        # The long lists are referenced by the data validations through named ranges
+        self.assertTrue(workbook.defined_names["B_List"].attr_text.startswith("'Import Template'!B2:B"))
+        self.assertIn("=B_List", [dv.formula1 for dv in sheet.data_validations.dataValidation])
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestOrganization5WDashboardCache(Reports5WTestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.org = self.user.profile.organization
+
+    def test_cache_is_invalidated_on_report_state_change(self):
+        url = reverse("organizations-5w", args=[self.org.code])
+
+        response = self.client.get(url)
+        self.assertEqual(response.context["counts"]["people_reached"], 60)
+        self.client.get(url)
+        self.assertEqual(get_dashboard_cache_stats()["org_5w_dashboard"], {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+        report = ProjectMonthlyReport.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            report.state = "rejected"
+            report.save()
+            # The version is bumped when the change is committed
+            self.assertEqual(self.client.get(url).context["counts"]["people_reached"], 60)
+
+        response = self.client.get(url)
+        self.assertEqual(response.context["counts"]["people_reached"], 40)
+        self.assertEqual(get_dashboard_cache_stats()["org_5w_dashboard"]["misses"], 2)
+
+    def test_report_without_project_changes_state(self):
+        report = ProjectMonthlyReport.objects.create(project=None, state="todo")
+        report.state = "submited"
+        report.save()
+        self.assertEqual(ProjectMonthlyReport.objects.get(pk=report.pk).state, "submited")
+
+    def test_chart_is_a_json_spec(self):
+        response = self.client.get(reverse("organizations-5w", args=[self.org.code]))
+
+        # The page loads the shared plotly.js bundle instead of inlining it
+        self.assertContains(response, "plotly/plotly.min.js")
+        self.assertLess(len(response.content), 200_000)
+        figure = json.loads(response.context["line_chart"])
+        self.assertEqual(figure["data"][0]["y"], [20, 20, 20])
+        self.assertTrue(finders.find("plotly/plotly.min.js"))
+
+
+class TestImportReportActivities(Reports5WTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan.state = "in-progress"
+        self.plan.save()
+        self.plan.indicator.activity_types.add(self.plan.activity_type)
+        self.report = ProjectMonthlyReport.objects.create(project=self.plan.project, state="todo")
+
+    def import_csv(self, rows):
+        header = "activity_domain,activity_type,indicator,response_types,beneficiary_status,admin0pcode,admin1pcode,admin2pcode,admin3pcode,with_safe_spaces,Men,Women"
+        content = "\n".join([header] + rows).encode()
+        return self.client.post(
+            reverse("import-report-activities", args=[self.report.pk]),
+            {"file": SimpleUploadedFile("report.csv", content, content_type="text/csv")},
+        )
+
+    def test_import_creates_report_activities(self):
+        row = "Shelter,Tents,Tents distributed,,New Beneficiary,AF,AF01,AF0102,,TRUE,{men},{women}"
+        response = self.import_csv([row.format(men=5, women=7), row.format(men=1, women="")])
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(ActivityPlanReport.objects.filter(monthly_report=self.report).count(), 1)
+        location_reports = TargetLocationReport.objects.filter(activity_plan_report__monthly_report=self.report)
+        self.assertEqual(location_reports.count(), 2)
+        self.assertEqual(
+            sorted(
+                DisaggregationLocationReport.objects.filter(target_location_report__in=location_reports).values_list(
+                    "reached", flat=True
+                )
+            ),
+            [1, 5, 7],
+        )
+
+    def test_import_validates_all_rows(self):
+        response = self.import_csv(
+            [
+                "Shelter,Tents,Tents distributed,,New Beneficiary,AF,AF01,AF0102,,TRUE,5,7",
+                "Shelter,Unknown,Tents distributed,,New Beneficiary,AF,AF01,AF0102,,TRUE,5,7",
+                "Shelter,Tents,Tents distributed,,New Beneficiary,AF,AF0102,,,TRUE,5,7",
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["errors"]), 2)
+        self.assertFalse(ActivityPlanReport.objects.filter(monthly_report=self.report).exists())
+
+    def test_excel_import_reports_activity_detail_mismatch(self):
+        row = {
+            "activity_domain": "shelter",
+            "activity_type": "tents",
+            "indicator": "Tents distributed",
+            "admin0pcode": "AF",
+            "admin1pcode": "AF01",
+            "admin2pcode": "AF0102",
+        }
+        file = io.BytesIO()
+        pd.DataFrame([row, {**row, "activity_detail": "blankets"}]).to_excel(file, index=False)
+        request = RequestFactory().post(
+            "/", {"file": SimpleUploadedFile("report.xlsx", file.getvalue())}, headers={"hx-request": "true"}
+        )
+        request.user = self.user
+
+        data = json.loads(import_monthly_reports(request, self.report.pk).content)
+
+        self.assertFalse(data["success"])
+        self.assertIn("Row [3]", data["message"])
+        self.assertIn("activity detail blankets", data["message"])
+        self.assertFalse(ActivityPlanReport.objects.filter(monthly_report=self.report).exists())
+
+
+class TestReportingPeriods(Reports5WTestCase):
+    def test_missing_months_are_created(self):
+        project = Project.objects.get(code="winter-1")
+        project.start_date = timezone.make_aware(datetime.datetime(2024, 1, 15))
+        project.end_date = timezone.make_aware(datetime.datetime(2024, 6, 10))
+        project.save()
+
+        result = generate_reporting_periods([project], today=datetime.date(2024, 5, 20))
+        self.assertEqual(result, {"created": 2, "deleted": 0, "updated": 0})
+        states = dict(ProjectMonthlyReport.objects.filter(project=project).values_list("from_date", "state"))
+        self.assertEqual(states[datetime.date(2024, 4, 1)], "pending")
+        self.assertEqual(states[datetime.date(2024, 5, 1)], "todo")
+
+        # The past month todo report becomes pending
+        result = generate_reporting_periods([project], today=datetime.date(2024, 6, 2))
+        self.assertEqual(result, {"created": 1, "deleted": 0, "updated": 1})
+
+
+class TestCopyMonthlyReportActivities(Reports5WTestCase):
+    def test_report_tree_is_copied(self):
+        source = ProjectMonthlyReport.objects.filter(project__code="winter-1").first()
+        report = ProjectMonthlyReport.objects.create(
+            project=source.project, from_date=datetime.date(2024, 4, 1), to_date=datetime.date(2024, 4, 30)
+        )
+
+        copy_monthly_report_activities(source, report)
+
+        self.assertEqual(ActivityPlanReport.objects.filter(monthly_report=report).count(), 1)
+        location_report = TargetLocationReport.objects.get(activity_plan_report__monthly_report=report)
+        self.assertEqual(location_report.beneficiary_status, "existing_beneficiaries")
+        self.assertEqual(
+            sorted(location_report.disaggregationlocationreport_set.values_list("disaggregation__name", "reached")),
+            [("Men", 10), ("Women", 10)],
+        )
+
+
+class TestReachFacts(Reports5WTestCase):
+    def test_facts_follow_the_reports(self):
+        self.assertEqual(ReachFact.objects.count(), 6)
+
+        report = ProjectMonthlyReport.objects.order_by("from_date").first()
+        report.from_date = datetime.date(2023, 12, 1)
+        report.save()
+        self.assertEqual(
+            sorted(set(ReachFact.objects.values_list("from_date", flat=True)))[0], datetime.date(2023, 12, 1)
+        )
+
+        # Reports sent back leave the facts
+        report.state = "rejected"
+        report.save()
+        self.assertFalse(ReachFact.objects.filter(monthly_report=report).exists())
+        self.assertEqual(ReachFact.objects.count(), 4)
+
+
+class TestOrganizationStats(Reports5WTestCase):
+    def test_counters_follow_the_changes(self):
+        project = Project.objects.get(code="winter-1")
+        organization = project.organization
+
+        stats = get_organization_stats(organization)
+        self.assertEqual(stats.active_projects_count, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            project.state = "in-progress"
+            project.save()
+        stats.refresh_from_db()
+        self.assertEqual(
+            [stats.active_projects_count, stats.activity_plans_count, stats.target_locations_count], [1, 1, 1]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProjectMonthlyReport.objects.create(
+                project=project,
+                state="pending",
+                from_date=datetime.date(2024, 4, 1),
+                to_date=datetime.date(2024, 4, 30),
+            )
+        stats.refresh_from_db()
+        self.assertEqual(stats.pending_reports_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan.delete()
+        stats.refresh_from_db()
+        self.assertEqual([stats.activity_plans_count, stats.target_locations_count], [0, 0])
+
+        # The home page reads the counters row
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["counts"]["pending_reports_count"], 1)
+
+    def test_locations_map_is_served_with_etag(self):
+        project = Project.objects.get(code="winter-1")
+        with self.captureOnCommitCallbacks(execute=True):
+            project.state = "in-progress"
+            project.save()
+
+        url = reverse("organizations-target-locations", args=[project.organization_id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["projects"], {str(project.pk): "winter-1"})
+        self.assertEqual([district[1:4] for district in data["districts"]], [["Paghman", "AF0102", "Kabul"]])
+
+        etag = response.headers["ETag"]
+        self.assertEqual(self.client.get(url, headers={"if-none-match": etag}).status_code, 304)
+
+        # A new location of the organization changes the payload
+        with self.captureOnCommitCallbacks(execute=True):
+            target_location = TargetLocation.objects.get(project=project)
+            target_location.pk = None
+            target_location.save()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["districts"][0][6]), 2)
+
+
+class TestDisaggregationsTargetAndReached(Reports5WTestCase):
+    def test_targets_and_reached_are_batched(self):
+        target_location = TargetLocation.objects.get()
+        for disaggregation in Disaggregation.objects.all():
+            DisaggregationLocation.objects.create(
+                target_location=target_location, disaggregation=disaggregation, target=50
+            )
+        men, women = Disaggregation.objects.order_by("name").values_list("pk", flat=True)
+
+        with self.assertNumQueries(1):
+            targets = get_disaggregations_target_and_reached([target_location.pk])
+        self.assertEqual(
+            targets,
+            {target_location.pk: {men: {"target": 50, "reached": 30}, women: {"target": 50, "reached": 30}}},
+        )
+
+        url = reverse("get_target_and_reached_of_disaggregations")
+        response = self.client.get(url, {"target_location": [target_location.pk]})
+        self.assertEqual(response.json()["target_locations"][str(target_location.pk)][str(men)]["reached"], 30)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+        # The disaggregations form embeds the same data
+        response = self.client.post(
+            reverse("hx_get_diaggregation_tabular_form"), {"target_location": target_location.pk}
+        )
+        self.assertEqual(response.context["disaggregations_target_and_reached"], targets[target_location.pk])
+
+
+class TestReachLedger(Reports5WTestCase):
+    def totals(self):
+        return sorted(ReachLedger.objects.values_list("disaggregation__name", "reached", "reported_reached"))
+
+    def test_running_totals_follow_the_reports(self):
+        self.assertEqual(self.totals(), [("Men", 30, 30), ("Women", 30, 30)])
+
+        # Edited disaggregation reports
+        report = DisaggregationLocationReport.objects.filter(disaggregation__name="Men").first()
+        report.reached = 25
+        report.save()
+        self.assertEqual(self.totals(), [("Men", 45, 45), ("Women", 30, 30)])
+
+        # Deleted location reports
+        TargetLocationReport.objects.order_by("pk").last().delete()
+        self.assertEqual(self.totals(), [("Men", 35, 35), ("Women", 20, 20)])
+
+        # A report sent back leaves the reported totals
+        monthly_report = report.target_location_report.activity_plan_report.monthly_report
+        monthly_report.state = "rejected"
+        monthly_report.save()
+        self.assertEqual(self.totals(), [("Men", 35, 10), ("Women", 20, 10)])
+
+        # Existing beneficiaries have their own totals
+        location_report = report.target_location_report
+        location_report.beneficiary_status = "existing_beneficiaries"
+        location_report.save()
+        self.assertEqual(
+            sorted(ReachLedger.objects.values_list("beneficiary_status", "reached")),
+            [
+                ("existing_beneficiaries", 10),
+                ("existing_beneficiaries", 25),
+                ("new_beneficiary", 10),
+                ("new_beneficiary", 10),
+            ],
+        )
+        self.assertEqual(refresh_reach_ledger(), 0)
+
+    def test_deleted_disaggregation_report_leaves_the_running_totals(self):
+        with transaction.atomic():
+            DisaggregationLocationReport.objects.filter(disaggregation__name="Men").first().delete()
+            # Updated in the deleting transaction
+            self.assertEqual(self.totals(), [("Men", 20, 20), ("Women", 30, 30)])
+        self.assertEqual(refresh_reach_ledger(), 0)
+
+    def test_cascade_delete_refreshes_the_ledger_once(self):
+        monthly_report = ProjectMonthlyReport.objects.order_by("pk").first()
+
+        # The cascade deletes are batched per table, whatever the number of disaggregation reports
+        with self.assertNumQueries(14):
+            monthly_report.activityplanreport_set.all().delete()
+        self.assertEqual(self.totals(), [("Men", 20, 20), ("Women", 20, 20)])
+
+    def test_rebuild_repairs_the_drift(self):
+        ReachLedger.objects.filter(disaggregation__name="Men").update(reached=0)
+        ReachLedger.objects.filter(disaggregation__name="Women").delete()
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_reach_ledger", "--check", stdout=io.StringIO())
+        call_command("rebuild_reach_ledger", stdout=io.StringIO())
+        self.assertEqual(self.totals(), [("Men", 30, 30), ("Women", 30, 30)])
@@ -20,6 +20,7 @@ from .views.views import (
 urlpatterns = [
     path("organizations/<str:code>/5w", dashboards.org_5w_dashboard, name="organizations-5w"),
     path("clusters/<str:cluster>/5w", dashboards.cluster_5w_dashboard, name="clusters-5w"),
+    path("dashboards/cache-stats", dashboards.dashboard_cache_stats, name="dashboards-cache-stats"),
     # Monthly Report URLS
     path(
         "monthly-reports/<int:report_id>/notify-focal-point",
@@ -115,9 +116,9 @@ urlpatterns = [
     ),
     # Location Report URLS
     path(
-        "report-target-locations/get-target-and-reached",
-        location_views.get_target_and_reached_of_disaggregationlocation,
-        name="get_target_and_reached_of_disaggregationlocation",
+        "report-target-locations/targets-and-reached",
+        location_views.get_target_and_reached_of_disaggregations,
+        name="get_target_and_reached_of_disaggregations",
     ),
     path(
         "report-target-locations/activity-plan-report/<int:plan>/create",
@@ -1,17 +1,34 @@
 import csv
 import datetime
+from collections import defaultdict
 
 from dateutil.relativedelta import relativedelta
-from django.db.models import Exists, OuterRef
-from django.utils.timezone import now
-from openpyxl.styles import Font, NamedStyle
-from openpyxl.utils import get_column_letter
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.utils.timezone import localdate, now
+from openpyxl.utils import get_column_letter, quote_sheetname
+from openpyxl.workbook.defined_name import DefinedName
 from openpyxl.worksheet.datavalidation import DataValidation
 
-from project_reports.models import ActivityPlanReport, ProjectMonthlyReport, ResponseType
+from core.clone import bulk_clone
+from core.xlsx import write_sheet
+from project_reports.models import (
+    ActivityPlanReport,
+    DisaggregationLocationReport,
+    ProjectMonthlyReport,
+    ReachFact,
+    ReachLedger,
+    ResponseType,
+    TargetLocationReport,
+)
 from rh.models import (
+    ActivityDomain,
     Disaggregation,
+    DisaggregationLocation,
     FacilitySiteType,
+    Project,
     # GrantType,
     # ImplementationModalityType,
     # PackageType,
@@ -21,266 +38,306 @@ from rh.models import (
     # TransferMechanismType,
     # UnitType,
 )
+from rh.utils import schedule_organization_stats_refresh
+
+REPORTS_CSV_COLUMNS = [
+    "project_code",
+    "report_id",
+    "cluster_name",
+    "focal_person_name",
+    "focal_person_phone",
+    "focal_person_email",
+    "organization",
+    "organization_type",
+    "program_partner",
+    "project_hrp-code",
+    "project_title",
+    "project_start_date",
+    "project_end_date",
+    "project_status",
+    "response_types",
+    "project_donor",
+    "project_budget",
+    "project_budget_currency",
+    "report_month_number",
+    "report_month",
+    "report_year",
+    "report_period",
+    "implementing_partner",
+    "admin0pcode",
+    "admin0name",
+    "region_name",
+    "admin1pcode",
+    "admin1name",
+    "admin2pcode",
+    "admin2name",
+    "site_lat",
+    "site_long",
+    "facility_monitoring",
+    "facility_site_type",
+    "facility_site_name",
+    "facility_site_id",
+    "facility_site_lat",
+    "facility_site_long",
+    "non-hrp_beneficiary_code",
+    "non-hrp_beneficiary_name",
+    "hrp_beneficiary_code",
+    "hrp_beneficiary_name",
+    "beneficiary_status",
+    "previously_assisted_by",
+    "activity_domain_code",
+    "activity_domain_name",
+    "activity_type_code",
+    "activity_type_name",
+    "activity_detail_code",
+    "activity_detail_name",
+    "indicator_name",
+    "units",
+    "unit_type_name",
+    "transfer_type_value",
+    "implementation_modality_type_name",
+    "transfer_mechanism_type_name",
+    "package_type_name",
+    "transfer_category_name",
+    "grant_type",
+    "currency",
+    "updated_at",
+    "created_at",
+    "safe_spaces_for_women-girls",
+]
+
+# Flattened fields of a location report, fetched with a single joined query per chunk
+REPORTS_CSV_VALUES = [
+    "id",
+    "activity_plan_report_id",
+    "activity_plan_report__monthly_report__from_date",
+    "activity_plan_report__monthly_report__to_date",
+    "activity_plan_report__monthly_report__created_at",
+    "activity_plan_report__monthly_report__updated_at",
+    "activity_plan_report__monthly_report__project_id",
+    "activity_plan_report__monthly_report__project__code",
+    "activity_plan_report__monthly_report__project__hrp_code",
+    "activity_plan_report__monthly_report__project__title",
+    "activity_plan_report__monthly_report__project__start_date",
+    "activity_plan_report__monthly_report__project__end_date",
+    "activity_plan_report__monthly_report__project__state",
+    "activity_plan_report__monthly_report__project__budget",
+    "activity_plan_report__monthly_report__project__budget_currency__name",
+    "activity_plan_report__monthly_report__project__user__first_name",
+    "activity_plan_report__monthly_report__project__user__email",
+    "activity_plan_report__monthly_report__project__user__profile__phone",
+    "activity_plan_report__monthly_report__project__user__profile__organization__code",
+    "activity_plan_report__monthly_report__project__user__profile__organization__type",
+    "activity_plan_report__activity_plan__activity_domain_id",
+    "activity_plan_report__activity_plan__activity_domain__code",
+    "activity_plan_report__activity_plan__activity_domain__name",
+    "activity_plan_report__activity_plan__activity_type__code",
+    "activity_plan_report__activity_plan__activity_type__name",
+    "activity_plan_report__activity_plan__activity_detail__code",
+    "activity_plan_report__activity_plan__activity_detail__name",
+    "activity_plan_report__activity_plan__indicator__name",
+    "activity_plan_report__activity_plan__beneficiary__code",
+    "activity_plan_report__activity_plan__beneficiary__name",
+    "activity_plan_report__activity_plan__hrp_beneficiary__code",
+    "activity_plan_report__activity_plan__hrp_beneficiary__name",
+    "activity_plan_report__units",
+    "activity_plan_report__unit_type__name",
+    "activity_plan_report__no_of_transfers",
+    "activity_plan_report__implement_modility_type__name",
+    "activity_plan_report__transfer_mechanism_type__name",
+    "activity_plan_report__package_type__name",
+    "activity_plan_report__transfer_category__name",
+    "activity_plan_report__grant_type__name",
+    "activity_plan_report__currency__name",
+    "target_location__implementing_partner__name",
+    "target_location__country__code",
+    "target_location__country__name",
+    "target_location__province_id",
+    "target_location__province__region_name",
+    "target_location__province__code",
+    "target_location__province__name",
+    "target_location__district__code",
+    "target_location__district__name",
+    "target_location__district__lat",
+    "target_location__district__long",
+    "target_location__facility_monitoring",
+    "target_location__facility_site_type__name",
+    "target_location__facility_name",
+    "target_location__facility_id",
+    "target_location__facility_lat",
+    "target_location__facility_long",
+    "beneficiary_status",
+    "prev_assisted_by__name",
+    "safe_space",
+]
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """An object that implements just the write method of the file-like
+    interface, so a csv.writer can be used to produce lines for a StreamingHttpResponse.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _naive_utc(value):
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None) if value else None
+
+
+def _group_values(queryset, key_field, value_field):
+    """Group a values_list of (key, value) pairs into {key: [values]}"""
+    grouped = defaultdict(list)
+    for key, value in queryset.values_list(key_field, value_field):
+        grouped[key].append(value)
+    return grouped
+
+
+def iter_projects_reports_rows(monthly_reports, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the header and the rows of the 5W reports export.
+
+    Location reports are read as flat values in keyset chunks of `chunk_size`, and the
+    many-to-many columns and disaggregations are fetched per chunk with grouped `IN` queries,
+    so the memory stays flat and the number of queries depends on the number of chunks only.
+    """
+    disaggregation_list = list(dict.fromkeys(Disaggregation.objects.values_list("name", flat=True)))
+    yield REPORTS_CSV_COLUMNS + disaggregation_list
+
+    location_reports = TargetLocationReport.objects.filter(
+        activity_plan_report__monthly_report__in=monthly_reports.order_by().values("pk")
+    ).order_by("id")
+
+    last_id = 0
+    while True:
+        chunk = list(location_reports.filter(id__gt=last_id).values(*REPORTS_CSV_VALUES)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1]["id"]
+
+        location_report_ids = [row["id"] for row in chunk]
+        plan_report_ids = {row["activity_plan_report_id"] for row in chunk}
+        project_ids = {row["activity_plan_report__monthly_report__project_id"] for row in chunk}
+        domain_ids = {row["activity_plan_report__activity_plan__activity_domain_id"] for row in chunk}
+
+        domain_clusters = _group_values(
+            ActivityDomain.clusters.through.objects.filter(activitydomain_id__in=domain_ids),
+            "activitydomain_id",
+            "cluster__code",
+        )
+        programme_partners = _group_values(
+            Project.programme_partners.through.objects.filter(project_id__in=project_ids),
+            "project_id",
+            "organization__name",
+        )
+        donors = _group_values(
+            Project.donors.through.objects.filter(project_id__in=project_ids),
+            "project_id",
+            "donor__name",
+        )
+        response_types = _group_values(
+            ActivityPlanReport.response_types.through.objects.filter(activityplanreport_id__in=plan_report_ids),
+            "activityplanreport_id",
+            "responsetype__name",
+        )
+        reached = defaultdict(dict)
+        for location_report_id, name, value in DisaggregationLocationReport.objects.filter(
+            target_location_report_id__in=location_report_ids
+        ).values_list("target_location_report_id", "disaggregation__name", "reached"):
+            reached[location_report_id][name] = value
+
+        for row in chunk:
+            report_from = row["activity_plan_report__monthly_report__from_date"]
+            report_to = row["activity_plan_report__monthly_report__to_date"]
+            project_id = row["activity_plan_report__monthly_report__project_id"]
+            has_province = row["target_location__province_id"] is not None
+            values = [
+                row["activity_plan_report__monthly_report__project__code"] or None,
+                f"{report_from.strftime('%B')}, {report_to.year} Report" if report_from else "Monthly Report",
+                ", ".join(domain_clusters[row["activity_plan_report__activity_plan__activity_domain_id"]]),
+                row["activity_plan_report__monthly_report__project__user__first_name"] or None,
+                row["activity_plan_report__monthly_report__project__user__profile__phone"],
+                row["activity_plan_report__monthly_report__project__user__email"],
+                row["activity_plan_report__monthly_report__project__user__profile__organization__code"],
+                row["activity_plan_report__monthly_report__project__user__profile__organization__type"],
+                ", ".join(programme_partners[project_id]),
+                row["activity_plan_report__monthly_report__project__hrp_code"] or None,
+                row["activity_plan_report__monthly_report__project__title"] or None,
+                _naive_utc(row["activity_plan_report__monthly_report__project__start_date"]),
+                _naive_utc(row["activity_plan_report__monthly_report__project__end_date"]),
+                row["activity_plan_report__monthly_report__project__state"] or None,
+                ", ".join(name for name in response_types[row["activity_plan_report_id"]] if name),
+                ", ".join(str(name) for name in donors[project_id]),
+                row["activity_plan_report__monthly_report__project__budget"] or None,
+                row["activity_plan_report__monthly_report__project__budget_currency__name"],
+                report_from.month if report_from else None,
+                report_from.strftime("%B") if report_from else None,
+                report_from.strftime("%Y") if report_from else None,
+                report_from.strftime("%Y-%m-%d") if report_from else None,
+                row["target_location__implementing_partner__name"],
+                row["target_location__country__code"] if has_province else None,
+                row["target_location__country__name"] if has_province else None,
+                row["target_location__province__region_name"],
+                row["target_location__province__code"],
+                row["target_location__province__name"],
+                row["target_location__district__code"],
+                row["target_location__district__name"],
+                row["target_location__district__lat"],
+                row["target_location__district__long"],
+                "yes" if row["target_location__facility_monitoring"] else "No",
+                row["target_location__facility_site_type__name"],
+                row["target_location__facility_name"] or None,
+                row["target_location__facility_id"] or None,
+                row["target_location__facility_lat"] or None,
+                row["target_location__facility_long"] or None,
+                row["activity_plan_report__activity_plan__beneficiary__code"],
+                row["activity_plan_report__activity_plan__beneficiary__name"],
+                row["activity_plan_report__activity_plan__hrp_beneficiary__code"],
+                row["activity_plan_report__activity_plan__hrp_beneficiary__name"],
+                row["beneficiary_status"] or None,
+                row["prev_assisted_by__name"],
+                row["activity_plan_report__activity_plan__activity_domain__code"],
+                row["activity_plan_report__activity_plan__activity_domain__name"],
+                row["activity_plan_report__activity_plan__activity_type__code"],
+                row["activity_plan_report__activity_plan__activity_type__name"],
+                row["activity_plan_report__activity_plan__activity_detail__code"],
+                row["activity_plan_report__activity_plan__activity_detail__name"],
+                row["activity_plan_report__activity_plan__indicator__name"],
+                row["activity_plan_report__units"] or None,
+                row["activity_plan_report__unit_type__name"],
+                row["activity_plan_report__no_of_transfers"] or None,
+                row["activity_plan_report__implement_modility_type__name"],
+                row["activity_plan_report__transfer_mechanism_type__name"],
+                row["activity_plan_report__package_type__name"],
+                row["activity_plan_report__transfer_category__name"],
+                row["activity_plan_report__grant_type__name"],
+                row["activity_plan_report__currency__name"],
+                _naive_utc(row["activity_plan_report__monthly_report__updated_at"]),
+                _naive_utc(row["activity_plan_report__monthly_report__created_at"]),
+                "Yes" if row["safe_space"] else None,
+            ]
+            location_reached = reached[row["id"]]
+            values.extend(location_reached.get(name) for name in disaggregation_list)
 
-header_style = NamedStyle(name="header")
-header_style.font = Font(bold=True)
-
-
-def write_projects_reports_to_csv(monthly_progress_report, response):
-    writer = csv.writer(response)
-    columns = [
-        "project_code",
-        "report_id",
-        "cluster_name",
-        "focal_person_name",
-        "focal_person_phone",
-        "focal_person_email",
-        "organization",
-        "organization_type",
-        "program_partner",
-        "project_hrp-code",
-        "project_title",
-        "project_start_date",
-        "project_end_date",
-        "project_status",
-        "response_types",
-        "project_donor",
-        "project_budget",
-        "project_budget_currency",
-        "report_month_number",
-        "report_month",
-        "report_year",
-        "report_period",
-        "implementing_partner",
-        "admin0pcode",
-        "admin0name",
-        "region_name",
-        "admin1pcode",
-        "admin1name",
-        "admin2pcode",
-        "admin2name",
-        "site_lat",
-        "site_long",
-        "facility_monitoring",
-        "facility_site_type",
-        "facility_site_name",
-        "facility_site_id",
-        "facility_site_lat",
-        "facility_site_long",
-        "non-hrp_beneficiary_code",
-        "non-hrp_beneficiary_name",
-        "hrp_beneficiary_code",
-        "hrp_beneficiary_name",
-        "beneficiary_status",
-        "previously_assisted_by",
-        "activity_domain_code",
-        "activity_domain_name",
-        "activity_type_code",
-        "activity_type_name",
-        "activity_detail_code",
-        "activity_detail_name",
-        "indicator_name",
-        "units",
-        "unit_type_name",
-        "transfer_type_value",
-        "implementation_modality_type_name",
-        "transfer_mechanism_type_name",
-        "package_type_name",
-        "transfer_category_name",
-        "grant_type",
-        "currency",
-        "updated_at",
-        "created_at",
-        "safe_spaces_for_women-girls",
-    ]
-    disaggregation_cols = []
-    disaggregations = Disaggregation.objects.all()
-    disaggregation_list = []
+            yield values
 
-    for disaggregation in disaggregations:
-        if disaggregation.name not in disaggregation_list:
-            disaggregation_list.append(disaggregation.name)
-            disaggregation_cols.append(disaggregation.name)
-        else:
-            continue
 
-    if disaggregations:
-        for disaggregation_col in disaggregation_cols:
-            columns.append(disaggregation_col)
-
-    # write csv columns
-    writer.writerow(columns)
-
-    try:
-        for project_reports in monthly_progress_report:
-            plan_reports = project_reports.activityplanreport_set.all()
-            for plan_report in plan_reports:
-                location_reports = plan_report.targetlocationreport_set.all()
-                for location_report in location_reports:
-                    # Create a dictionary to hold disaggregation data
-                    disaggregation_data = {}
-                    row = [
-                        project_reports.project.code if project_reports.project.code else None,
-                        project_reports.__str__(),
-                        ", ".join(
-                            [str(cluster.code) for cluster in plan_report.activity_plan.activity_domain.clusters.all()]
-                        )
-                        if project_reports.project.clusters
-                        else None,
-                        project_reports.project.user.first_name if project_reports.project.user.first_name else None,
-                        project_reports.project.user.profile.phone if project_reports.project.user.profile else None,
-                        project_reports.project.user.email if project_reports.project.user else None,
-                        project_reports.project.user.profile.organization.code
-                        if project_reports.project.user.profile
-                        else None,
-                        project_reports.project.user.profile.organization.type
-                        if project_reports.project.user.profile
-                        else None,
-                        ", ".join([partner.name for partner in project_reports.project.programme_partners.all()])
-                        if project_reports.project.programme_partners
-                        else None,
-                        project_reports.project.hrp_code if project_reports.project.hrp_code else None,
-                        project_reports.project.title if project_reports.project.title else None,
-                        project_reports.project.start_date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
-                        if project_reports.project.start_date
-                        else None,
-                        project_reports.project.end_date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
-                        if project_reports.project.end_date
-                        else None,
-                        project_reports.project.state if project_reports.project.state else None,
-                        ", ".join(
-                            [response_type.name for response_type in plan_report.response_types.all() if response_type]
-                        )
-                        if plan_report.response_types
-                        else None,
-                        ", ".join(str(donor.name) for donor in project_reports.project.donors.all())
-                        if project_reports.project.donors
-                        else None,
-                        project_reports.project.budget if project_reports.project.budget else None,
-                        project_reports.project.budget_currency.name
-                        if project_reports.project.budget_currency
-                        else None,
-                        project_reports.from_date.month if project_reports.from_date else None,
-                        project_reports.from_date.strftime("%B") if project_reports.from_date else None,
-                        project_reports.from_date.strftime("%Y") if project_reports.from_date else None,
-                        project_reports.from_date.strftime("%Y-%m-%d") if project_reports.from_date else None,
-                        location_report.target_location.implementing_partner.name
-                        if location_report.target_location.implementing_partner
-                        else None,
-                        location_report.target_location.country.code
-                        if location_report.target_location.province
-                        else None,
-                        location_report.target_location.country.name
-                        if location_report.target_location.province
-                        else None,
-                        location_report.target_location.province.region_name
-                        if location_report.target_location.province
-                        else None,
-                        location_report.target_location.province.code
-                        if location_report.target_location.province
-                        else None,
-                        location_report.target_location.province.name
-                        if location_report.target_location.province
-                        else None,
-                        location_report.target_location.district.code
-                        if location_report.target_location.district
-                        else None,
-                        location_report.target_location.district.name
-                        if location_report.target_location.district
-                        else None,
-                        location_report.target_location.district.lat
-                        if location_report.target_location.district
-                        else None,
-                        location_report.target_location.district.long
-                        if location_report.target_location.district
-                        else None,
-                        "yes" if location_report.target_location.facility_monitoring else "No",
-                        location_report.target_location.facility_site_type.name
-                        if location_report.target_location.facility_site_type
-                        else None,
-                        location_report.target_location.facility_name
-                        if location_report.target_location.facility_name
-                        else None,
-                        location_report.target_location.facility_id
-                        if location_report.target_location.facility_id
-                        else None,
-                        location_report.target_location.facility_lat
-                        if location_report.target_location.facility_lat
-                        else None,
-                        location_report.target_location.facility_long
-                        if location_report.target_location.facility_long
-                        else None,
-                        plan_report.activity_plan.beneficiary.code if plan_report.activity_plan.beneficiary else None,
-                        plan_report.activity_plan.beneficiary.name if plan_report.activity_plan.beneficiary else None,
-                        plan_report.activity_plan.hrp_beneficiary.code
-                        if plan_report.activity_plan.hrp_beneficiary
-                        else None,
-                        plan_report.activity_plan.hrp_beneficiary.name
-                        if plan_report.activity_plan.hrp_beneficiary
-                        else None,
-                        location_report.beneficiary_status if location_report.beneficiary_status else None,
-                        location_report.prev_assisted_by if location_report.prev_assisted_by else None,
-                        plan_report.activity_plan.activity_domain.code
-                        if plan_report.activity_plan.activity_domain
-                        else None,
-                        plan_report.activity_plan.activity_domain.name
-                        if plan_report.activity_plan.activity_domain
-                        else None,
-                        plan_report.activity_plan.activity_type.code
-                        if plan_report.activity_plan.activity_type
-                        else None,
-                        plan_report.activity_plan.activity_type.name
-                        if plan_report.activity_plan.activity_type
-                        else None,
-                        plan_report.activity_plan.activity_detail.code
-                        if plan_report.activity_plan.activity_detail
-                        else None,
-                        plan_report.activity_plan.activity_detail.name
-                        if plan_report.activity_plan.activity_detail
-                        else None,
-                        plan_report.activity_plan.indicator.name if plan_report.activity_plan.indicator else None,
-                        plan_report.units if plan_report.units else None,
-                        plan_report.unit_type.name if plan_report.unit_type else None,
-                        plan_report.no_of_transfers if plan_report.no_of_transfers else None,
-                        plan_report.implement_modility_type.name if plan_report.implement_modility_type else None,
-                        plan_report.transfer_mechanism_type.name if plan_report.transfer_mechanism_type else None,
-                        plan_report.package_type.name if plan_report.package_type else None,
-                        plan_report.transfer_category.name if plan_report.transfer_category else None,
-                        plan_report.grant_type.name if plan_report.grant_type else None,
-                        plan_report.currency.name if plan_report.currency else None,
-                        project_reports.created_at.astimezone(datetime.timezone.utc).replace(tzinfo=None),
-                        project_reports.updated_at.astimezone(datetime.timezone.utc).replace(tzinfo=None),
-                        "Yes" if location_report.safe_space else None,
-                    ]
-
-                    # Iterate through disaggregation locations and get disaggregation values
-                    disaggregation_locations = location_report.disaggregationlocationreport_set.all()
-                    disaggregation_location_list = {
-                        disaggregation_location.disaggregation.name: disaggregation_location.reached
-                        for disaggregation_location in disaggregation_locations
-                    }
-
-                    # Update disaggregation_data with values from disaggregation_location_list
-                    for disaggregation_entry in disaggregation_list:
-                        if disaggregation_entry not in disaggregation_location_list:
-                            disaggregation_data[disaggregation_entry] = None
-
-                    disaggregation_location_list.update(disaggregation_data)
-
-                    # Append disaggregation values to the row in the order of columns
-                    for column_name in columns:
-                        if column_name in disaggregation_location_list:
-                            row.append(disaggregation_location_list[column_name])
-
-                    writer.writerow(row)
-
-    except Exception as e:
-        print("Error:", e)
+def stream_projects_reports_csv(monthly_progress_report, filename):
+    """Return a StreamingHttpResponse that writes the 5W reports as CSV row by row"""
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in iter_projects_reports_rows(monthly_progress_report)),
+        content_type="text/csv",
+    )
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
 
 
 def write_import_report_template_sheet(workbook, monthly_report):
-    sheet = workbook.active
-    sheet.title = "Import Template"
+    """Write the activities import template of the monthly report to a write-only workbook.
+    The cells are collected first as the rows of a write-only sheet must be written in order.
+    """
     columns = [
         {"header": "project_code", "type": "string", "width": 40},
         {"header": "indicator", "type": "string", "width": 80},
@@ -323,20 +380,7 @@ def write_import_report_template_sheet(workbook, monthly_report):
         disaggregation_cols.append({"header": disaggregation.name, "type": "string", "width": 30})
 
     columns = columns + disaggregation_cols
-    # write column headers in excel sheet
-    for idx, column in enumerate(columns, start=1):
-        cell = sheet.cell(row=1, column=idx, value=column["header"])
-        cell.style = header_style
-        # set column width
-        column_letter = get_column_letter(idx)
-        sheet.column_dimensions[column_letter].width = column["width"]
-
-        if column["type"] == "number":
-            sheet.column_dimensions[column_letter].number_format = "General"
-        elif column["type"] == "date":
-            sheet.column_dimensions[column_letter].number_format = "mm-dd-yyyy"
-
-    sheet.column_dimensions[column_letter].width = column["width"]
+
     # write the rows with report data
     container_dictionary = {
         "reponseTypeList": ["E"],
@@ -367,6 +411,7 @@ def write_import_report_template_sheet(workbook, monthly_report):
         "transfer_mc_type": ["H"],
         "im_modility_type": ["G"],
     }
+    sheet_title = "Import Template"
     project = monthly_report.project
     # container_dictionary["package_type"].extend(list(PackageType.objects.values_list("name", flat=True)))
     # container_dictionary["unit_type"].extend(list(UnitType.objects.values_list("name", flat=True)))
@@ -428,96 +473,172 @@ def write_import_report_template_sheet(workbook, monthly_report):
     if "health" in cluster_code:
         container_dictionary["facilitySiteTypeList"].extend(facility)
 
+    # cells values by row and column letter
+    cells = defaultdict(dict)
+    data_validations = []
+
+    def add_data_validation(dv, column):
+        data_validations.append(dv)
+        if num_rows > 2:
+            dv.add(f"{column}2:{column}{num_rows - 1}")
+
+    def add_named_range(name, cells_range):
+        workbook.defined_names[name] = DefinedName(name, attr_text=f"{quote_sheetname(sheet_title)}!{cells_range}")
+
+    def write_list(column, items):
+        start_row = 2
+        for i, item in enumerate(items):
+            cells[start_row + i][column] = item
+
     for key, value in container_dictionary.items():
         column = value[0]
         list_values = ",".join(value[1:])
 
         if len(list_values) < 255:
-            dv = DataValidation(type="list", formula1='"{}"'.format(list_values))
-            sheet.add_data_validation(dv)
             for row in range(2, num_rows):
-                sheet[f"A{row}"] = project_code
-                cell = sheet[f"{column}{row}"]
-                sheet.add_data_validation(dv)
-                dv.add(cell)
+                cells[row]["A"] = project_code
+            add_data_validation(DataValidation(type="list", formula1='"{}"'.format(list_values)), column)
 
         # Case when the list values exceed 255 characters
         else:
             start_row = 2
-            for i, item in enumerate(container_dictionary[key][1:]):
-                sheet[f"{column}{start_row + i}"] = item
+            write_list(column, container_dictionary[key][1:])
 
             # Define a named range for the list of values
             named_range = f"{column}_List"  # You can name the range based on the column or other criteria
-            sheet.parent.create_named_range(
-                named_range, sheet, f"{column}{start_row}:{column}{start_row + len(list_values) - 1}"
-            )
+            add_named_range(named_range, f"{column}{start_row}:{column}{start_row + len(list_values) - 1}")
 
             # Create a data validation that references the named range
-            dv = DataValidation(type="list", formula1=f"={named_range}", showDropDown=True)
-            sheet.add_data_validation(dv)
-            for row in range(2, num_rows):
-                cell = sheet[f"{column}{row}"]
-                sheet.add_data_validation(dv)
-                dv.add(cell)
+            add_data_validation(DataValidation(type="list", formula1=f"={named_range}", showDropDown=True), column)
+
     # display as plain list in the corresponding columns
     for key, value in plain_dictionary_lists.items():
         column = value[0]
         long_list_values = ",".join(value[1:])
         start_row = 2
-        for i, item in enumerate(plain_dictionary_lists[key][1:]):
-            sheet[f"{column}{start_row + i}"] = item
+        write_list(column, plain_dictionary_lists[key][1:])
 
         # Define a named range for the list of values
         named_range = f"{column}_List"  # You can name the range based on the column or other criteria
-        sheet.parent.create_named_range(
-            named_range, sheet, f"{column}{start_row}:{column}{start_row + len(long_list_values) - 1}"
-        )
+        add_named_range(named_range, f"{column}{start_row}:{column}{start_row + len(long_list_values) - 1}")
 
         # Create a data validation that references the named range
-        dv = DataValidation(type="list", formula1=f"={named_range}", showDropDown=True)
-        sheet.add_data_validation(dv)
-        for row in range(2, num_rows):
-            cell = sheet[f"{column}{row}"]
-            sheet.add_data_validation(dv)
-            dv.add(cell)
+        add_data_validation(DataValidation(type="list", formula1=f"={named_range}", showDropDown=True), column)
+
+    rows = (
+        [row_cells.get(get_column_letter(idx)) for idx in range(1, len(columns) + 1)]
+        for row_cells in (cells[row] for row in range(2, max(cells, default=1) + 1))
+    )
+    sheet = write_sheet(workbook, sheet_title, columns, rows, freeze_header=False)
+    for dv in data_validations:
+        sheet.data_validations.append(dv)
+
+
+def _reporting_months(start_date: datetime.date, end_date: datetime.date):
+    """Yield the (from_date, to_date) of the months from the month of `start_date` to the month of `end_date`"""
+    month = start_date.replace(day=1)
+    while month <= end_date:
+        next_month = month + relativedelta(months=1)
+        yield month, next_month - relativedelta(days=1)
+        month = next_month
+
+
+def generate_reporting_periods(projects, today: datetime.date | None = None) -> dict:
+    """Create the monthly reports of the projects from their start month to the current month.
+
+    The existing reports of all the projects are loaded in one query and compared in memory with the
+    reporting months: the missing months are created with one bulk insert, the reports outside of the
+    project period without activities are deleted and the `todo` reports of the past months become
+    `pending` with one update.
+    """
+    today = today or localdate()
+    projects = {project.pk: project for project in projects}
+    if not projects:
+        return {"created": 0, "deleted": 0, "updated": 0}
+
+    periods = {
+        project.pk: (localdate(project.start_date).replace(day=1), localdate(project.end_date))
+        for project in projects.values()
+    }
 
+    reported_months = set()
+    obsolete_reports = []
+    reports = (
+        ProjectMonthlyReport.objects.filter(project_id__in=projects, from_date__isnull=False)
+        .annotate(has_activity_plan_report=Exists(ActivityPlanReport.objects.filter(monthly_report=OuterRef("pk"))))
+        .values_list("pk", "project_id", "from_date", "has_activity_plan_report")
+    )
+    for pk, project_id, from_date, has_activity_plan_report in reports:
+        start_date, end_date = periods[project_id]
+        if start_date <= from_date <= end_date:
+            reported_months.add((project_id, from_date.replace(day=1)))
+        elif not has_activity_plan_report:
+            obsolete_reports.append(pk)
+
+    new_reports = [
+        ProjectMonthlyReport(
+            project_id=project_id,
+            from_date=from_date,
+            to_date=to_date,
+            state="pending" if to_date < today else "todo",
+        )
+        for project_id, (start_date, end_date) in periods.items()
+        for from_date, to_date in _reporting_months(start_date, min(end_date, today))
+        if (project_id, from_date) not in reported_months
+    ]
 
-def get_project_reporting_months(project):
-    start_date = project.start_date
-    start_date = start_date.replace(day=1)
-    end_date = project.end_date
-    today = now()
-    current_date = start_date
-    months = []
-    # Remove records that are beyond the project's start_date and end_date and without associated ActivityPlanReport
-    ProjectMonthlyReport.objects.filter(project=project).exclude(
-        from_date__gte=start_date, to_date__lte=end_date
-    ).annotate(has_activityplanreport=Exists(ActivityPlanReport.objects.filter(monthly_report=OuterRef("pk")))).filter(
-        has_activityplanreport=False
-    ).delete()
-
-    # Initialize variables
-    current_date = start_date
-    while current_date <= today:
-        from_date = current_date.replace(day=1)
-        first_day_next_month = current_date + relativedelta(months=1)
-        to_date = first_day_next_month - relativedelta(days=1)
-        if to_date < today:
-            state = "pending"
-        elif from_date <= today <= to_date:
-            state = "todo"
-        report, created = ProjectMonthlyReport.objects.get_or_create(
-            project=project, from_date=from_date, to_date=to_date, defaults={"state": state}
+    with transaction.atomic():
+        ProjectMonthlyReport.objects.filter(pk__in=obsolete_reports).delete()
+        ProjectMonthlyReport.objects.bulk_create(new_reports)
+        # The todo and pending states are not part of the reach facts and dashboards, no signal is needed
+        updated = ProjectMonthlyReport.objects.filter(project_id__in=projects, state="todo", to_date__lt=today).update(
+            state="pending"
         )
-        if not created:
-            # If the record exists, update its fields
-            report.save()
+        # Pending reports counters of the projects organizations home stats
+        if new_reports or obsolete_reports or updated:
+            schedule_organization_stats_refresh(project_ids=projects)
+
+    return {"created": len(new_reports), "deleted": len(obsolete_reports), "updated": updated}
+
+
+def get_project_reporting_months(project):
+    """Create the missing monthly reports of a project"""
+    return generate_reporting_periods([project])
 
-        months.append({"from_date": from_date, "to_date": to_date, "state": state})
 
-        current_date += relativedelta(months=1)
-    return months
+def copy_monthly_report_activities(source_report, monthly_report):
+    """Replace the activities of a monthly report with a copy of the activities of another report.
+
+    The activity plans, target locations and disaggregations reports are copied level by level with one
+    bulk insert each. The copied locations beneficiaries become existing beneficiaries.
+    """
+    with transaction.atomic():
+        monthly_report.activityplanreport_set.all().delete()
+
+        plan_reports = bulk_clone(
+            ActivityPlanReport.objects.filter(monthly_report=source_report),
+            values={"monthly_report_id": monthly_report.pk},
+            m2m=["response_types"],
+        )
+        location_reports = bulk_clone(
+            TargetLocationReport.objects.filter(activity_plan_report__in=plan_reports),
+            values={"beneficiary_status": "existing_beneficiaries"},
+            parents={"activity_plan_report_id": plan_reports},
+        )
+        bulk_clone(
+            DisaggregationLocationReport.objects.filter(target_location_report__in=location_reports),
+            parents={"target_location_report_id": location_reports},
+        )
+        # bulk_create does not send the signals that maintain the reach ledger
+        refresh_reach_ledger(
+            set(
+                TargetLocationReport.objects.filter(pk__in=location_reports.values()).values_list(
+                    "target_location_id", flat=True
+                )
+            )
+        )
+
+    return plan_reports
 
 
 def write_projects_organization_to_csv(monthly_reports, response):
@@ -583,3 +704,280 @@ def write_focal_persons_to_csv(monthly_reports, response):
 
     except Exception as e:
         print("Error:", e)
+
+
+# Monthly report states that are counted in the 5W dashboards
+REACH_REPORT_STATES = ["submited", "completed"]
+
+# ReachFact field -> DisaggregationLocationReport lookup
+REACH_FACT_FIELDS = {
+    "disaggregation_location_report_id": "id",
+    "monthly_report_id": "target_location_report__activity_plan_report__monthly_report_id",
+    "activity_plan_report_id": "target_location_report__activity_plan_report_id",
+    "target_location_report_id": "target_location_report_id",
+    "project_id": "target_location_report__activity_plan_report__monthly_report__project_id",
+    "activity_plan_id": "target_location_report__activity_plan_report__activity_plan_id",
+    "activity_domain_id": "target_location_report__activity_plan_report__activity_plan__activity_domain_id",
+    "activity_type_id": "target_location_report__activity_plan_report__activity_plan__activity_type_id",
+    "indicator_id": "target_location_report__activity_plan_report__activity_plan__indicator_id",
+    "target_location_id": "target_location_report__target_location_id",
+    "implementing_partner_id": "target_location_report__target_location__implementing_partner_id",
+    "province_id": "target_location_report__target_location__province_id",
+    "district_id": "target_location_report__target_location__district_id",
+    "disaggregation_id": "disaggregation_id",
+    "state": "target_location_report__activity_plan_report__monthly_report__state",
+    "from_date": "target_location_report__activity_plan_report__monthly_report__from_date",
+    "beneficiary_status": "target_location_report__beneficiary_status",
+    "reached": "reached",
+}
+
+REACH_FACT_BATCH_SIZE = 2000
+
+
+def refresh_reach_facts(disaggregation_location_reports):
+    """Rebuild the ReachFact rows of a DisaggregationLocationReport queryset.
+
+    The existing facts are deleted and the rows of reports in `REACH_REPORT_STATES` are
+    re-inserted from one joined query, so a refresh costs the same number of queries
+    whatever the size of the report.
+    """
+    rows = disaggregation_location_reports.filter(
+        target_location_report__activity_plan_report__monthly_report__state__in=REACH_REPORT_STATES
+    ).values_list(*REACH_FACT_FIELDS.values())
+
+    with transaction.atomic():
+        ReachFact.objects.filter(disaggregation_location_report__in=disaggregation_location_reports).delete()
+
+        facts = []
+        for row in rows.iterator(chunk_size=REACH_FACT_BATCH_SIZE):
+            facts.append(ReachFact(**dict(zip(REACH_FACT_FIELDS, row))))
+            if len(facts) >= REACH_FACT_BATCH_SIZE:
+                ReachFact.objects.bulk_create(facts)
+                facts = []
+        ReachFact.objects.bulk_create(facts)
+
+
+def refresh_monthly_report_reach_facts(monthly_reports):
+    """Rebuild the ReachFact rows of the given monthly report(s)"""
+    if isinstance(monthly_reports, ProjectMonthlyReport):
+        monthly_reports = [monthly_reports]
+
+    refresh_reach_facts(
+        DisaggregationLocationReport.objects.filter(
+            target_location_report__activity_plan_report__monthly_report__in=monthly_reports
+        )
+    )
+
+
+def get_disaggregations_target_and_reached(target_location_ids) -> dict:
+    """Return the target and the reached new beneficiaries of all the disaggregations of the target locations,
+    from one query of their targets and `ReachLedger` running totals.
+
+    Returns:
+        dict: `{target location id: {disaggregation id: {"target": int, "reached": int}}}`
+    """
+    reached = ReachLedger.objects.filter(
+        target_location_id=OuterRef("target_location_id"),
+        disaggregation_id=OuterRef("disaggregation_id"),
+        beneficiary_status="new_beneficiary",
+    ).values("reached")[:1]
+    rows = (
+        DisaggregationLocation.objects.filter(target_location_id__in=target_location_ids, disaggregation__isnull=False)
+        .annotate(reached=Coalesce(Subquery(reached), 0))
+        .values_list("target_location_id", "disaggregation_id", "target", "reached")
+    )
+
+    targets = {target_location_id: {} for target_location_id in target_location_ids}
+    for target_location_id, disaggregation_id, target, total in rows:
+        targets[target_location_id][disaggregation_id] = {"target": target, "reached": total}
+    return targets
+
+
+def _apply_reach_ledger_deltas(deltas: dict):
+    """Add the `{(target location id, disaggregation id, beneficiary status): [reached, reported reached]}`
+    deltas to the ReachLedger rows, creating the missing rows"""
+    with transaction.atomic():
+        for (target_location_id, disaggregation_id, beneficiary_status), (reached, reported) in deltas.items():
+            if not reached and not reported:
+                continue
+
+            rows = ReachLedger.objects.filter(
+                target_location_id=target_location_id,
+                disaggregation_id=disaggregation_id,
+                beneficiary_status=beneficiary_status,
+            )
+            changes = {
+                "reached": F("reached") + reached,
+                "reported_reached": F("reported_reached") + reported,
+                "updated_at": now(),
+            }
+            # A missing row is only created by additions, removals from a missing row are drift left to the rebuild
+            if not rows.update(**changes) and reached >= 0 and reported >= 0:
+                ReachLedger.objects.bulk_create(
+                    [
+                        ReachLedger(
+                            target_location_id=target_location_id,
+                            disaggregation_id=disaggregation_id,
+                            beneficiary_status=beneficiary_status,
+                        )
+                    ],
+                    ignore_conflicts=True,
+                )
+                rows.update(**changes)
+
+
+def update_reach_ledger(entries):
+    """Add or remove disaggregation reports from the ReachLedger running totals.
+
+    Args:
+        entries: `(target location report id, disaggregation id, reached, sign)` tuples, the sign is 1 to add
+            the reached to the totals and -1 to remove it.
+    """
+    entries = [entry for entry in entries if entry[0] and entry[1] and entry[2]]
+    if not entries:
+        return
+
+    location_reports = {
+        pk: (target_location_id, beneficiary_status or "", state)
+        for pk, target_location_id, beneficiary_status, state in TargetLocationReport.objects.filter(
+            pk__in={entry[0] for entry in entries}
+        ).values_list("pk", "target_location_id", "beneficiary_status", "activity_plan_report__monthly_report__state")
+    }
+
+    deltas = defaultdict(lambda: [0, 0])
+    for target_location_report_id, disaggregation_id, reached, sign in entries:
+        if target_location_report_id not in location_reports:
+            continue
+        target_location_id, beneficiary_status, state = location_reports[target_location_report_id]
+        delta = deltas[(target_location_id, disaggregation_id, beneficiary_status)]
+        delta[0] += sign * reached
+        if state in REACH_REPORT_STATES:
+            delta[1] += sign * reached
+
+    _apply_reach_ledger_deltas(deltas)
+
+
+def update_monthly_report_reach_ledger(monthly_report, sign: int):
+    """Add (sign 1) or remove (sign -1) the reached of a monthly report from the ReachLedger reported totals,
+    when it is submitted, approved or sent back"""
+    rows = (
+        DisaggregationLocationReport.objects.filter(
+            target_location_report__activity_plan_report__monthly_report=monthly_report, disaggregation__isnull=False
+        )
+        .values(
+            "target_location_report__target_location_id",
+            "disaggregation_id",
+            "target_location_report__beneficiary_status",
+        )
+        .annotate(total=Sum("reached"))
+        .order_by()
+    )
+    _apply_reach_ledger_deltas(
+        {
+            (
+                row["target_location_report__target_location_id"],
+                row["disaggregation_id"],
+                row["target_location_report__beneficiary_status"] or "",
+            ): (0, sign * (row["total"] or 0))
+            for row in rows
+        }
+    )
+
+
+# Location reports of the disaggregation reports being deleted, and target locations of the location reports
+# deleted with them, which the nullable foreign key lets the deletion remove first
+_deleted_reach_ledger_location_reports = set()
+_deleted_location_reports_target_locations = {}
+
+
+def track_deleted_reach_ledger_reports(target_location_report_id, target_location_id=None):
+    """Remember the location report of a disaggregation report about to be deleted, or the target location of a
+    location report about to be deleted. The ledger rows are recomputed by `refresh_deleted_reach_ledger_reports`."""
+    if target_location_id is not None:
+        _deleted_location_reports_target_locations[target_location_report_id] = target_location_id
+    elif target_location_report_id is not None:
+        _deleted_reach_ledger_location_reports.add(target_location_report_id)
+
+
+def refresh_deleted_reach_ledger_reports():
+    """Recompute the ReachLedger rows of the target locations of the deleted disaggregation reports.
+    The deletions are batched per table, the first call refreshes all of them and the next ones have nothing to do."""
+    target_location_report_ids = set(_deleted_reach_ledger_location_reports)
+    target_locations = dict(_deleted_location_reports_target_locations)
+    _deleted_reach_ledger_location_reports.clear()
+    _deleted_location_reports_target_locations.clear()
+    if not target_location_report_ids:
+        return
+
+    target_location_ids = {target_locations[pk] for pk in target_location_report_ids if pk in target_locations}
+    remaining_ids = target_location_report_ids - target_locations.keys()
+    if remaining_ids:
+        target_location_ids.update(
+            TargetLocationReport.objects.filter(pk__in=remaining_ids, target_location__isnull=False).values_list(
+                "target_location_id", flat=True
+            )
+        )
+    refresh_reach_ledger(target_location_ids)
+
+
+def refresh_reach_ledger(target_location_ids=None, repair: bool = True) -> int:
+    """Compare the ReachLedger rows of the target locations (all when None) with the totals of their
+    disaggregation reports, and repair the rows out of sync.
+
+    Returns:
+        int: The number of rows out of sync.
+    """
+    reports = DisaggregationLocationReport.objects.filter(
+        target_location_report__isnull=False, disaggregation__isnull=False
+    )
+    ledger = ReachLedger.objects.all()
+    if target_location_ids is not None:
+        reports = reports.filter(target_location_report__target_location_id__in=target_location_ids)
+        ledger = ledger.filter(target_location_id__in=target_location_ids)
+
+    expected = {
+        (row["target_location_report__target_location_id"], row["disaggregation_id"], row["status"] or ""): (
+            row["total"] or 0,
+            row["reported"] or 0,
+        )
+        for row in reports.values(
+            "target_location_report__target_location_id",
+            "disaggregation_id",
+            status=F("target_location_report__beneficiary_status"),
+        )
+        .annotate(
+            total=Sum("reached"),
+            reported=Sum(
+                "reached",
+                filter=Q(target_location_report__activity_plan_report__monthly_report__state__in=REACH_REPORT_STATES),
+            ),
+        )
+        .order_by()
+    }
+    current = {
+        (target_location_id, disaggregation_id, beneficiary_status): (reached, reported_reached)
+        for target_location_id, disaggregation_id, beneficiary_status, reached, reported_reached in ledger.values_list(
+            "target_location_id", "disaggregation_id", "beneficiary_status", "reached", "reported_reached"
+        )
+    }
+
+    drift = [
+        ReachLedger(
+            target_location_id=key[0],
+            disaggregation_id=key[1],
+            beneficiary_status=key[2],
+            reached=expected.get(key, (0, 0))[0],
+            reported_reached=expected.get(key, (0, 0))[1],
+        )
+        for key in expected.keys() | current.keys()
+        if expected.get(key, (0, 0)) != current.get(key, (0, 0))
+    ]
+    if repair and drift:
+        ReachLedger.objects.bulk_create(
+            drift,
+            batch_size=REACH_FACT_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["target_location", "disaggregation", "beneficiary_status"],
+            update_fields=["reached", "reported_reached", "updated_at"],
+        )
+    return len(drift)
@@ -1,71 +1,45 @@
 import plotly.graph_objects as go
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
-from django.db.models import Case, Count, IntegerField, Q, Sum, Value, When
+from django.db.models import Count, IntegerField, Q, Sum, Value
 from django.db.models.functions import Coalesce
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, render
 
-from project_reports.filters import Organization5WFilter
-from project_reports.models import ProjectMonthlyReport
+from core.charts import get_chart_spec
+from project_reports.filters import Organization5WFilter, ReachFactFilter
+from project_reports.models import ReachFact
+from project_reports.utils import REACH_REPORT_STATES
 from rh.models import Cluster, Organization
+from rh.utils import get_cached_dashboard_data, get_dashboard_cache_stats, normalize_filter_params
+from users.authorization import get_auth_context
 from users.utils import is_cluster_lead
 
 
-@login_required
-def cluster_5w_dashboard(request, cluster):
-    cluster = get_object_or_404(Cluster, code=cluster)
-
-    if not is_cluster_lead(
-        user=request.user,
-        clusters=[
-            cluster.code,
-        ],
-    ):
-        raise PermissionDenied
+def get_reach_facts(request, **filter_params):
+    """Return the 5W reach facts matching `filter_params` and the dashboard filter in `request.GET`"""
+    facts_filter = ReachFactFilter(request.GET, queryset=ReachFact.objects.filter(**filter_params), user=request.user)
 
-    user_country = request.user.profile.country
-    filter_params = {
-        "project__clusters__in": [cluster],
-        "state__in": ["submited", "completed"],
-        "project__user__profile__country": user_country,
-        "activityplanreport__activity_plan__activity_domain__clusters__in": [cluster],
-        "activityplanreport__targetlocationreport__beneficiary_status": "new_beneficiary",
-    }
+    # Filtering on many-to-many relations can duplicate rows, aggregate over distinct facts only
+    return ReachFact.objects.filter(pk__in=facts_filter.qs.values("pk"))
 
-    monthly_report_filter = Organization5WFilter(
-        request.GET,
-        queryset=ProjectMonthlyReport.objects.filter(**filter_params),
-        user=request.user,
-    )
 
-    counts = monthly_report_filter.qs.filter(**filter_params).aggregate(
-        report_indicators_count=Count("activityplanreport__activity_plan__indicator", distinct=True),
-        report_implementing_partners_count=Count(
-            "activityplanreport__targetlocationreport__target_location__implementing_partner", distinct=True
-        ),
-        report_target_location_province_count=Count(
-            "activityplanreport__targetlocationreport__target_location__province", distinct=True
-        ),
+def get_reach_dashboard_data(facts):
+    """Aggregate the 5W reach facts into the dashboard counts, line chart and reach by activity"""
+    counts = facts.aggregate(
+        report_indicators_count=Count("indicator", distinct=True),
+        report_implementing_partners_count=Count("implementing_partner", distinct=True),
+        report_target_location_province_count=Count("province", distinct=True),
     )
 
     people_reached_data = (
-        monthly_report_filter.qs.order_by("from_date")
+        facts.order_by("from_date")
         .values("from_date")
         .annotate(
             total_people_reached=Coalesce(
-                Sum(
-                    Case(
-                        When(
-                            ~Q(
-                                activityplanreport__targetlocationreport__disaggregationlocationreport__disaggregation__name__icontains="households",
-                            ),
-                            then="activityplanreport__targetlocationreport__disaggregationlocationreport__reached",
-                        ),
-                        default=Value(0),
-                        output_field=IntegerField(),
-                    )
-                ),
+                Sum("reached", filter=~Q(disaggregation__name__icontains="households")),
                 Value(0),
+                output_field=IntegerField(),
             )
         )
     )
@@ -81,30 +55,19 @@ def cluster_5w_dashboard(request, cluster):
     ]
 
     # people reached by activities
-    activity_domains = (
-        monthly_report_filter.qs.filter(**filter_params)
-        .values_list("activityplanreport__activity_plan__activity_domain__name", flat=True)
-        .distinct()
-    )
+    activity_domains = list(facts.order_by().values_list("activity_domain__name", flat=True).distinct())
 
     reach_by_activity = (
-        monthly_report_filter.qs.filter(**filter_params)
-        .values(
-            "activityplanreport__targetlocationreport__disaggregationlocationreport__disaggregation__name",
-            "activityplanreport__activity_plan__activity_domain__name",
-        )
-        .annotate(
-            total_people_reached=Sum("activityplanreport__targetlocationreport__disaggregationlocationreport__reached"),
-        )
+        facts.order_by()
+        .values("disaggregation__name", "activity_domain__name")
+        .annotate(total_people_reached=Sum("reached"))
     )
 
     # Organize data into a dictionary
     data_dict = {}
     for entry in reach_by_activity:
-        disaggregation_name = entry[
-            "activityplanreport__targetlocationreport__disaggregationlocationreport__disaggregation__name"
-        ]
-        activity_domain = entry["activityplanreport__activity_plan__activity_domain__name"]
+        disaggregation_name = entry["disaggregation__name"]
+        activity_domain = entry["activity_domain__name"]
         total_reached = entry["total_people_reached"]
 
         if disaggregation_name not in data_dict:
@@ -116,131 +79,125 @@ def cluster_5w_dashboard(request, cluster):
         if total_reached and all(value is not None for value in total_reached.values()):
             sum_disaggregation = sum(value for value in total_reached.values() if value is not None)
             data_dict[category]["total"] = sum_disaggregation
-    line_chart = get_line_chart(data, labels)
-    context = {
-        "cluster": cluster,
+
+    return {
         "counts": counts,
         "people_reached_labels": labels,
         "people_reached_data": data,
         "activity_domains": activity_domains,
         "reach_by_activity": data_dict,
-        "dashboard_filter": monthly_report_filter,
-        "line_chart": line_chart.to_html(),
     }
 
-    return render(request, "project_reports/cluster_5w_dashboard.html", context)
+
+def get_dashboard_cache_params(request, **extra_params) -> dict:
+    """Normalized dashboard filter parameters of the request, used in the dashboard cache key"""
+    params = normalize_filter_params(request.GET, Organization5WFilter.base_filters.keys())
+    if "project" in params:
+        # The project filter choices are limited to the user organization projects
+        params["user_organization"] = get_auth_context(request.user).organization_id
+    params.update(extra_params)
+    return params
 
 
 @login_required
-def org_5w_dashboard(request, code):
-    org = get_object_or_404(Organization, code=code)
+def cluster_5w_dashboard(request, cluster):
+    cluster = get_object_or_404(Cluster, code=cluster)
 
-    if not org.code == request.user.profile.organization.code and not is_cluster_lead(
-        request.user, org.clusters.values_list("code", flat=True)
+    if not is_cluster_lead(
+        user=request.user,
+        clusters=[
+            cluster.code,
+        ],
     ):
         raise PermissionDenied
 
-    user_org = request.user.profile.organization
-    filter_params = {
-        "project__organization": user_org,
-        "state__in": ["submited", "completed"],
-        "activityplanreport__targetlocationreport__beneficiary_status": "new_beneficiary",
-    }
+    user_country_id = get_auth_context(request.user).country_id
 
-    monthly_report_filter = Organization5WFilter(
-        request.GET,
-        queryset=ProjectMonthlyReport.objects.filter(**filter_params),
-        user=request.user,
+    facts = get_reach_facts(
+        request,
+        project__clusters=cluster,
+        state__in=REACH_REPORT_STATES,
+        project__user__profile__country_id=user_country_id,
+        activity_domain__clusters=cluster,
+        beneficiary_status="new_beneficiary",
     )
-    monthly_reports = monthly_report_filter.qs
-
-    counts = monthly_reports.aggregate(
-        report_indicators_count=Count("activityplanreport__activity_plan__indicator", distinct=True),
-        report_implementing_partners_count=Count(
-            "activityplanreport__targetlocationreport__target_location__implementing_partner", distinct=True
-        ),
-        report_target_location_province_count=Count(
-            "activityplanreport__targetlocationreport__target_location__province", distinct=True
-        ),
+    dashboard_data = get_cached_dashboard_data(
+        view="cluster_5w_dashboard",
+        scopes=[f"cluster:{cluster.pk}"],
+        params=get_dashboard_cache_params(request, country=user_country_id),
+        compute=lambda: get_reach_dashboard_data(facts),
     )
 
-    people_reached_data = (
-        monthly_reports.order_by("from_date")
-        .values("from_date")
-        .annotate(
-            total_people_reached=Coalesce(
-                Sum(
-                    Case(
-                        When(
-                            ~Q(
-                                activityplanreport__targetlocationreport__disaggregationlocationreport__disaggregation__name__icontains="households",
-                            ),
-                            then="activityplanreport__targetlocationreport__disaggregationlocationreport__reached",
-                        ),
-                        default=Value(0),
-                        output_field=IntegerField(),
-                    )
-                ),
-                Value(0),
-                output_field=IntegerField(),
-            )
-        )
-    )
+    # The filter form of the dashboard
+    monthly_report_filter = Organization5WFilter(request.GET, user=request.user)
 
-    counts["people_reached"] = 0
-    for report in people_reached_data:
-        counts["people_reached"] += report["total_people_reached"]
+    line_chart = get_people_reached_chart(dashboard_data)
+    context = {
+        "cluster": cluster,
+        **dashboard_data,
+        "dashboard_filter": monthly_report_filter,
+        "line_chart": line_chart,
+    }
 
-    labels = [report["from_date"].strftime("%b") for report in people_reached_data]
-    data = [
-        report["total_people_reached"] if report["total_people_reached"] is not None else 0
-        for report in people_reached_data
-    ]
+    return render(request, "project_reports/cluster_5w_dashboard.html", context)
 
-    activity_domains = monthly_reports.values_list(
-        "activityplanreport__activity_plan__activity_domain__name", flat=True
-    ).distinct()
 
-    reach_by_activity = monthly_reports.values(
-        "activityplanreport__targetlocationreport__disaggregationlocationreport__disaggregation__name",
-        "activityplanreport__activity_plan__activity_domain__name",
-    ).annotate(
-        total_people_reached=Sum("activityplanreport__targetlocationreport__disaggregationlocationreport__reached"),
-    )
-    # Organize data into a dictionary
-    data_dict = {}
+@login_required
+def org_5w_dashboard(request, code):
+    org = get_object_or_404(Organization, code=code)
 
-    for entry in reach_by_activity:
-        disaggregation_name = entry[
-            "activityplanreport__targetlocationreport__disaggregationlocationreport__disaggregation__name"
-        ]
-        activity_domain = entry["activityplanreport__activity_plan__activity_domain__name"]
-        total_reached = entry["total_people_reached"]
+    if not org.pk == get_auth_context(request.user).organization_id and not is_cluster_lead(
+        request.user, org.clusters.values_list("code", flat=True)
+    ):
+        raise PermissionDenied
 
-        if disaggregation_name not in data_dict:
-            data_dict[disaggregation_name] = {}
+    user_org_id = get_auth_context(request.user).organization_id
 
-        data_dict[disaggregation_name][activity_domain] = total_reached
+    facts = get_reach_facts(
+        request,
+        project__organization_id=user_org_id,
+        state__in=REACH_REPORT_STATES,
+        beneficiary_status="new_beneficiary",
+    )
+    dashboard_data = get_cached_dashboard_data(
+        view="org_5w_dashboard",
+        scopes=[f"organization:{user_org_id}"],
+        params=get_dashboard_cache_params(request),
+        compute=lambda: get_reach_dashboard_data(facts),
+    )
 
-    for category, total_reached in data_dict.items():
-        if total_reached and all(value is not None for value in total_reached.values()):
-            sum_disaggregation = sum(value for value in total_reached.values() if value is not None)
-            data_dict[category]["total"] = sum_disaggregation
-    line_chart = get_line_chart(data, labels)
+    # The filter form of the dashboard
+    monthly_report_filter = Organization5WFilter(request.GET, user=request.user)
+
+    line_chart = get_people_reached_chart(dashboard_data)
     context = {
         "org": org,
-        "counts": counts,
-        "people_reached_labels": labels,
-        "people_reached_data": data,
-        "activity_domains": activity_domains,
-        "reach_by_activity": data_dict,
+        **dashboard_data,
         "dashboard_filter": monthly_report_filter,
-        "line_chart": line_chart.to_html(),
+        "line_chart": line_chart,
     }
 
     return render(request, "project_reports/org_5w_dashboard.html", context)
 
 
+@login_required
+def dashboard_cache_stats(request):
+    """Hits and misses of the 5W and stock dashboards cache"""
+    if not request.user.is_superuser:
+        raise PermissionDenied
+
+    return JsonResponse(get_dashboard_cache_stats())
+
+
+def get_people_reached_chart(dashboard_data) -> str:
+    """JSON spec of the people reached monthly trend chart"""
+    return get_chart_spec(
+        "people_reached",
+        {"data": dashboard_data["people_reached_data"], "labels": dashboard_data["people_reached_labels"]},
+        lambda chart_data: get_line_chart(chart_data["data"], chart_data["labels"]),
+    )
+
+
 def get_line_chart(data, labels):
     line_chart = go.Figure()
     # Plot each metric as a line
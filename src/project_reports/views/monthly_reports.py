@@ -16,20 +16,19 @@ from django.template import loader
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from django_htmx.http import HttpResponseClientRedirect
-from extra_settings.models import Setting
 
-from project_reports.utils import get_project_reporting_months
+from core.settings_snapshot import get_setting
+from project_reports.utils import (
+    copy_monthly_report_activities,
+    get_project_reporting_months,
+    refresh_reach_ledger,
+)
 from rh.models import (
-    ActivityDetail,
-    ActivityDomain,
     ActivityPlan,
-    ActivityType,
     Disaggregation,
-    FacilitySiteType,
-    Indicator,
-    Location,
     LocationType,
     Project,
+    TargetLocation,
 )
 from users.utils import is_cluster_lead
 
@@ -229,7 +228,7 @@ def details_monthly_progress_view(request, project, report):
         request.GET, queryset=activity_plan_report_list, monthly_report=monthly_report
     )
 
-    RECORDS_PER_PAGE = Setting.get("RECORDS_PER_PAGE", default=10)
+    RECORDS_PER_PAGE = get_setting("RECORDS_PER_PAGE", default=10)
     per_page = request.GET.get("per_page", RECORDS_PER_PAGE)
     p = Paginator(ap_report_filter.qs, per_page=per_page)
     page = request.GET.get("page", 1)
@@ -255,54 +254,17 @@ def copy_project_monthly_report_view(request, report):
     #     "approved_on"
     # )
 
-    last_month_report = None
-
-    try:
-        last_month_report = (
-            ProjectMonthlyReport.objects.select_related("project")
-            .prefetch_related(
-                Prefetch(
-                    "activityplanreport_set",
-                    queryset=ActivityPlanReport.objects.prefetch_related(
-                        Prefetch(
-                            "targetlocationreport_set",
-                            queryset=TargetLocationReport.objects.prefetch_related(
-                                Prefetch(
-                                    "disaggregationlocationreport_set",
-                                    DisaggregationLocationReport.objects.select_related("disaggregation"),
-                                )
-                            ),
-                        )
-                    ),
-                )
-            )
-            .filter(project=monthly_report.project, state="completed")
-            .latest("approved_on")
-        )
-    except Exception:
+    last_month_report = (
+        ProjectMonthlyReport.objects.filter(project=monthly_report.project, state="completed")
+        .order_by("-approved_on")
+        .first()
+    )
+    if last_month_report is None:
         messages.error(request, "At least one last month approved report is required.")
         return HttpResponse(200)
 
-    # Check if the new monthly report was successfully created.
-    # Get all activity plans reports associated with the current monthly report.
-    activity_plan_reports = last_month_report.activityplanreport_set.all()
-
-    # delete existing records
-    monthly_report.activityplanreport_set.all().delete()
-
-    # Iterate through each activity plan  report and copy it to the new monthly report.
-    for plan_report in activity_plan_reports:
-        new_plan_report = copy_monthly_report_activity_plan(monthly_report, plan_report)
-        location_reports = plan_report.targetlocationreport_set.all()
-
-        # Iterate through target locations reports and copy them to the new plan report.
-        for location_report in location_reports:
-            new_location_report = copy_target_location_report(new_plan_report, location_report)
-            disaggregation_location_reports = location_report.disaggregationlocationreport_set.all()
-
-            # Iterate through disaggregation locations reports and copy them to the new location report.
-            for disaggregation_location_report in disaggregation_location_reports:
-                copy_disaggregation_location_reports(new_location_report, disaggregation_location_report)
+    # Replace the activities of the report with the ones of the last approved report
+    copy_monthly_report_activities(last_month_report, monthly_report)
 
     messages.success(request, "Report activities copied successfully.")
     url = reverse_lazy(
@@ -316,72 +278,6 @@ def copy_project_monthly_report_view(request, report):
     return HttpResponseClientRedirect(url)
 
 
-def copy_monthly_report_activity_plan(monthly_report, plan_report):
-    """Copy activity plan reports"""
-    try:
-        # Duplicate the original activity plan report by retrieving it with the provided primary key.
-        new_plan_report = get_object_or_404(ActivityPlanReport, pk=plan_report.pk)
-        response_types = new_plan_report.response_types.all()
-        new_plan_report.pk = None  # Generate a new primary key for the duplicated plan report.
-        new_plan_report.monthly_report = monthly_report
-
-        new_plan_report.save()
-
-        new_plan_report.response_types.set(response_types)
-
-        # Return the duplicated plan report.
-        return new_plan_report
-    except Exception as _:
-        # If an exception occurs, return False to indicate the copy operation was not successful.
-        return False
-
-
-def copy_target_location_report(plan_report, location_report):
-    """Copy Target Locations"""
-    try:
-        # Duplicate the original target location report report report
-        # by retrieving it with the provided primary key.
-        new_location_report = get_object_or_404(TargetLocationReport, pk=location_report.pk)
-        new_location_report.pk = None  # Generate a new primary key for the duplicated location.
-        new_location_report.save()  # Save the duplicated location to the database.
-
-        # Associate the duplicated location with the new activity plan report.
-        new_location_report.activity_plan_report = plan_report
-        new_location_report.beneficiary_status = "existing_beneficiaries"
-
-        new_location_report.save()
-
-        # Return the duplicated location.
-        return new_location_report
-    except Exception as _:
-        # If an exception occurs, return False to indicate the copy operation was not successful.
-        return False
-
-
-def copy_disaggregation_location_reports(location_report, disaggregation_location_report):
-    """Copy Disaggregation Locations"""
-    try:
-        # Duplicate the original disaggregation location by retrieving it with the provided
-        # primary key.
-        new_disaggregation_location_report = get_object_or_404(
-            DisaggregationLocationReport, pk=disaggregation_location_report.pk
-        )
-        new_disaggregation_location_report.pk = None  # Generate a new primary key for the duplicated location report.
-        new_disaggregation_location_report.save()  # Save the duplicated location report to the database.
-
-        # Associate the duplicated disaggregation location report with the new target location report.
-        new_disaggregation_location_report.target_location_report = location_report
-
-        # Save the changes made to the duplicated disaggregation location report.
-        new_disaggregation_location_report.save()
-
-        # Return True to indicate that the copy operation was successful.
-        return True
-    except Exception as _:
-        # If an exception occurs, return False to indicate the copy operation was not successful.
-        return False
-
-
 @login_required
 def delete_project_monthly_report_view(request, report):
     monthly_report = get_object_or_404(ProjectMonthlyReport, pk=report)
@@ -512,6 +408,118 @@ def reject_monthly_report_view(request, report):
     return JsonResponse(response_data)
 
 
+MONTHLY_REPORT_IMPORT_REQUIRED_COLUMNS = [
+    "indicator",
+    "activity_domain",
+    "activity_type",
+    "admin0pcode",
+    "admin1pcode",
+    "admin2pcode",
+]
+
+
+def _row_errors(df, mask, error):
+    """Format the `error` of every row of `df` selected by `mask`"""
+    return [f"<span>Row [{row.row}]: {error.format(**row._asdict())} </span><br/>" for row in df[mask].itertuples()]
+
+
+def _read_monthly_report_import(monthly_report, df):
+    """Validate the imported monthly report activities and map their codes to ids with pandas.
+
+    Returns the rows with their `activity_plan_id`, `target_location_id` and `location_type_id`,
+    the disaggregations columns of the project and the errors messages.
+    """
+    missing_columns = [column for column in MONTHLY_REPORT_IMPORT_REQUIRED_COLUMNS if column not in df.columns]
+    if missing_columns:
+        return None, {}, [f"<span>{column.capitalize()} column is missing. </span><br/>" for column in missing_columns]
+
+    df = df.copy()
+    df["row"] = df.index + 2
+    for column in ["activity_detail", "location_type"]:
+        if column not in df.columns:
+            df[column] = None
+
+    errors = []
+
+    # Validate required columns
+    missing = df[MONTHLY_REPORT_IMPORT_REQUIRED_COLUMNS].isna()
+    for column in MONTHLY_REPORT_IMPORT_REQUIRED_COLUMNS:
+        errors += _row_errors(df, missing[column], f"{column.capitalize()} is missing.")
+    df = df[~missing.any(axis=1)]
+
+    project = monthly_report.project
+
+    # Map the activity domain, type, indicator and detail to the project activity plans
+    activity_plans = pd.DataFrame.from_records(
+        ActivityPlan.objects.filter(project=project).values_list(
+            "id", "activity_domain__code", "activity_type__code", "indicator__name", "activity_detail__code"
+        ),
+        columns=["activity_plan_id", "activity_domain", "activity_type", "indicator", "plan_activity_detail"],
+    )
+    df = df.merge(activity_plans, how="left", on=["activity_domain", "activity_type", "indicator"])
+
+    no_activity_plan = df["activity_plan_id"].isna()
+    errors += _row_errors(
+        df,
+        no_activity_plan,
+        "The project does not have an activity plan for {activity_domain}, {activity_type} and {indicator}.",
+    )
+    df = df[~no_activity_plan]
+
+    # Keep the plan of the activity detail, or one mismatched plan per row to report it
+    detail_match = df["activity_detail"].isna() | (df["activity_detail"] == df["plan_activity_detail"])
+    df = df[detail_match | ~df["row"].isin(df.loc[detail_match, "row"])].drop_duplicates("row")
+
+    no_activity_detail = df["activity_detail"].notna() & (df["activity_detail"] != df["plan_activity_detail"])
+    errors += _row_errors(
+        df,
+        no_activity_detail,
+        "The project does not have an activity plan for {activity_domain}, {activity_type} and {indicator} "
+        "with the activity detail {activity_detail}.",
+    )
+    df = df[~no_activity_detail]
+
+    # Map the locations to the target locations of the activity plans
+    target_locations = pd.DataFrame.from_records(
+        TargetLocation.objects.filter(activity_plan__project=project)
+        .order_by("pk")
+        .values_list("id", "activity_plan_id", "country__code", "province__code", "district__code"),
+        columns=["target_location_id", "activity_plan_id", "admin0pcode", "admin1pcode", "admin2pcode"],
+    ).drop_duplicates(["activity_plan_id", "admin0pcode", "admin1pcode", "admin2pcode"])
+    df = df.merge(target_locations, how="left", on=["activity_plan_id", "admin0pcode", "admin1pcode", "admin2pcode"])
+
+    no_target_location = df["target_location_id"].isna()
+    errors += _row_errors(
+        df,
+        no_target_location,
+        "The activity plan does not have a target location in {admin0pcode}, {admin1pcode} and {admin2pcode}.",
+    )
+    df = df[~no_target_location]
+
+    location_types = pd.DataFrame.from_records(
+        LocationType.objects.values_list("id", "name"), columns=["location_type_id", "location_type"]
+    ).drop_duplicates("location_type")
+    df = df.merge(location_types, how="left", on="location_type")
+
+    unknown_location_type = df["location_type"].notna() & df["location_type_id"].isna()
+    errors += _row_errors(df, unknown_location_type, "Location Type {location_type} does not exist.")
+
+    # The disaggregations of the project target locations, once per upload
+    disaggregations = {
+        disaggregation.name: disaggregation
+        for disaggregation in Disaggregation.objects.filter(disaggregationlocation__target_location__project=project)
+        .distinct()
+        .order_by("pk")
+        if disaggregation.name in df.columns
+    }
+    for name in disaggregations:
+        reached = pd.to_numeric(df[name], errors="coerce")
+        errors += _row_errors(df, df[name].notna() & reached.isna(), f"{name} reached value is not a number.")
+        df[name] = reached
+
+    return df, disaggregations, errors
+
+
 @login_required
 def import_monthly_reports(request, report):
     """Import monthly report activities via excel."""
@@ -525,184 +533,57 @@ def import_monthly_reports(request, report):
                 success = False
                 message = "No Data in the file!"
             else:
-                success = True
-                message = ""
-
-                with transaction.atomic():
-                    for index, row in df.iterrows():
-                        message = ""
-
-                        # TODO: Handle same file upload multiple times,
-                        # check all of the file first and then run import
-
-                        # Get or create Indicator
-                        indicator_name = row.get("indicator")
-                        activity_domain_name = row.get("activity_domain")
-                        activity_type_name = row.get("activity_type")
-                        activity_detail_name = row.get("activity_detail")
-                        country_name = row.get("admin0pcode")
-                        province_name = row.get("admin1pcode")
-                        district_name = row.get("admin2pcode")
-                        zone_name = row.get("zone")
-                        location_type_name = row.get("location_type")
-                        facility_site_type_name = row.get("facility_site_type")
-
-                        # Validate required columns
-                        columns_to_check = [
-                            "indicator",
-                            "activity_domain",
-                            "activity_type",
-                            "admin0pcode",
-                            "admin1pcode",
-                            "admin2pcode",
-                        ]
-                        required_column_missing = False
-                        for column in columns_to_check:
-                            if pd.isnull(row[column]):
-                                required_column_missing = True
-                                message += f"<span>Row [{index + 2}]: {column.capitalize()} is missing. </span><br/>"
-
-                        if required_column_missing:
-                            success = False
-                            continue  # Skip the rest of the loop for this row
-
-                        try:
-                            indicator = get_object_or_404(Indicator, name=indicator_name)
-                            activity_domain = get_object_or_404(ActivityDomain, code=activity_domain_name)
-                            activity_type = get_object_or_404(ActivityType, code=activity_type_name)
-                        except Exception as e:
-                            success = False
-                            message += f"<span>Row [{index + 2}]: {e} </span><br/>"
-                            continue  # Skip the rest of the loop for this row
-
-                        activity_plan_params = {
-                            "project": monthly_report.project,
-                            "activity_domain": activity_domain,
-                            "activity_type": activity_type,
+                df, disaggregations, errors = _read_monthly_report_import(monthly_report, df)
+                success = not errors
+                message = "".join(errors)
+
+                # Only import a file without errors, the same file can be imported again once fixed
+                if success:
+                    with transaction.atomic():
+                        activity_plan_reports = {
+                            activity_plan_report.activity_plan_id: activity_plan_report
+                            for activity_plan_report in monthly_report.activityplanreport_set.all()
                         }
-                        if not pd.isna(activity_detail_name):
-                            try:
-                                activity_detail = ActivityDetail.objects.get(code=activity_detail_name)
-                            except ActivityDetail.DoesNotExist:
-                                continue
-
-                            if activity_detail:
-                                activity_plan_params.update({"activity_detail": activity_detail})
-                        try:
-                            activity_plan = get_object_or_404(ActivityPlan, **activity_plan_params)
-                        except Exception as e:
-                            success = False
-                            message += f"<span>Row [{index + 2}]: {e} </span><br/>"
-                            break
-
-                        # Create ActivityPlanReport
-                        activity_plan_report_params = {
-                            "monthly_report": monthly_report,
-                            "activity_plan": activity_plan,
-                            "indicator": indicator,
-                        }
-                        activity_plan_report = ActivityPlanReport.objects.filter(
-                            monthly_report=monthly_report,
-                            activity_plan=activity_plan,
-                            indicator=indicator,
+                        new_activity_plan_reports = [
+                            ActivityPlanReport(monthly_report=monthly_report, activity_plan_id=activity_plan_id)
+                            for activity_plan_id in df["activity_plan_id"].astype(int).unique().tolist()
+                            if activity_plan_id not in activity_plan_reports
+                        ]
+                        for activity_plan_report in ActivityPlanReport.objects.bulk_create(new_activity_plan_reports):
+                            activity_plan_reports[activity_plan_report.activity_plan_id] = activity_plan_report
+
+                        target_location_reports = TargetLocationReport.objects.bulk_create(
+                            [
+                                TargetLocationReport(
+                                    activity_plan_report=activity_plan_reports[int(row.activity_plan_id)],
+                                    target_location_id=int(row.target_location_id),
+                                    location_type_id=None
+                                    if pd.isna(row.location_type_id)
+                                    else int(row.location_type_id),
+                                )
+                                for row in df[
+                                    ["activity_plan_id", "target_location_id", "location_type_id"]
+                                ].itertuples()
+                            ]
                         )
-                        if not activity_plan_report:
-                            activity_plan_report = ActivityPlanReport.objects.create(**activity_plan_report_params)
-                        else:
-                            activity_plan_report = activity_plan_report[0]
-
-                        # Handle Location details
-                        try:
-                            country = get_object_or_404(Location, code=country_name)
-                            province = get_object_or_404(Location, code=province_name)
-                            district = get_object_or_404(Location, code=district_name)
-                        except Exception as e:
-                            success = False
-                            message += f"<span>Row [{index + 2}]: {e} </span><br/>"
-                            break
-
-                        target_location_report_params = {
-                            "activity_plan_report": activity_plan_report,
-                            "country": country,
-                            "province": province,
-                            "district": district,
-                        }
 
-                        if not pd.isna(zone_name):
-                            try:
-                                zone = Location.objects.get_object_or_404(Location, name=zone_name)
-                            except Location.DoesNotExist:
-                                continue
-
-                            if zone:
-                                target_location_report_params.update({"zone": zone})
-
-                        # Create TargetLocationReport
-                        if not pd.isna(location_type_name):
-                            try:
-                                location_type = get_object_or_404(LocationType, name=location_type_name)
-                            except LocationType.DoesNotExist:
-                                continue
-
-                            if location_type:
-                                target_location_report_params.update({"location_type": location_type})
-
-                        # Create TargetLocationReport
-                        if not pd.isna(facility_site_type_name):
-                            try:
-                                facility_site_type = get_object_or_404(FacilitySiteType, name=facility_site_type_name)
-                            except FacilitySiteType.DoesNotExist:
-                                continue
-
-                            if facility_site_type:
-                                target_location_report_params.update({"facility_site_type": facility_site_type})
-
-                        if target_location_report_params:
-                            target_location_report = TargetLocationReport.objects.create(
-                                **target_location_report_params
-                            )
-
-                        if not target_location_report:
-                            success = False
-                            message += f"<span>Row [{index + 2}]: Failed to create Target Location Report. </span><br/>"
-                            continue  # Skip the rest of the loop for this row
-
-                        activity_report_target = 0
-                        activity_plans = monthly_report.project.activityplan_set.all()
-                        disaggregations = []
-                        disaggregation_list = []
-                        for plan in activity_plans:
-                            target_locations = plan.targetlocation_set.all()
-                            for location in target_locations:
-                                disaggregation_locations = location.disaggregationlocation_set.all()
-                                for dl in disaggregation_locations:
-                                    if dl.disaggregation.name not in disaggregation_list:
-                                        disaggregation_list.append(dl.disaggregation.name)
-                                        disaggregations.append(dl.disaggregation.name)
-                                    else:
-                                        continue
-
-                        for disaggregation in disaggregations:
-                            disaggregation_name = disaggregation
-                            disaggregation_target = row.get(disaggregation, 0)
-                            if not pd.isna(disaggregation_target):
-                                activity_report_target += row.get(disaggregation, 0)
-                            if not pd.isna(disaggregation_target) and not pd.isna(disaggregation_name):
-                                disaggregation = Disaggregation.objects.get(name=disaggregation_name)
-                            else:
-                                continue
-
-                            disaggregation_location_report_params = {
-                                "target_location_report": target_location_report,
-                                "disaggregation": disaggregation,
-                                "target": int(disaggregation_target),
-                            }
-                            DisaggregationLocationReport.objects.create(**disaggregation_location_report_params)
-
-                        activity_plan_report.target_achieved += activity_report_target
-                        activity_plan_report.save()
-
-                        success = True
+                        # One disaggregation report per row and reached disaggregation column
+                        reached = df[list(disaggregations)].reset_index(drop=True)
+                        reached["target_location_report"] = target_location_reports
+                        reached = reached.melt(
+                            id_vars="target_location_report", var_name="disaggregation", value_name="reached"
+                        ).dropna(subset=["reached"])
+                        DisaggregationLocationReport.objects.bulk_create(
+                            [
+                                DisaggregationLocationReport(
+                                    target_location_report=row.target_location_report,
+                                    disaggregation=disaggregations[row.disaggregation],
+                                    reached=int(row.reached),
+                                )
+                                for row in reached.itertuples()
+                            ]
+                        )
+                        refresh_reach_ledger(df["target_location_id"].astype(int).unique().tolist())
 
             url = reverse(
                 "view_monthly_report",
@@ -1,8 +1,6 @@
-import json
-
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
 from django.db.models import F, Q, Sum
 from django.forms import inlineformset_factory
 from django.http import HttpResponse, JsonResponse
@@ -11,9 +9,9 @@ from django.urls import reverse, reverse_lazy
 from django.utils.safestring import mark_safe
 from django_htmx.http import HttpResponseClientRedirect
 
+from core.pagination import paginate
 from rh.models import (
     Disaggregation,
-    DisaggregationLocation,
     Project,
     TargetLocation,
 )
@@ -30,40 +28,21 @@ from ..models import (
     ProjectMonthlyReport,
     TargetLocationReport,
 )
+from ..utils import get_disaggregations_target_and_reached
 
 
 @login_required
-def get_target_and_reached_of_disaggregationlocation(request):
-    data = json.loads(request.body)
-
-    target_location_id = data.get("target_location_id")
-    disaggregation_id = data.get("disaggregation_id")
-
-    if not target_location_id or not disaggregation_id:
-        return JsonResponse({"error": "Both target_location_id and disaggregation_id are required."}, status=400)
-
+def get_target_and_reached_of_disaggregations(request):
+    """Target and reached new beneficiaries of the disaggregations of the `target_location` GET parameters"""
     try:
-        target_location_id = int(target_location_id)
-        disaggregation_id = int(disaggregation_id)
+        target_location_ids = [int(pk) for pk in request.GET.getlist("target_location")]
     except ValueError:
-        return JsonResponse({"error": "Both target_location_id and disaggregation_id must be integers."}, status=400)
+        return JsonResponse({"error": "target_location must be integers."}, status=400)
 
-    dis_loc = DisaggregationLocation.objects.filter(
-        disaggregation_id=disaggregation_id, target_location_id=target_location_id
-    ).first()
+    if not target_location_ids:
+        return JsonResponse({"error": "At least one target_location is required."}, status=400)
 
-    total_reached = (
-        DisaggregationLocationReport.objects.filter(
-            target_location_report__target_location_id=target_location_id,
-            disaggregation_id=disaggregation_id,
-        )
-        .filter(
-            target_location_report__beneficiary_status="new_beneficiary",
-        )
-        .aggregate(total_reached=Sum("reached"))["total_reached"]
-    )
-
-    return JsonResponse({"target": dis_loc.target, "reached": total_reached})
+    return JsonResponse({"target_locations": get_disaggregations_target_and_reached(target_location_ids)})
 
 
 @login_required
@@ -94,11 +73,7 @@ def list_report_target_locations(request, project, report, plan=None):
 
     # Get the target location total_target here
 
-    per_page = request.GET.get("per_page", 10)
-    paginator = Paginator(tl_filter.qs, per_page=per_page)
-    page = request.GET.get("page", 1)
-    report_locations = paginator.get_page(page)
-    report_locations.adjusted_elided_pages = paginator.get_elided_page_range(page)
+    report_locations = paginate(request, tl_filter.qs, per_page=request.GET.get("per_page", 10))
 
     context = {
         "project": project,
@@ -114,6 +89,7 @@ def list_report_target_locations(request, project, report, plan=None):
 def hx_diaggregation_tabular_form(request):
     target_location = None
     report_disaggregation_formset = None
+    disaggregations_target_and_reached = {}
 
     try:
         target_location_id = request.POST.get("target_location", None)
@@ -137,10 +113,17 @@ def hx_diaggregation_tabular_form(request):
             target_location=target_location,
             initial=[{"disaggregation": disaggregation} for disaggregation in related_disaggregations],
         )
+        disaggregations_target_and_reached = get_disaggregations_target_and_reached([target_location.pk])[
+            target_location.pk
+        ]
     except Exception:
         pass
 
-    context = {"target_location": target_location, "report_disaggregation_formset": report_disaggregation_formset}
+    context = {
+        "target_location": target_location,
+        "report_disaggregation_formset": report_disaggregation_formset,
+        "disaggregations_target_and_reached": disaggregations_target_and_reached,
+    }
 
     return render(
         request, "project_reports/report_target_locations/partials/_disaggregation_tabular_form.html", context
@@ -180,12 +163,14 @@ def create_report_target_location(request, plan):
         )
 
         if location_report_form.is_valid() and report_disaggregation_formset.is_valid():
-            location_report = location_report_form.save(commit=False)
-            location_report.activity_plan_report = plan_report
-            location_report.save()
+            # The reach ledger is updated with the reports
+            with transaction.atomic():
+                location_report = location_report_form.save(commit=False)
+                location_report.activity_plan_report = plan_report
+                location_report.save()
 
-            report_disaggregation_formset.instance = location_report
-            report_disaggregation_formset.save()
+                report_disaggregation_formset.instance = location_report
+                report_disaggregation_formset.save()
 
             messages.success(
                 request,
@@ -267,12 +252,14 @@ def update_report_target_locations(request, project, plan, location):
             target_location=location_report.target_location,
         )
         if location_report_form.is_valid() and report_disaggregation_formset.is_valid():
-            location_report = location_report_form.save(commit=False)
-            location_report.activity_plan_report = plan_report
-            location_report.save()
-
-            report_disaggregation_formset.instance = location_report
-            report_disaggregation_formset.save()
+            # The reach ledger is updated with the reports
+            with transaction.atomic():
+                location_report = location_report_form.save(commit=False)
+                location_report.activity_plan_report = plan_report
+                location_report.save()
+
+                report_disaggregation_formset.instance = location_report
+                report_disaggregation_formset.save()
             messages.success(
                 request,
                 mark_safe(
@@ -318,6 +305,9 @@ def update_report_target_locations(request, project, plan, location):
             "location_report": location_report,
             "location_report_form": location_report_form,
             "report_disaggregation_formset": report_disaggregation_formset,
+            "disaggregations_target_and_reached": get_disaggregations_target_and_reached(
+                [location_report.target_location_id]
+            )[location_report.target_location_id],
             "report_plan": plan_report,
             "monthly_report": monthly_report,
             "project": monthly_report.project,
@@ -4,22 +4,24 @@ from io import BytesIO
 import pandas as pd
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.views.decorators.http import require_http_methods
-from openpyxl import Workbook
 
+from core.xlsx import XLSX_CONTENT_TYPE, create_workbook
 from rh.models import (
     ActivityDomain,
     ActivityPlan,
+    ActivityType,
     BeneficiaryType,
     Disaggregation,
     GrantType,
     ImplementationModalityType,
+    Indicator,
     Location,
     LocationType,
-    Organization,
     PackageType,
     RationSize,
     RationType,
@@ -36,7 +38,7 @@ from ..models import (
     ResponseType,
     TargetLocationReport,
 )
-from ..utils import write_import_report_template_sheet
+from ..utils import refresh_reach_ledger, write_import_report_template_sheet
 
 RECORDS_PER_PAGE = 10
 
@@ -45,16 +47,10 @@ RECORDS_PER_PAGE = 10
 def export_report_activities_import_template(request, report):
     monthly_report = get_object_or_404(ProjectMonthlyReport, pk=report)
 
-    workbook = Workbook()
+    workbook = create_workbook()
     write_import_report_template_sheet(workbook, monthly_report)
 
-    excel_file = BytesIO()
-    workbook.save(excel_file)
-    excel_file.seek(0)
-
-    # Convert to CSV file
-    # convert_xlsx_to_csv(excel_file)
-    response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    response = HttpResponse(content_type=XLSX_CONTENT_TYPE)
     response["Content-Disposition"] = 'attachment; filename="activity_plans_import_template.xlsx"'
 
     # Save the workbook to the response
@@ -75,6 +71,105 @@ def convert_xlsx_to_csv(excel_file):
     return response
 
 
+# Define the mappings for fields to their corresponding model
+REPORT_IMPORT_FIELD_MAPPINGS = {
+    "package_type": PackageType,
+    "unit_type": UnitType,
+    "ration_size": RationSize,
+    "ration_type": RationType,
+    "grant_type": GrantType,
+    "transfer_category": TransferCategory,
+    "transfer_mechanism_type": TransferMechanismType,
+    "implement_modality_type": ImplementationModalityType,
+}
+
+
+def _split_list(value):
+    return [item.strip() for item in value.split(",")] if value else []
+
+
+def _first_by(queryset, *key_fields):
+    """Map the objects of the queryset by `key_fields`, keeping the first object of each key like `.first()`"""
+    objects = {}
+    for obj in queryset.order_by("pk"):
+        key = tuple(getattr(obj, field) for field in key_fields)
+        objects.setdefault(key[0] if len(key) == 1 else key, obj)
+    return objects
+
+
+def _preload_report_import_data(monthly_report, rows):
+    """Resolve all the lookups of the imported rows in a few queries to avoid calling DB in the Loop"""
+
+    def values(field):
+        return {row.get(field) for row in rows if row.get(field)}
+
+    activity_domains = _first_by(ActivityDomain.objects.filter(name__in=values("activity_domain")), "name")
+    activity_types = _first_by(
+        ActivityType.objects.filter(activity_domain__in=activity_domains.values(), name__in=values("activity_type")),
+        "activity_domain_id",
+        "name",
+    )
+    indicators = {}
+    for indicator_type in (
+        Indicator.activity_types.through.objects.filter(
+            activitytype__in=activity_types.values(), indicator__name__in=values("indicator")
+        )
+        .select_related("indicator")
+        .order_by("indicator_id")
+    ):
+        indicators.setdefault((indicator_type.activitytype_id, indicator_type.indicator.name), indicator_type.indicator)
+
+    location_codes = set()
+    for field in ["admin0pcode", "admin1pcode", "admin2pcode", "admin3pcode"]:
+        location_codes |= values(field)
+
+    activity_plans = _first_by(
+        ActivityPlan.objects.filter(project_id=monthly_report.project_id, state="in-progress"),
+        "activity_domain_id",
+        "activity_type_id",
+        "indicator_id",
+        "hrp_beneficiary_id",
+    )
+
+    response_types = set()
+    for row in rows:
+        response_types |= set(_split_list(row.get("response_types")))
+
+    return {
+        "activity_domains": activity_domains,
+        "activity_types": activity_types,
+        "indicators": indicators,
+        "field_mappings": {
+            field: _first_by(model.objects.filter(name__in=values(field)), "name")
+            for field, model in REPORT_IMPORT_FIELD_MAPPINGS.items()
+        },
+        "location_types": _first_by(LocationType.objects.filter(name__in=values("location_type")), "name"),
+        "hrp_beneficiaries": _first_by(BeneficiaryType.objects.filter(name__in=values("hrp_beneficiary")), "name"),
+        "locations": {loc.code: loc for loc in Location.objects.filter(code__in=location_codes)},
+        "activity_plans": activity_plans,
+        "target_locations": _first_by(
+            TargetLocation.objects.filter(activity_plan__in=activity_plans.values()),
+            "activity_plan_id",
+            "country_id",
+            "province_id",
+            "district_id",
+            "zone_id",
+        ),
+        "response_types": _first_by(ResponseType.objects.filter(name__in=response_types), "name"),
+        "disaggregations": list(Disaggregation.objects.all()),
+        "beneficiary_status": {
+            label: key for key, label in TargetLocationReport._meta.get_field("beneficiary_status").choices
+        },
+    }
+
+
+def _get_report_import_location(import_data, row, field, parent, level):
+    location = import_data["locations"].get(row.get(field))
+    if location and location.level == level and location.parent_id == (parent.pk if parent else None):
+        return location
+    return None
+
+
 @login_required
 @require_http_methods(["GET", "POST"])
 def import_report_activities(request, pk):
@@ -94,184 +189,128 @@ def import_report_activities(request, pk):
         report_activities = {}
         report_target_locations = []
         disaggregation_locations = []
-        activity_plan_reports_list = []
-        implementing_partners_mapping = {}
-        response_types_list_mapping = {}
+        response_types_mapping = {}
 
         try:
-            for row in reader:
+            # Header row is line 1
+            rows = list(enumerate(reader, start=2))
+
+            # Phase 1: resolve the lookups and validate every row
+            import_data = _preload_report_import_data(monthly_report, [row for _, row in rows])
+
+            for line_num, row in rows:
                 try:
-                    activity_domain = ActivityDomain.objects.filter(name=row["activity_domain"]).first()
+                    activity_domain = import_data["activity_domains"].get(row["activity_domain"])
                     if not activity_domain:
-                        errors.append(
-                            f"Row {reader.line_num}: Activity domain '{row['activity_domain']}' does not exist."
-                        )
+                        errors.append(f"Row {line_num}: Activity domain '{row['activity_domain']}' does not exist.")
                         continue
 
-                    activity_type = activity_domain.activitytype_set.filter(name=row["activity_type"]).first()
+                    activity_type = import_data["activity_types"].get((activity_domain.pk, row["activity_type"]))
                     if not activity_type:
                         errors.append(
-                            f"Row {reader.line_num}: Activity Type '{row['activity_type']}' does not exist or Activity Domain `{activity_domain.name}` does not have Activity Type '{row['activity_type']}'"
+                            f"Row {line_num}: Activity Type '{row['activity_type']}' does not exist or Activity Domain `{activity_domain.name}` does not have Activity Type '{row['activity_type']}'"
                         )
                         continue
 
-                    indicator = activity_type.indicator_set.filter(name=row["indicator"]).first()
+                    indicator = import_data["indicators"].get((activity_type.pk, row["indicator"]))
                     if not indicator:
                         errors.append(
-                            f"Row {reader.line_num}: Indicator '{row['indicator']}' does not exist or Activity Type {activity_type.name} does not have Indicator '{row['indicator']}'"
+                            f"Row {line_num}: Indicator '{row['indicator']}' does not exist or Activity Type {activity_type.name} does not have Indicator '{row['indicator']}'"
                         )
                         continue
 
-                    # Define the mappings for fields to their corresponding model and field names
-                    field_mappings = {
-                        "package_type": PackageType,
-                        "unit_type": UnitType,
-                        "ration_size": RationSize,
-                        "ration_type": RationType,
-                        "grant_type": GrantType,
-                        "transfer_category": TransferCategory,
-                        "transfer_mechanism_type": TransferMechanismType,
-                        "implement_modality_type": ImplementationModalityType,
-                    }
-
-                    mapped_data = {}
-
-                    # Iterate through each field mapping
-                    for field, model in field_mappings.items():
-                        if row.get(field, ""):
-                            obj = (
-                                model.objects.filter(name=row.get(field, "")).first()
-                                if field != "beneficiary_type_id" and field != "hrp_beneficiary_type_id"
-                                else model.objects.filter(code=row.get(field, "")).first()
+                    for field, model in REPORT_IMPORT_FIELD_MAPPINGS.items():
+                        if row.get(field, "") and row.get(field) not in import_data["field_mappings"][field]:
+                            errors.append(
+                                f"Row {line_num}: {model.__name__.replace('Type', '')} '{row.get(field, '')}' does not exist."
                             )
-                            if not obj:
-                                errors.append(
-                                    f"Row {reader.line_num}: {model.__name__.replace('Type', '')} '{row.get(field, '')}' does not exist."
-                                )
-                                continue
-                            mapped_data[field] = obj
-                        else:
-                            mapped_data[field] = None
-
-                    # Unpack mapped_data
-                    # package_type = mapped_data.get("package_type")
-                    # unit_type = mapped_data.get("unit_type")
-                    # ration_size = mapped_data.get("ration_size")
-                    # ration_type = mapped_data.get("ration_type")
-                    # units = row["transfer_value"] or 0
-                    # no_of_transfers = row["no_of_transfers"] or 0
-                    # grant_type = mapped_data.get("grant_type")
-                    # transfer_category = mapped_data.get("transfer_category")
-                    # transfer_mechanism_type = mapped_data.get("transfer_mechanism_type")
-                    # implement_modality_type = mapped_data.get("implement_modility_type")
-
-                    beneficiary_status = {
-                        label: key for key, label in TargetLocationReport._meta.get_field("beneficiary_status").choices
-                    }.get(row.get("beneficiary_status", ""), None)
 
+                    beneficiary_status = import_data["beneficiary_status"].get(row.get("beneficiary_status", ""), None)
                     if beneficiary_status is None:
                         errors.append(
-                            f"Row {reader.line_num}: Invalid beneficiary status '{row.get('beneficiary_status', '')}'. check the spelling"
+                            f"Row {line_num}: Invalid beneficiary status '{row.get('beneficiary_status', '')}'. check the spelling"
                         )
 
-                    # Handle implementing partners
-                    implementing_partners_list = []
-                    implementing_partners = row["implementing_partners"]
-                    if implementing_partners:
-                        implementing_partners_list = [partner.strip() for partner in implementing_partners.split(",")]
-
-                    # Handle Response Types
-                    response_types_list = []
-                    response_types = row["response_types"]
-                    if response_types:
-                        response_types_list = [response.strip() for response in response_types.split(",")]
-
-                    location_type = LocationType.objects.filter(name=row.get("location_type")).first()
-
-                    # non_hrp_beneficiary = BeneficiaryType.objects.filter(name=row.get("non_hrp_beneficiary")).first()
-                    hrp_beneficiary = BeneficiaryType.objects.filter(name=row.get("hrp_beneficiary")).first()
-
-                    project_activity_plan = ActivityPlan.objects.filter(
-                        project_id=monthly_report.project.id,
-                        state="in-progress",
-                        activity_domain_id=activity_domain.id,
-                        activity_type_id=activity_type.id,
-                        indicator_id=indicator.id,
-                        hrp_beneficiary=hrp_beneficiary,
-                        # beneficiary=non_hrp_beneficiary,
-                    ).first()
+                    hrp_beneficiary = import_data["hrp_beneficiaries"].get(row.get("hrp_beneficiary"))
+                    project_activity_plan = import_data["activity_plans"].get(
+                        (
+                            activity_domain.pk,
+                            activity_type.pk,
+                            indicator.pk,
+                            hrp_beneficiary.pk if hrp_beneficiary else None,
+                        )
+                    )
+                    if not project_activity_plan:
+                        errors.append(
+                            f"Row {line_num}: The project does not have an in progress activity plan for '{row['activity_domain']}', '{row['activity_type']}', '{row['indicator']}'"
+                        )
+                        continue
 
                     activity_plan_key = (row["activity_domain"], row["activity_type"], row["indicator"])
-
-                    # Add each implementing partner for later assignment
-                    implementing_partners_mapping[activity_plan_key] = implementing_partners_list
-                    response_types_list_mapping[activity_plan_key] = response_types_list
-
                     if activity_plan_key not in report_activities:
-                        activity_plan_report = ActivityPlanReport(
+                        report_activities[activity_plan_key] = ActivityPlanReport(
                             monthly_report=monthly_report,
                             activity_plan=project_activity_plan,
-                            # package_type=package_type,
-                            # unit_type=unit_type,
-                            # ration_size=ration_size,
-                            # ration_type=ration_type,
-                            # units=units,
-                            # no_of_transfers=no_of_transfers,
-                            # grant_type=grant_type,
-                            # transfer_category=transfer_category,
-                            # transfer_mechanism_type=transfer_mechanism_type,
-                            # implement_modality_type=implement_modality_type,
                         )
-                        report_activities[activity_plan_key] = activity_plan_report
-                        activity_plan_reports_list.append(activity_plan_report)
-                    else:
-                        activity_plan_report = report_activities[activity_plan_key]
+                        response_types_mapping[activity_plan_key] = set()
+                    activity_plan_report = report_activities[activity_plan_key]
+
+                    for response_type in _split_list(row.get("response_types")):
+                        if response_type in import_data["response_types"]:
+                            response_types_mapping[activity_plan_key].add(import_data["response_types"][response_type])
+                        else:
+                            errors.append(f"Row {line_num}: Response Type '{response_type}' does not exist.")
 
-                    country = Location.objects.filter(code=row["admin0pcode"], level=0).first()
+                    country = _get_report_import_location(import_data, row, "admin0pcode", None, 0)
                     if not country:
                         errors.append(
-                            f"Row {reader.line_num}: admin0/country `{row['admin0pcode']}` does not exist check admin0pcode again."
+                            f"Row {line_num}: admin0/country `{row['admin0pcode']}` does not exist check admin0pcode again."
                         )
                         continue
 
-                    province = Location.objects.filter(parent=country, code=row["admin1pcode"], level=1).first()
-                    if not activity_type:
+                    province = _get_report_import_location(import_data, row, "admin1pcode", country, 1)
+                    if row.get("admin1pcode") and not province:
                         errors.append(
-                            f"Row {reader.line_num}:Province {row['admin1pcode']} does not exists or country/admin0 `{country}` does not have admin1/province `{row['admin1code']}` check admin1code again"
+                            f"Row {line_num}:Province {row['admin1pcode']} does not exists or country/admin0 `{country}` does not have admin1/province `{row['admin1pcode']}` check admin1pcode again"
                         )
                         continue
 
-                    district = Location.objects.filter(parent=province, code=row["admin2pcode"], level=2).first()
-                    if not indicator:
+                    district = _get_report_import_location(import_data, row, "admin2pcode", province, 2)
+                    if row.get("admin2pcode") and not district:
                         errors.append(
-                            f"Row {reader.line_num}:district {row['admin2pcode']} does not exists or province/admin1 `{province}` does not have admin2/district`{row['admin2pcode']}` check admin2pcode again"
+                            f"Row {line_num}:district {row['admin2pcode']} does not exists or province/admin1 `{province}` does not have admin2/district`{row['admin2pcode']}` check admin2pcode again"
                         )
                         continue
 
-                    zone = Location.objects.filter(parent=district, code=row["admin3pcode"], level=3).first()
+                    zone = _get_report_import_location(import_data, row, "admin3pcode", district, 3)
 
-                    project_target_location = TargetLocation.objects.filter(
-                        project_id=activity_plan_report.activity_plan.project.id,
-                        activity_plan_id=activity_plan_report.activity_plan.id,
-                        country=country,
-                        province=province,
-                        district=district,
-                        zone=zone,
-                    ).first()
-                    safe_space = row.get("with_safe_spaces").strip().upper() == "TRUE"
+                    project_target_location = import_data["target_locations"].get(
+                        (
+                            project_activity_plan.pk,
+                            country.pk,
+                            province.pk if province else None,
+                            district.pk if district else None,
+                            zone.pk if zone else None,
+                        )
+                    )
+                    if not project_target_location:
+                        errors.append(
+                            f"Row {line_num}: The activity plan does not have a target location in {', '.join(str(loc) for loc in [country, province, district, zone] if loc)}"
+                        )
+                        continue
+
+                    safe_space = (row.get("with_safe_spaces") or "").strip().upper() == "TRUE"
 
                     target_location = TargetLocationReport(
                         activity_plan_report=activity_plan_report,
                         target_location=project_target_location,
-                        location_type=location_type,
+                        location_type=import_data["location_types"].get(row.get("location_type")),
                         beneficiary_status=beneficiary_status,
                         safe_space=safe_space,
-                        # add previously_targeted_by and
                     )
                     report_target_locations.append(target_location)
 
-                    all_disaggs = Disaggregation.objects.all()
-                    for disag in all_disaggs:
+                    for disag in import_data["disaggregations"]:
                         if row.get(disag.name):
                             disaggregation_location = DisaggregationLocationReport(
                                 target_location_report=target_location,
@@ -280,39 +319,27 @@ def import_report_activities(request, pk):
                             )
                             disaggregation_locations.append(disaggregation_location)
                 except Exception as e:
-                    errors.append(f"Error on row {reader.line_num}: {e}")
+                    errors.append(f"Error on row {line_num}: {e}")
 
             if len(errors) > 0:
                 messages.error(request, "Failed to import the Activities! Please check the errors below and try again.")
             else:
-                activities = ActivityPlanReport.objects.bulk_create(report_activities.values())
-
-                # Assign Manytomany fields after bulk_create
-                for activity_plan_report in activity_plan_reports_list:
-                    partners_list = implementing_partners_mapping.get(
-                        (
-                            activity_plan_report.activity_plan.activity_domain.name,
-                            activity_plan_report.activity_plan.activity_type.name,
-                        ),
-                        [],
-                    )
-                    if partners_list:
-                        partners = Organization.objects.filter(code__in=partners_list)
-                        activity_plan_report.implementing_partners.set(partners)
-
-                    responses_list = response_types_list_mapping.get(
-                        (
-                            activity_plan_report.activity_plan.activity_domain.name,
-                            activity_plan_report.activity_plan.activity_type.name,
-                        ),
-                        [],
+                # Phase 2: create all the report rows in bulk
+                with transaction.atomic():
+                    activities = ActivityPlanReport.objects.bulk_create(report_activities.values())
+
+                    ResponseTypesThrough = ActivityPlanReport.response_types.through
+                    ResponseTypesThrough.objects.bulk_create(
+                        [
+                            ResponseTypesThrough(activityplanreport=activity_plan_report, responsetype=response_type)
+                            for key, activity_plan_report in report_activities.items()
+                            for response_type in response_types_mapping[key]
+                        ]
                     )
-                    if responses_list:
-                        responses = ResponseType.objects.filter(name__in=responses_list)
-                        activity_plan_report.report_types.set(responses)
 
-                TargetLocationReport.objects.bulk_create(report_target_locations)
-                DisaggregationLocationReport.objects.bulk_create(disaggregation_locations)
+                    TargetLocationReport.objects.bulk_create(report_target_locations)
+                    DisaggregationLocationReport.objects.bulk_create(disaggregation_locations)
+                    refresh_reach_ledger({location.target_location_id for location in report_target_locations})
 
                 messages.success(request, f"[{len(activities)}] Activities imported successfully.")
 
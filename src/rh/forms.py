@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 from django.forms import BaseInlineFormSet
 from django.urls import reverse_lazy
 
+from users.authorization import get_auth_context
+
 from .models import (
     ActivityPlan,
     ActivityType,
@@ -26,6 +28,15 @@ from .models import (
     TransferMechanismType,
     UnitType,
 )
+from .reference_data import (
+    get_activity_domain_types,
+    get_activity_domains,
+    get_activity_type_indicators,
+    get_location_children,
+    get_reference_data,
+    get_reference_index,
+    set_reference_choices,
+)
 
 
 class ProjectForm(forms.ModelForm):
@@ -103,16 +114,10 @@ class ProjectForm(forms.ModelForm):
 
         if self.instance.pk:
             # Entering Update mode
-            self.fields["activity_domains"].choices = (
-                self.fields["activity_domains"]
-                .queryset.filter(
-                    clusters__in=self.data.getlist("clusters") or self.instance.clusters.all(),
-                    is_active=True,
-                    countries=user.profile.country,
-                )
-                .order_by("name")
-                .values_list("id", "name")
-            )
+            cluster_ids = self.data.getlist("clusters") or self.instance.clusters.values_list("pk", flat=True)
+            self.fields["activity_domains"].choices = [
+                (domain.pk, domain.name) for domain in get_activity_domains(cluster_ids, user.profile.country_id)
+            ]
 
             self.fields["user"].queryset = User.objects.filter(profile__organization=self.instance.organization)
 
@@ -125,16 +130,10 @@ class ProjectForm(forms.ModelForm):
                 )
         else:
             # Create mode and POST mode: Ensure activity_domains is populated
-            self.fields["activity_domains"].choices = (
-                self.fields["activity_domains"]
-                .queryset.filter(
-                    clusters__in=self.data.getlist("clusters") or user.profile.clusters.all(),
-                    is_active=True,
-                    countries=user.profile.country,
-                )
-                .order_by("name")
-                .values_list("id", "name")
-            )
+            cluster_ids = self.data.getlist("clusters") or user.profile.cluster_ids
+            self.fields["activity_domains"].choices = [
+                (domain.pk, domain.name) for domain in get_activity_domains(cluster_ids, user.profile.country_id)
+            ]
 
 
 class TargetLocationForm(forms.ModelForm):
@@ -164,6 +163,7 @@ class TargetLocationForm(forms.ModelForm):
 
         self.fields["province"].required = True
         self.fields["province"].queryset = self.fields["province"].queryset.filter(level=1, parent=user.profile.country)
+        set_reference_choices(self.fields["province"], get_location_children(user.profile.country_id, level=1))
 
         self.fields["district"].queryset = Location.objects.none()
         self.fields["district"].required = True
@@ -183,16 +183,20 @@ class TargetLocationForm(forms.ModelForm):
             try:
                 province_id = int(self.data.get("province"))
                 self.fields["district"].queryset = Location.objects.filter(level=2, parent=province_id)
+                set_reference_choices(self.fields["district"], get_location_children(province_id, level=2))
 
                 district_id = int(self.data.get("district"))
                 self.fields["zone"].queryset = Location.objects.filter(level=3, parent=district_id)
+                set_reference_choices(self.fields["zone"], get_location_children(district_id, level=3))
             except Exception:
                 raise forms.ValidationError("Do not mess with the form!")
 
         elif self.instance.pk:
             # Updating
             self.fields["district"].queryset = self.instance.province.children.all()
+            set_reference_choices(self.fields["district"], get_location_children(self.instance.province_id))
             self.fields["zone"].queryset = self.instance.district.children.all()
+            set_reference_choices(self.fields["zone"], get_location_children(self.instance.district_id))
             self.fields["implementing_partner"].queryset = self.fields["implementing_partner"].queryset.filter(
                 countries=self.instance.country
             )
@@ -305,11 +309,13 @@ class ActivityPlanForm(forms.ModelForm):
                 self.fields["activity_type"].queryset = ActivityType.objects.filter(
                     activity_domain_id=activity_domain_id, is_active=True
                 )
+                set_reference_choices(self.fields["activity_type"], get_activity_domain_types(activity_domain_id))
 
                 activity_type_id = int(self.data.get("activity_type"))
                 self.fields["indicator"].queryset = Indicator.objects.filter(
                     activity_types=activity_type_id, is_active=True
                 )
+                set_reference_choices(self.fields["indicator"], get_activity_type_indicators(activity_type_id))
             except Exception:
                 self.add_error(None, "Do not mess with the form!")
         elif self.instance.pk:
@@ -317,7 +323,13 @@ class ActivityPlanForm(forms.ModelForm):
             self.fields["activity_type"].queryset = self.instance.activity_domain.activitytype_set.filter(
                 is_active=True
             )
+            set_reference_choices(
+                self.fields["activity_type"], get_activity_domain_types(self.instance.activity_domain_id)
+            )
             self.fields["indicator"].queryset = self.instance.activity_type.indicator_set.filter(is_active=True)
+            set_reference_choices(
+                self.fields["indicator"], get_activity_type_indicators(self.instance.activity_type_id)
+            )
 
 
 class CashInKindDetailForm(forms.ModelForm):
@@ -342,40 +354,56 @@ class CashInKindDetailForm(forms.ModelForm):
         indicator = kwargs.pop("indicator", None)
         super().__init__(*args, **kwargs)
 
+        modality_types = get_reference_data("implementation_modality_types")
         if indicator and indicator.implement_category:
             self.fields["implement_modality_type"].queryset = ImplementationModalityType.objects.filter(
                 type=indicator.implement_category.type
             )
+            modality_types = [m for m in modality_types if m.type == indicator.implement_category.type]
         else:
             self.fields["implement_modality_type"].queryset = ImplementationModalityType.objects.all()
+        set_reference_choices(self.fields["implement_modality_type"], modality_types)
 
         self.fields["unit_type"].queryset = UnitType.objects.none()
         self.fields["transfer_mechanism_type"].queryset = TransferMechanismType.objects.none()
         self.fields["package_type"].queryset = PackageType.objects.all()
+        set_reference_choices(self.fields["package_type"], get_reference_data("package_types"))
         self.fields["ration_type"].queryset = RationType.objects.all()
+        set_reference_choices(self.fields["ration_type"], get_reference_data("ration_types"))
         self.fields["ration_size"].queryset = RationSize.objects.all()
+        set_reference_choices(self.fields["ration_size"], get_reference_data("ration_sizes"))
+
+        modality_type_id = None
         if self.data:
             try:
                 # Creating
-                implement_modality_type = int(self.data.get("implement_modality_type"))
+                modality_type_id = int(self.data.get("implement_modality_type"))
                 self.fields["implement_modality_type"].queryset = ImplementationModalityType.objects.all()
+                set_reference_choices(
+                    self.fields["implement_modality_type"], get_reference_data("implementation_modality_types")
+                )
                 self.fields["transfer_mechanism_type"].queryset = TransferMechanismType.objects.filter(
-                    modality=implement_modality_type
+                    modality=modality_type_id
                 )
-                self.fields["unit_type"].queryset = UnitType.objects.filter(modality=implement_modality_type)
+                self.fields["unit_type"].queryset = UnitType.objects.filter(modality=modality_type_id)
             except Exception:
-                pass
+                modality_type_id = None
         elif self.instance.pk:
-            if indicator and indicator.implement_category:
-                self.fields["implement_modality_type"].queryset = ImplementationModalityType.objects.filter(
-                    type=indicator.implement_category.type
-                )
-            else:
-                self.fields["implement_modality_type"].queryset = ImplementationModalityType.objects.all()
+            modality_type_id = self.instance.implement_modality_type_id
             self.fields["transfer_mechanism_type"].queryset = TransferMechanismType.objects.filter(
-                modality=self.instance.implement_modality_type
+                modality=modality_type_id
+            )
+            self.fields["unit_type"].queryset = UnitType.objects.filter(modality=modality_type_id)
+
+        if modality_type_id is not None:
+            set_reference_choices(
+                self.fields["transfer_mechanism_type"],
+                get_reference_index("transfer_mechanism_types", "modality_id", unique=False).get(modality_type_id, []),
+            )
+            set_reference_choices(
+                self.fields["unit_type"],
+                get_reference_index("unit_types", "modality_id", unique=False).get(modality_type_id, []),
             )
-            self.fields["unit_type"].queryset = UnitType.objects.filter(modality=self.instance.implement_modality_type)
 
 
 class BaseCashInKindDetailFormSet(BaseInlineFormSet):
@@ -474,9 +502,9 @@ class OrganizationForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
 
         if user:
-            user_groups = user.groups.filter(name__endswith="_CLUSTER_LEADS")
-            cluster_ids = [group.name.split("_")[0].lower() for group in user_groups]
-            self.fields["clusters"].queryset = Cluster.objects.filter(code__in=cluster_ids)
+            self.fields["clusters"].queryset = Cluster.objects.filter(
+                code__in=get_auth_context(user).lead_cluster_codes
+            )
         else:
             self.fields["clusters"].queryset = []
 
@@ -526,9 +554,9 @@ class DonorForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
 
         if user:
-            user_groups = user.groups.filter(name__endswith="_CLUSTER_LEADS")
-            cluster_ids = [group.name.split("_")[0].lower() for group in user_groups]
-            self.fields["clusters"].queryset = Cluster.objects.filter(code__in=cluster_ids)
+            self.fields["clusters"].queryset = Cluster.objects.filter(
+                code__in=get_auth_context(user).lead_cluster_codes
+            )
         else:
             self.fields["clusters"].queryset = []
 
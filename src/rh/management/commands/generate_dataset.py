@@ -0,0 +1,423 @@
+import calendar
+import datetime
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from project_reports.models import (
+    ActivityPlanReport,
+    DisaggregationLocationReport,
+    ProjectMonthlyReport,
+    TargetLocationReport,
+)
+from project_reports.utils import refresh_reach_facts, refresh_reach_ledger
+from rh.models import (
+    ActivityDomain,
+    ActivityPlan,
+    ActivityType,
+    Cluster,
+    Disaggregation,
+    DisaggregationLocation,
+    Indicator,
+    Location,
+    Organization,
+    Project,
+    TargetLocation,
+)
+from rh.reference_data import REFERENCE_DATA, invalidate_reference_data
+from rh.utils import (
+    invalidate_dashboard_cache,
+    invalidate_projects_counters,
+    refresh_organization_locations_map,
+    refresh_organization_stats,
+)
+from users.models import Profile
+
+# Share of the past monthly reports in each state
+PAST_REPORT_STATES = {"completed": 80, "submited": 8, "rejected": 4, "pending": 4, "todo": 4}
+CURRENT_REPORT_STATES = {"todo": 60, "pending": 30, "submited": 10}
+
+PROJECT_STATES = {"in-progress": 70, "completed": 15, "draft": 10, "archived": 5}
+
+BENEFICIARY_STATUSES = ["new_beneficiary", "existing_beneficiaries"]
+
+
+def _choice(rng, weights: dict):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _add_months(date: datetime.date, months: int) -> datetime.date:
+    month = date.month - 1 + months
+    return datetime.date(date.year + month // 12, month % 12 + 1, 1)
+
+
+def _month_end(date: datetime.date) -> datetime.date:
+    return date.replace(day=calendar.monthrange(date.year, date.month)[1])
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic dataset for load tests and benchmarks: projects with their activity plans, "
+        "target locations, disaggregation targets, monthly reports and reached values, inserted in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--projects", type=int, default=1000, help="Number of projects to generate.")
+        parser.add_argument("--months", type=int, default=12, help="Number of monthly reports per project.")
+        parser.add_argument("--activity-plans", type=int, default=2, help="Maximum activity plans per project.")
+        parser.add_argument(
+            "--target-locations", type=int, default=2, help="Maximum target locations per activity plan."
+        )
+        parser.add_argument("--organizations", type=int, default=50, help="Minimum number of organizations.")
+        parser.add_argument("--country", default="AF", help="Code of the country of the projects.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, the same seed generates the same data.")
+        parser.add_argument("--batch-size", type=int, default=200, help="Number of projects generated per transaction.")
+        parser.add_argument(
+            "--flush", action="store_true", help="Delete the projects previously generated with this seed first."
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.prefix = f"synthetic-{options['seed']}"
+
+        if options["flush"]:
+            self.flush()
+        if Project.objects.filter(code__startswith=f"{self.prefix}-").exists():
+            raise CommandError(f"Projects of the seed {options['seed']} exist, use --flush or another --seed.")
+
+        started = time.monotonic()
+        self.load_reference_data(options)
+
+        total = options["projects"]
+        for start in range(0, total, options["batch_size"]):
+            end = min(start + options["batch_size"], total)
+            with transaction.atomic():
+                self.generate_projects(range(start, end), options)
+            self.stdout.write(f"Generated {end}/{total} projects ({time.monotonic() - started:.0f}s)")
+
+        invalidate_projects_counters()
+        invalidate_dashboard_cache(
+            [f"cluster:{cluster.pk}" for cluster in self.clusters]
+            + [f"organization:{organization.pk}" for organization in self.organizations]
+        )
+        refresh_organization_stats([organization.pk for organization in self.organizations])
+        refresh_organization_locations_map([organization.pk for organization in self.organizations])
+        self.stdout.write(self.style.SUCCESS(f"{total} projects generated in {time.monotonic() - started:.0f}s."))
+
+    def flush(self):
+        projects = Project.objects.filter(code__startswith=f"{self.prefix}-")
+        # The monthly reports are not deleted with their project
+        reports, _ = ProjectMonthlyReport.objects.filter(project__in=projects).delete()
+        deleted, _ = projects.delete()
+        self.stdout.write(f"Deleted the generated projects ({reports + deleted} rows)")
+
+    # ------------------------------------------------------------------
+    # Reference data
+    # ------------------------------------------------------------------
+
+    def load_reference_data(self, options):
+        """Load the reference data the projects are made of, and create the missing parts"""
+        self.country = Location.objects.filter(level=0, code=options["country"]).first()
+        if self.country is None:
+            self.country = Location.objects.create(
+                parent=None, code=options["country"], name=options["country"], level=0, type="Country"
+            )
+
+        self.clusters = list(Cluster.objects.all())
+        if not self.clusters:
+            self.clusters = Cluster.objects.bulk_create(
+                Cluster(code=f"synthetic-cluster-{i}", name=f"Synthetic Cluster {i}", title=f"Synthetic Cluster {i}")
+                for i in range(1, 9)
+            )
+        self.ensure_activities()
+        self.ensure_locations()
+        self.ensure_disaggregations()
+        self.ensure_organizations(options["organizations"])
+
+        for name in REFERENCE_DATA:
+            invalidate_reference_data(name)
+
+    def ensure_activities(self):
+        """Index the indicators of each activity type of each activity domain of each cluster"""
+        domain_clusters = ActivityDomain.clusters.through.objects.filter(
+            activitydomain__is_active=True, activitydomain__countries=self.country
+        )
+        if not domain_clusters.exists():
+            domains = ActivityDomain.objects.bulk_create(
+                ActivityDomain(code=f"synthetic-domain-{cluster.pk}-{i}", name=f"{cluster.title} Domain {i}")
+                for cluster in self.clusters
+                for i in range(1, 3)
+            )
+            ActivityDomain.clusters.through.objects.bulk_create(
+                ActivityDomain.clusters.through(activitydomain_id=domain.pk, cluster_id=cluster.pk)
+                for domain, cluster in zip(domains, [cluster for cluster in self.clusters for _ in range(2)])
+            )
+            ActivityDomain.countries.through.objects.bulk_create(
+                ActivityDomain.countries.through(activitydomain_id=domain.pk, location_id=self.country.pk)
+                for domain in domains
+            )
+            types = ActivityType.objects.bulk_create(
+                ActivityType(activity_domain=domain, code=f"{domain.code}-type-{i}", name=f"{domain.name} Type {i}")
+                for domain in domains
+                for i in range(1, 4)
+            )
+            indicators = Indicator.objects.bulk_create(
+                Indicator(name=f"{activity_type.name} Indicator {i}") for activity_type in types for i in range(1, 3)
+            )
+            Indicator.activity_types.through.objects.bulk_create(
+                Indicator.activity_types.through(indicator_id=indicator.pk, activitytype_id=activity_type.pk)
+                for indicator, activity_type in zip(indicators, [t for t in types for _ in range(2)])
+            )
+
+        types_by_domain = {}
+        for activity_type in ActivityType.objects.filter(is_active=True, activity_domain__isnull=False):
+            types_by_domain.setdefault(activity_type.activity_domain_id, []).append(activity_type.pk)
+
+        indicators_by_type = {}
+        for row in Indicator.activity_types.through.objects.filter(indicator__is_active=True):
+            indicators_by_type.setdefault(row.activitytype_id, []).append(row.indicator_id)
+
+        # cluster -> [(domain, type, indicator)]
+        self.activities = {}
+        for row in domain_clusters.order_by("pk"):
+            for type_id in types_by_domain.get(row.activitydomain_id, []):
+                for indicator_id in indicators_by_type.get(type_id, []):
+                    self.activities.setdefault(row.cluster_id, []).append(
+                        (row.activitydomain_id, type_id, indicator_id)
+                    )
+
+        self.clusters = [cluster for cluster in self.clusters if cluster.pk in self.activities]
+        if not self.clusters:
+            raise CommandError("No cluster has an active activity domain, type and indicator in the country.")
+
+    def ensure_locations(self):
+        """Index the districts of the provinces of the country"""
+        if not Location.objects.filter(level=2, parent__parent=self.country).exists():
+            provinces = Location.objects.bulk_create(
+                Location(
+                    parent=self.country,
+                    code=f"{self.country.code}-synthetic-{i:02d}",
+                    name=f"Province {i}",
+                    level=1,
+                    type="Province",
+                )
+                for i in range(1, 35)
+            )
+            Location.objects.bulk_create(
+                Location(
+                    parent=province, code=f"{province.code}{j:02d}", name=f"District {j}", level=2, type="District"
+                )
+                for province in provinces
+                for j in range(1, 11)
+            )
+
+        self.districts = list(
+            Location.objects.filter(level=2, parent__parent=self.country).values_list("parent_id", "pk").order_by("pk")
+        )
+
+    def ensure_disaggregations(self):
+        """Index the disaggregations of each indicator, the indicators without any get the default ones"""
+        if not Disaggregation.objects.exists():
+            Disaggregation.objects.bulk_create(
+                Disaggregation(name=name, gender=gender, lower_limit=lower, upper_limit=upper)
+                for name, gender, lower, upper in [
+                    ("Boys (0-17)", "Male", 0, 17),
+                    ("Girls (0-17)", "Female", 0, 17),
+                    ("Men (18-59)", "Male", 18, 59),
+                    ("Women (18-59)", "Female", 18, 59),
+                ]
+            )
+
+        self.default_disaggregations = list(Disaggregation.objects.order_by("pk").values_list("pk", flat=True)[:4])
+        self.indicator_disaggregations = {}
+        for row in Disaggregation.indicators.through.objects.all():
+            self.indicator_disaggregations.setdefault(row.indicator_id, []).append(row.disaggregation_id)
+
+    def ensure_organizations(self, minimum: int):
+        """Create the missing organizations and a user for each organization without one"""
+        count = Organization.objects.count()
+        if count < minimum:
+            Organization.objects.bulk_create(
+                Organization(code=f"synthetic-org-{i}", name=f"Synthetic Organization {i}", type="National NGO")
+                for i in range(count + 1, minimum + 1)
+            )
+        self.organizations = list(Organization.objects.order_by("pk")[: max(minimum, 1)])
+
+        organization_ids = [organization.pk for organization in self.organizations]
+        users = dict(
+            Profile.objects.filter(organization_id__in=organization_ids, user__isnull=False)
+            .order_by("pk")
+            .values_list("organization_id", "user_id")
+        )
+        missing = [organization for organization in self.organizations if organization.pk not in users]
+        if missing:
+            password = make_password(None)
+            created = User.objects.bulk_create(
+                User(
+                    username=f"synthetic-{organization.code}"[:150],
+                    email=f"{organization.code}@example.com",
+                    password=password,
+                )
+                for organization in missing
+            )
+            Profile.objects.bulk_create(
+                Profile(user=user, organization=organization, country=self.country)
+                for user, organization in zip(created, missing)
+            )
+            users.update({organization.pk: user.pk for user, organization in zip(created, missing)})
+        self.organization_users = users
+
+    # ------------------------------------------------------------------
+    # Projects
+    # ------------------------------------------------------------------
+
+    def generate_projects(self, numbers, options):
+        rng = self.rng
+        today = timezone.now().date().replace(day=1)
+        first_month = _add_months(today, -options["months"] + 1)
+
+        projects = []
+        project_clusters = []
+        for number in numbers:
+            organization = rng.choice(self.organizations)
+            start = _add_months(first_month, -rng.randint(0, 2))
+            clusters = rng.sample(self.clusters, k=min(len(self.clusters), rng.choice([1, 1, 1, 2])))
+            projects.append(
+                Project(
+                    organization=organization,
+                    user_id=self.organization_users[organization.pk],
+                    state=_choice(rng, PROJECT_STATES),
+                    title=f"Synthetic Project {number + 1}",
+                    code=f"{self.prefix}-{number + 1:07d}",
+                    budget=rng.randrange(10_000, 5_000_000, 1000),
+                    start_date=timezone.make_aware(datetime.datetime.combine(start, datetime.time())),
+                    end_date=timezone.make_aware(
+                        datetime.datetime.combine(_month_end(_add_months(today, rng.randint(0, 12))), datetime.time())
+                    ),
+                )
+            )
+            project_clusters.append(clusters)
+        Project.objects.bulk_create(projects)
+
+        # Activity plans
+        plans = []
+        clusters_through = []
+        domains_through = []
+        for project, clusters in zip(projects, project_clusters):
+            activities = [activity for cluster in clusters for activity in self.activities[cluster.pk]]
+            plan_activities = rng.sample(activities, k=min(len(activities), rng.randint(1, options["activity_plans"])))
+            for domain_id, type_id, indicator_id in plan_activities:
+                plans.append(
+                    ActivityPlan(
+                        project=project,
+                        state=project.state,
+                        activity_domain_id=domain_id,
+                        activity_type_id=type_id,
+                        indicator_id=indicator_id,
+                    )
+                )
+            clusters_through += [Project.clusters.through(project_id=project.pk, cluster_id=c.pk) for c in clusters]
+            domains_through += [
+                Project.activity_domains.through(project_id=project.pk, activitydomain_id=domain_id)
+                for domain_id in {activity[0] for activity in plan_activities}
+            ]
+        ActivityPlan.objects.bulk_create(plans)
+        Project.clusters.through.objects.bulk_create(clusters_through)
+        Project.activity_domains.through.objects.bulk_create(domains_through)
+
+        # Target locations and their disaggregation targets
+        locations = []
+        for plan in plans:
+            for province_id, district_id in rng.sample(self.districts, k=rng.randint(1, options["target_locations"])):
+                locations.append(
+                    TargetLocation(
+                        project_id=plan.project_id,
+                        activity_plan=plan,
+                        state=plan.state,
+                        country=self.country,
+                        province_id=province_id,
+                        district_id=district_id,
+                        implementing_partner_id=rng.choice(self.organizations).pk,
+                    )
+                )
+        TargetLocation.objects.bulk_create(locations)
+
+        targets = []
+        disaggregations = {}
+        for location in locations:
+            indicator_id = location.activity_plan.indicator_id
+            disaggregation_ids = self.indicator_disaggregations.get(indicator_id, self.default_disaggregations)
+            disaggregations[location.pk] = disaggregation_ids
+            targets += [
+                DisaggregationLocation(
+                    target_location=location, disaggregation_id=disaggregation_id, target=rng.randint(10, 2000)
+                )
+                for disaggregation_id in disaggregation_ids
+            ]
+        DisaggregationLocation.objects.bulk_create(targets, batch_size=5000)
+
+        # Monthly reports and their reached values
+        reports = []
+        for project in projects:
+            if project.state == "draft":
+                continue
+            month = project.start_date.date()
+            while month <= today:
+                state = _choice(rng, CURRENT_REPORT_STATES if month == today else PAST_REPORT_STATES)
+                reports.append(
+                    ProjectMonthlyReport(project=project, state=state, from_date=month, to_date=_month_end(month))
+                )
+                month = _add_months(month, 1)
+        ProjectMonthlyReport.objects.bulk_create(reports, batch_size=5000)
+
+        plans_by_project = {}
+        for plan in plans:
+            plans_by_project.setdefault(plan.project_id, []).append(plan)
+        locations_by_plan = {}
+        for location in locations:
+            locations_by_plan.setdefault(location.activity_plan_id, []).append(location)
+
+        plan_reports = [
+            ActivityPlanReport(monthly_report=report, activity_plan=plan)
+            for report in reports
+            if report.state != "todo"
+            for plan in plans_by_project[report.project_id]
+        ]
+        ActivityPlanReport.objects.bulk_create(plan_reports, batch_size=5000)
+
+        location_reports = [
+            TargetLocationReport(
+                activity_plan_report=plan_report,
+                target_location=location,
+                beneficiary_status=rng.choice(BENEFICIARY_STATUSES),
+            )
+            for plan_report in plan_reports
+            for location in locations_by_plan[plan_report.activity_plan_id]
+        ]
+        TargetLocationReport.objects.bulk_create(location_reports, batch_size=5000)
+
+        reached = [
+            DisaggregationLocationReport(
+                target_location_report=location_report,
+                disaggregation_id=disaggregation_id,
+                reached=rng.randint(0, 200),
+            )
+            for location_report in location_reports
+            for disaggregation_id in disaggregations[location_report.target_location_id]
+        ]
+        DisaggregationLocationReport.objects.bulk_create(reached, batch_size=5000)
+
+        # bulk_create does not send the signals that maintain the 5W reach facts and the reach ledger
+        target_location_ids = sorted({location_report.target_location_id for location_report in location_reports})
+        for start in range(0, len(target_location_ids), 5000):
+            refresh_reach_ledger(target_location_ids[start : start + 5000])
+        refresh_reach_facts(
+            DisaggregationLocationReport.objects.filter(
+                target_location_report__activity_plan_report__monthly_report__project__in=[p.pk for p in projects]
+            )
+        )
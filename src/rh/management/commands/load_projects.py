@@ -4,7 +4,7 @@ from pathlib import Path
 import pandas as pd
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
-from django.db import connection
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 
@@ -20,14 +20,16 @@ from rh.models import (
     GrantType,
     ImplementationModalityType,
     Indicator,
-    # Location,
+    Location,
     Organization,
     PackageType,
     Project,
+    TargetLocation,
     TransferCategory,
     TransferMechanismType,
     UnitType,
 )
+from rh.utils import schedule_organization_stats_refresh
 from users.models import Profile
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
@@ -55,6 +57,12 @@ class Command(BaseCommand):
             help="The path to projects file. relative to the project base. `pyproject.yml` location",
             required=False,
         )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Number of rows processed and inserted per transaction.",
+        )
         # parser.add_argument('amount', nargs='+', type=int)
 
     def _load_target_locations(self, path):
@@ -63,58 +71,70 @@ class Command(BaseCommand):
         df.fillna(False, inplace=True)
         locations = df.to_dict(orient="records")
 
+        def code(value):
+            return str(value).strip() if value else ""
+
+        # Preload the code -> id maps once instead of querying them for each row
+        old_ids = {code(location.get("project_id")) for location in locations} - {""}
+        projects = dict(Project.objects.filter(old_id__in=old_ids).values_list("old_id", "id"))
+
+        location_codes = {"AF"}
+        for location in locations:
+            location_codes |= {code(location.get("admin1pcode")), code(location.get("admin2pcode"))}
+        location_ids = dict(Location.objects.filter(code__in=location_codes).values_list("code", "id"))
+        country_id = location_ids.get("AF")
+
+        activity_plans = {}
+        for project_id, activity_plan_id in ActivityPlan.objects.filter(project_id__in=projects.values()).values_list(
+            "project_id", "id"
+        ):
+            activity_plans.setdefault(project_id, []).append(activity_plan_id)
+
+        existing = set(
+            TargetLocation.objects.filter(project_id__in=projects.values(), state="in-progress").values_list(
+                "project_id", "activity_plan_id", "country_id", "province_id", "district_id"
+            )
+        )
+
         locations_created = 0
         locations_exists = 0
-        with connection.cursor() as cursor:
-            for location in locations:
-                project_id = location.get("project_id", "")
-                cursor.execute("SELECT id FROM rh_project WHERE old_id = %s", [project_id])
-                project = cursor.fetchone()
-
-                if project:
-                    project_id = project[0]
-                    cursor.execute("SELECT id FROM rh_location WHERE code = 'AF'")
-                    country = cursor.fetchone()
-                    country_id = country[0] if country else None
-
-                    admin1pcode = location.get("admin1pcode", "").strip()
-                    cursor.execute("SELECT id FROM rh_location WHERE code = %s", [admin1pcode])
-                    province = cursor.fetchone()
-                    province_id = province[0] if province else None
-
-                    admin2pcode = location.get("admin2pcode", "").strip()
-                    cursor.execute("SELECT id FROM rh_location WHERE code = %s", [admin2pcode])
-                    district = cursor.fetchone()
-                    district_id = district[0] if district else None
-
-                    cursor.execute("SELECT id FROM rh_activityplan WHERE project_id = %s", [project_id])
-                    activity_plans = cursor.fetchall()
-
-                    for activity_plan in activity_plans:
-                        activity_plan_id = activity_plan[0]
-                        cursor.execute(
-                            """
-                                            SELECT id FROM rh_targetlocation 
-                                            WHERE project_id = %s AND state = %s AND activity_plan_id = %s 
-                                            AND country_id = %s AND province_id = %s AND district_id = %s
-                                        """,
-                            [project_id, "in-progress", activity_plan_id, country_id, province_id, district_id],
+        for start in range(0, len(locations), self.chunk_size):
+            new_locations = []
+            for location in locations[start : start + self.chunk_size]:
+                project_id = projects.get(code(location.get("project_id")))
+                if not project_id:
+                    continue
+
+                province_id = location_ids.get(code(location.get("admin1pcode")))
+                district_id = location_ids.get(code(location.get("admin2pcode")))
+                for activity_plan_id in activity_plans.get(project_id, []):
+                    key = (project_id, activity_plan_id, country_id, province_id, district_id)
+                    if key in existing:
+                        locations_exists += 1
+                        continue
+
+                    existing.add(key)
+                    new_locations.append(
+                        TargetLocation(
+                            project_id=project_id,
+                            state="in-progress",
+                            activity_plan_id=activity_plan_id,
+                            country_id=country_id,
+                            province_id=province_id,
+                            district_id=district_id,
                         )
+                    )
 
-                        target_location = cursor.fetchone()
-
-                        if not target_location:
-                            cursor.execute(
-                                """
-                                            INSERT INTO rh_targetlocation 
-                                            (project_id, state, activity_plan_id, country_id, province_id, district_id)
-                                            VALUES (%s, %s, %s, %s, %s, %s)
-                                        """,
-                                [project_id, "in-progress", activity_plan_id, country_id, province_id, district_id],
-                            )
-                            locations_created += 1
-                        else:
-                            locations_exists += 1
+            with transaction.atomic():
+                TargetLocation.objects.bulk_create(new_locations, batch_size=self.chunk_size)
+                schedule_organization_stats_refresh(
+                    project_ids={location.project_id for location in new_locations}, locations=True
+                )
+            locations_created += len(new_locations)
+            self.stdout.write(
+                f"Processed {min(start + self.chunk_size, len(locations))}/{len(locations)} rows, "
+                f"{locations_created} Target Locations created"
+            )
 
         self.stdout.write(self.style.SUCCESS(f"{locations_created} Target Locations - created successfully!!!"))
         self.stdout.write(self.style.SUCCESS(f"{locations_exists} Target Locations - Already Exists!!!"))
@@ -363,4 +383,5 @@ class Command(BaseCommand):
         self.target_locations_path = options.get("target_locations_path")
         self.activity_plans_path = options.get("activity_plans_path")
         self.projects_path = options.get("projects_path")
+        self.chunk_size = options["chunk_size"]
         self._import_data()
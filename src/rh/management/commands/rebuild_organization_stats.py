@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from rh.models import Organization
+from rh.utils import refresh_organization_locations_map, refresh_organization_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the home page counters and locations map of all the organizations."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of organizations recomputed per query.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        organization_ids = list(Organization.objects.order_by("pk").values_list("pk", flat=True))
+
+        for start in range(0, len(organization_ids), batch_size):
+            refresh_organization_stats(organization_ids[start : start + batch_size])
+            refresh_organization_locations_map(organization_ids[start : start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f"{len(organization_ids)} organizations stats rebuilt."))
@@ -0,0 +1,333 @@
+import csv
+import io
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from project_reports.models import DisaggregationLocationReport, ProjectMonthlyReport
+from rh.models import DisaggregationLocation, Organization, Project, TargetLocation
+from users.models import Profile
+
+# Regressions smaller than these are measurement noise
+TIME_TOLERANCE = 0.01  # seconds
+MEMORY_TOLERANCE = 256 * 1024  # bytes
+
+IMPORT_COLUMNS = [
+    "activity_domain",
+    "activity_type",
+    "indicator",
+    "hrp_beneficiary",
+    "beneficiary_status",
+    "package_type",
+    "unit_type",
+    "ration_type",
+    "ration_size",
+    "transfer_value",
+    "no_of_transfers",
+    "grant_type",
+    "transfer_category",
+    "transfer_mechanism_type",
+    "implement_modality_type",
+    "admin0pcode",
+    "admin1pcode",
+    "admin2pcode",
+    "admin3pcode",
+    "implementing_partner_code",
+]
+
+
+def _upload(content: bytes):
+    return {"file": SimpleUploadedFile("import.csv", content, content_type="text/csv")}
+
+
+# Benchmark name -> request of the benchmark
+BENCHMARKS = {
+    "home": lambda client, data: client.get(reverse("home")),
+    "org_projects_list": lambda client, data: client.get(reverse("projects-list")),
+    "user_clusters_projects_list": lambda client, data: client.get(reverse("user-clusters-projects-list")),
+    "cluster_projects_list": lambda client, data: client.get(
+        reverse("cluster-projects-list", args=[data["cluster"].code])
+    ),
+    "cluster_5w_dashboard": lambda client, data: client.get(reverse("clusters-5w", args=[data["cluster"].code])),
+    "org_5w_dashboard": lambda client, data: client.get(reverse("organizations-5w", args=[data["organization"].code])),
+    "stock_dashboard": lambda client, data: client.get(reverse("stock-dashboard")),
+    "cluster_5w_export": lambda client, data: client.get(
+        reverse("export-cluster-5w-dashboard", args=[data["cluster"].code])
+    ),
+    "org_5w_export": lambda client, data: client.get(
+        reverse("export-org-5w-dashboard", args=[data["organization"].code])
+    ),
+    "import_activity_plans": lambda client, data: client.post(
+        reverse("projects-import-activity-plans", args=[data["project"].pk]), _upload(data["import_csv"])
+    ),
+    "import_report_activities": lambda client, data: client.post(
+        reverse("import-report-activities", args=[data["monthly_report"].pk]), _upload(data["import_csv"])
+    ),
+    "copy_project": lambda client, data: client.post(reverse("copy_project", args=[data["project"].pk])),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the hot views against the current database (ex: a dataset made by `generate_dataset`). "
+        "Records the wall time, peak memory and SQL queries count of each view, compares them with a JSON "
+        "baseline and fails when a metric regresses past the threshold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run, all by default: {', '.join(BENCHMARKS)}")
+        parser.add_argument(
+            "--baseline",
+            default=os.path.join(settings.BASE_DIR, "benchmark-baseline.json"),
+            help="Path of the JSON baseline.",
+        )
+        parser.add_argument("--save", action="store_true", help="Save the results as the new baseline.")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs of each benchmark, the median is kept.")
+        parser.add_argument(
+            "--threshold", type=float, default=0.2, help="Allowed time and memory regression ratio (0.2 = +20%%)."
+        )
+        parser.add_argument(
+            "--cache",
+            action="store_true",
+            help="Use the configured cache, by default the cache is disabled to measure the uncached views.",
+        )
+
+    def handle(self, *args, **options):
+        names = options["benchmarks"] or list(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+        # Allow the test client host and keep the emails sent by the views in memory
+        overrides = {
+            "ALLOWED_HOSTS": [*settings.ALLOWED_HOSTS, "testserver"],
+            "EMAIL_BACKEND": "django.core.mail.backends.locmem.EmailBackend",
+        }
+        if not options["cache"]:
+            overrides["CACHES"] = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+        results = {}
+        # The benchmark user, its profile, groups and session are rolled back with the benchmarks changes
+        with transaction.atomic(), override_settings(**overrides):
+            data = self.load_data()
+            client = Client()
+            client.force_login(data["user"])
+
+            for name in names:
+                results[name] = self.run_benchmark(name, client, data, options["repeat"])
+                self.stdout.write(
+                    f"{name:<30} {results[name]['time'] * 1000:>9.1f} ms {results[name]['queries']:>6} queries "
+                    f"{results[name]['memory'] / 1024:>9.0f} KB"
+                )
+            transaction.set_rollback(True)
+
+        current = {"created_at": timezone.now().isoformat(), "dataset": self.dataset_size(), "results": results}
+
+        regressions = []
+        if os.path.exists(options["baseline"]):
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+            if baseline.get("dataset") != current["dataset"]:
+                self.stdout.write(self.style.WARNING("The dataset differs from the baseline dataset."))
+            regressions = self.compare(baseline["results"], results, options["threshold"])
+        else:
+            options["save"] = True
+
+        if options["save"]:
+            if os.path.exists(options["baseline"]):
+                with open(options["baseline"]) as f:
+                    baseline = json.load(f)
+                # Keep the baseline of the benchmarks that did not run
+                current["results"] = {**baseline["results"], **results}
+            with open(options["baseline"], "w") as f:
+                json.dump(current, f, indent=2)
+            self.stdout.write(f"Baseline saved to {options['baseline']}")
+
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            raise CommandError(f"{len(regressions)} benchmark metrics regressed.")
+
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} benchmarks passed."))
+
+    def load_data(self):
+        """Pick the largest organization, cluster and project of the dataset and create the benchmark user,
+        must run in the rolled back transaction of the benchmarks"""
+        organization_row = (
+            Project.objects.filter(organization__isnull=False)
+            .values("organization")
+            .annotate(count=Count("id"))
+            .order_by("-count")
+            .first()
+        )
+        if organization_row is None:
+            raise CommandError("The database has no projects, generate a dataset with `generate_dataset` first.")
+        organization = Organization.objects.get(pk=organization_row["organization"])
+
+        project = (
+            Project.objects.filter(organization=organization, state="in-progress", user__isnull=False)
+            .annotate(locations_count=Count("targetlocation"))
+            .order_by("-locations_count", "pk")
+            .select_related("user__profile")
+            .first()
+        )
+        if project is None:
+            raise CommandError(f"The organization {organization.code} has no in-progress project.")
+        monthly_report = ProjectMonthlyReport.objects.filter(project=project).order_by("-from_date").first()
+        if monthly_report is None:
+            raise CommandError(f"The project {project.code} has no monthly report.")
+
+        user, _ = User.objects.update_or_create(
+            username="benchmark", defaults={"email": "benchmark@example.com", "is_superuser": True, "is_staff": True}
+        )
+        profile, _ = Profile.objects.update_or_create(
+            user=user, defaults={"organization": organization, "country": project.user.profile.country}
+        )
+        profile.clusters.set(project.clusters.all())
+
+        # The project cluster with the most projects
+        cluster = project.clusters.annotate(count=Count("project")).order_by("-count", "pk").first()
+        group, _ = Group.objects.get_or_create(name=f"{cluster.code.upper()}_CLUSTER_LEADS")
+        user.groups.add(group)
+
+        return {
+            "user": user,
+            "organization": organization,
+            "cluster": cluster,
+            "project": project,
+            "monthly_report": monthly_report,
+            "import_csv": self.build_import_csv(project),
+        }
+
+    def build_import_csv(self, project) -> bytes:
+        """An import file of the project target locations, valid for both the activity plans and reports imports"""
+        locations = list(
+            TargetLocation.objects.filter(activity_plan__project=project, activity_plan__state="in-progress")
+            .select_related(
+                "activity_plan__activity_domain",
+                "activity_plan__activity_type",
+                "activity_plan__indicator",
+                "activity_plan__hrp_beneficiary",
+                "country",
+                "province",
+                "district",
+                "zone",
+                "implementing_partner",
+            )
+            .order_by("pk")
+        )
+        targets = {}
+        for disaggregation_location in DisaggregationLocation.objects.filter(
+            target_location__in=locations
+        ).select_related("disaggregation"):
+            targets.setdefault(disaggregation_location.target_location_id, {})[
+                disaggregation_location.disaggregation.name
+            ] = disaggregation_location.target
+
+        disaggregation_names = sorted({name for values in targets.values() for name in values})
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=IMPORT_COLUMNS + disaggregation_names, restval="")
+        writer.writeheader()
+        for location in locations:
+            plan = location.activity_plan
+            writer.writerow(
+                {
+                    "activity_domain": plan.activity_domain.name,
+                    "activity_type": plan.activity_type.name,
+                    "indicator": plan.indicator.name,
+                    "hrp_beneficiary": plan.hrp_beneficiary.name if plan.hrp_beneficiary else "",
+                    "beneficiary_status": "New Beneficiary",
+                    "transfer_value": 0,
+                    "no_of_transfers": 0,
+                    "admin0pcode": location.country.code if location.country else "",
+                    "admin1pcode": location.province.code if location.province else "",
+                    "admin2pcode": location.district.code if location.district else "",
+                    "admin3pcode": location.zone.code if location.zone else "",
+                    "implementing_partner_code": location.implementing_partner.code
+                    if location.implementing_partner
+                    else "",
+                    **targets.get(location.pk, {}),
+                }
+            )
+        return output.getvalue().encode()
+
+    def dataset_size(self) -> dict:
+        return {
+            "projects": Project.objects.count(),
+            "monthly_reports": ProjectMonthlyReport.objects.count(),
+            "disaggregation_location_reports": DisaggregationLocationReport.objects.count(),
+        }
+
+    def run_once(self, name, client, data, trace_memory: bool = False):
+        """Run a benchmark in a rolled back transaction, return its time, queries count and peak memory"""
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with transaction.atomic():
+            if trace_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            with connection.execute_wrapper(count_queries):
+                response = BENCHMARKS[name](client, data)
+                # The streamed exports run their queries while the content is consumed
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+            duration = time.perf_counter() - start
+            memory = 0
+            if trace_memory:
+                memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            transaction.set_rollback(True)
+
+        if response.status_code >= 400:
+            raise CommandError(f"The {name} benchmark failed with the status {response.status_code}.")
+        return duration, queries, memory
+
+    def run_benchmark(self, name, client, data, repeat: int) -> dict:
+        # Warm up the per-worker registries and the database cache
+        self.run_once(name, client, data)
+
+        durations = []
+        for _ in range(repeat):
+            duration, queries, _ = self.run_once(name, client, data)
+            durations.append(duration)
+        # tracemalloc slows the run down, its time is not kept
+        _, _, memory = self.run_once(name, client, data, trace_memory=True)
+
+        return {"time": round(statistics.median(durations), 4), "queries": queries, "memory": memory}
+
+    def compare(self, baseline: dict, results: dict, threshold: float) -> list:
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            previous = baseline[name]
+            if result["queries"] > previous["queries"]:
+                regressions.append(f"{name}: {result['queries']} queries instead of {previous['queries']}")
+            if result["time"] > previous["time"] * (1 + threshold) + TIME_TOLERANCE:
+                regressions.append(
+                    f"{name}: {result['time'] * 1000:.1f} ms instead of {previous['time'] * 1000:.1f} ms"
+                )
+            if result["memory"] > previous["memory"] * (1 + threshold) + MEMORY_TOLERANCE:
+                regressions.append(
+                    f"{name}: {result['memory'] / 1024:.0f} KB peak memory instead of {previous['memory'] / 1024:.0f} KB"
+                )
+        return regressions
@@ -0,0 +1,77 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rh.models import ExportJob
+from rh.utils import claim_export_job, run_export_job
+
+
+class Command(BaseCommand):
+    help = "Run the queued export jobs and store their files in MEDIA_ROOT."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when there is no queued job left instead of waiting for new jobs.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=2,
+            help="Seconds to wait before checking the queue again when it is empty.",
+        )
+        parser.add_argument(
+            "--purge-days",
+            type=int,
+            default=7,
+            help="Delete the finished jobs and their files older than this number of days.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=60,
+            help="Fail the jobs left running for more than this number of minutes by a crashed worker.",
+        )
+
+    def purge(self, days):
+        finished_jobs = ExportJob.objects.filter(
+            state__in=["completed", "failed"], created_at__lt=timezone.now() - timedelta(days=days)
+        )
+        for job in finished_jobs:
+            if job.file:
+                job.file.delete(save=False)
+            job.delete()
+
+    def fail_stale(self, minutes):
+        stale_jobs = ExportJob.objects.filter(
+            state="running", started_at__lt=timezone.now() - timedelta(minutes=minutes)
+        )
+        count = stale_jobs.update(
+            state="failed",
+            error=f"The export did not finish within {minutes} minutes.",
+            finished_at=timezone.now(),
+        )
+        if count:
+            self.stdout.write(self.style.ERROR(f"{count} stale running jobs failed"))
+
+    def handle(self, *args, **options):
+        self.purge(options["purge_days"])
+
+        while True:
+            self.fail_stale(options["timeout"])
+            job = claim_export_job()
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+                continue
+
+            self.stdout.write(f"Running {job}")
+            run_export_job(job)
+            if job.state == "completed":
+                self.stdout.write(self.style.SUCCESS(f"{job} -> {job.file.name}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"{job}: {job.error}"))
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:47
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rh', '0036_alter_disaggregationlocation_disaggregation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('export_type', models.CharField(choices=[('projects', 'Projects')], max_length=50)),
+                ('format', models.CharField(default='xlsx', max_length=10)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=15)),
+                ('progress', models.PositiveSmallIntegerField(default=0, validators=[django.core.validators.MaxValueValidator(100)])),
+                ('file', models.FileField(blank=True, null=True, upload_to='exports/%Y/%m/')),
+                ('file_name', models.CharField(blank=True, max_length=200, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Export Job',
+                'verbose_name_plural': 'Export Jobs',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rh', '0037_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active_projects_count', models.PositiveIntegerField(default=0)),
+                ('implementing_partners_count', models.PositiveIntegerField(default=0)),
+                ('activity_plans_count', models.PositiveIntegerField(default=0)),
+                ('target_locations_count', models.PositiveIntegerField(default=0, help_text='Distinct districts')),
+                ('pending_reports_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='rh.organization')),
+            ],
+            options={
+                'verbose_name': 'Organization Stats',
+                'verbose_name_plural': 'Organizations Stats',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rh', '0038_organizationstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organizationstats',
+            name='locations_map',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='organizationstats',
+            name='locations_map_etag',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+    ]
@@ -722,3 +722,65 @@ class ProjectIndicatorType(models.Model):
 
     def __str__(self):
         return self.project
+
+
+class ExportJob(models.Model):
+    """Export files generated in the background by the `run_export_jobs` worker"""
+
+    STATES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+    EXPORT_TYPES = [
+        ("projects", "Projects"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    export_type = models.CharField(max_length=50, choices=EXPORT_TYPES)
+    format = models.CharField(max_length=10, default="xlsx")
+    params = models.JSONField(default=dict, blank=True)
+
+    state = models.CharField(max_length=15, choices=STATES, default="queued")
+    progress = models.PositiveSmallIntegerField(default=0, validators=[MaxValueValidator(100)])
+    file = models.FileField(upload_to="exports/%Y/%m/", null=True, blank=True)
+    file_name = models.CharField(max_length=NAME_MAX_LENGTH, null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    def __str__(self):
+        return f"{self.get_export_type_display()} export {self.pk} ({self.state})"
+
+    class Meta:
+        verbose_name = "Export Job"
+        verbose_name_plural = "Export Jobs"
+
+
+class OrganizationStats(models.Model):
+    """Home page counters of the in-progress projects of an organization, refreshed by the signals"""
+
+    organization = models.OneToOneField(Organization, on_delete=models.CASCADE, related_name="stats")
+
+    active_projects_count = models.PositiveIntegerField(default=0)
+    implementing_partners_count = models.PositiveIntegerField(default=0)
+    activity_plans_count = models.PositiveIntegerField(default=0)
+    target_locations_count = models.PositiveIntegerField(default=0, help_text="Distinct districts")
+    pending_reports_count = models.PositiveIntegerField(default=0)
+
+    # District grouped target locations of the home page map, serialized when the locations change
+    locations_map = models.TextField(null=True, blank=True)
+    locations_map_etag = models.CharField(max_length=32, null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    def __str__(self):
+        return f"{self.organization} stats"
+
+    class Meta:
+        verbose_name = "Organization Stats"
+        verbose_name_plural = "Organizations Stats"
@@ -0,0 +1,171 @@
+"""Per-worker registry of the reference data.
+
+Locations, clusters, the activities taxonomy, the indicators, the disaggregations and the cash/in-kind
+lookup types change rarely but are read by every project form, HTMX select refresh and import.
+Each worker loads a table once and keeps it in memory while its version is unchanged: saving or
+deleting a row bumps the table version in the shared cache, so every worker reloads the table on
+its next access. A table is also reloaded after `REFERENCE_DATA_MAX_AGE` in case a version was lost.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.http import Http404
+
+from .models import (
+    ActivityDetail,
+    ActivityDomain,
+    ActivityType,
+    Cluster,
+    Disaggregation,
+    GrantType,
+    ImplementationModalityType,
+    Indicator,
+    Location,
+    PackageType,
+    RationSize,
+    RationType,
+    TransferCategory,
+    TransferMechanismType,
+    UnitType,
+)
+
+REFERENCE_DATA_MAX_AGE = 60 * 60  # 1 hour
+
+# The querysets of the reference tables, evaluated again on every reload
+REFERENCE_DATA = {
+    "locations": Location.objects.only("id", "parent_id", "level", "code", "name", "type").order_by("name"),
+    "clusters": Cluster.objects.order_by("title"),
+    "activity_domains": ActivityDomain.objects.order_by("name"),
+    "activity_domain_clusters": ActivityDomain.clusters.through.objects.all(),
+    "activity_domain_countries": ActivityDomain.countries.through.objects.all(),
+    "activity_types": ActivityType.objects.order_by("name"),
+    "activity_details": ActivityDetail.objects.order_by("name"),
+    "indicators": Indicator.objects.order_by("name"),
+    "indicator_activity_types": Indicator.activity_types.through.objects.all(),
+    "disaggregations": Disaggregation.objects.order_by("name"),
+    "implementation_modality_types": ImplementationModalityType.objects.order_by("name"),
+    "transfer_mechanism_types": TransferMechanismType.objects.order_by("name"),
+    "unit_types": UnitType.objects.order_by("name"),
+    "package_types": PackageType.objects.order_by("name"),
+    "ration_types": RationType.objects.order_by("name"),
+    "ration_sizes": RationSize.objects.order_by("name"),
+    "grant_types": GrantType.objects.order_by("name"),
+    "transfer_categories": TransferCategory.objects.order_by("name"),
+}
+
+# The reference table of each model, to invalidate it when a row changes
+REFERENCE_DATA_MODELS = {queryset.model: name for name, queryset in REFERENCE_DATA.items()}
+
+_registry = {}
+
+
+def _version_key(name: str) -> str:
+    return f"reference_data_version:{name}"
+
+
+def _get_entry(name: str) -> dict:
+    version = cache.get(_version_key(name), 0)
+    entry = _registry.get(name)
+    if entry is None or entry["version"] != version or time.monotonic() - entry["loaded_at"] > REFERENCE_DATA_MAX_AGE:
+        entry = {
+            "version": version,
+            "loaded_at": time.monotonic(),
+            "objects": list(REFERENCE_DATA[name].all()),
+            "indexes": {},
+        }
+        _registry[name] = entry
+    return entry
+
+
+def get_reference_data(name: str) -> list:
+    """Return the rows of a reference table"""
+    return _get_entry(name)["objects"]
+
+
+def get_reference_index(name: str, *fields: str, unique: bool = True) -> dict:
+    """Return the rows of a reference table indexed by the `fields` values.
+
+    The key is the value of the field, or the tuple of the values for several fields.
+    With `unique=False` each key maps to the list of its rows, in the table ordering.
+    """
+    entry = _get_entry(name)
+    index = entry["indexes"].get((fields, unique))
+    if index is None:
+        index = {}
+        for obj in entry["objects"]:
+            key = tuple(getattr(obj, field) for field in fields) if len(fields) > 1 else getattr(obj, fields[0])
+            if unique:
+                index[key] = obj
+            else:
+                index.setdefault(key, []).append(obj)
+        entry["indexes"][(fields, unique)] = index
+    return index
+
+
+def get_reference_object_or_404(name: str, pk):
+    """Return the row of a reference table by its primary key, or raise Http404"""
+    try:
+        return get_reference_index(name, "pk")[int(pk)]
+    except (KeyError, TypeError, ValueError):
+        raise Http404(f"No {REFERENCE_DATA[name].model._meta.object_name} matches the given query.")
+
+
+def get_location_children(parent_id, level: int | None = None) -> list:
+    """Return the child locations of a parent location, optionally of a level only"""
+    children = get_reference_index("locations", "parent_id", unique=False).get(parent_id, [])
+    if level is not None:
+        children = [location for location in children if location.level == level]
+    return children
+
+
+def get_activity_domains(cluster_ids, country_id) -> list:
+    """Return the active activity domains of any of the clusters and of the country"""
+    clusters_index = get_reference_index("activity_domain_clusters", "cluster_id", unique=False)
+    countries_index = get_reference_index("activity_domain_countries", "location_id", unique=False)
+
+    domain_ids = {
+        row.activitydomain_id for cluster_id in cluster_ids for row in clusters_index.get(int(cluster_id), [])
+    }
+    domain_ids &= {row.activitydomain_id for row in countries_index.get(country_id, [])}
+
+    return [domain for domain in get_reference_data("activity_domains") if domain.is_active and domain.pk in domain_ids]
+
+
+def get_activity_domain_types(activity_domain_id, active_only: bool = True) -> list:
+    """Return the activity types of an activity domain"""
+    activity_types = get_reference_index("activity_types", "activity_domain_id", unique=False).get(
+        activity_domain_id, []
+    )
+    return [activity_type for activity_type in activity_types if activity_type.is_active or not active_only]
+
+
+def get_activity_type_indicators(activity_type_id, active_only: bool = True) -> list:
+    """Return the indicators of an activity type"""
+    indicators = get_reference_index("indicators", "pk")
+    rows = get_reference_index("indicator_activity_types", "activitytype_id", unique=False).get(activity_type_id, [])
+    return sorted(
+        (
+            indicators[row.indicator_id]
+            for row in rows
+            if row.indicator_id in indicators and (indicators[row.indicator_id].is_active or not active_only)
+        ),
+        key=lambda indicator: indicator.name,
+    )
+
+
+def invalidate_reference_data(name: str):
+    """Reload a reference table in every worker"""
+    cache.set(_version_key(name), time.time_ns(), timeout=None)
+    _registry.pop(name, None)
+
+
+def set_reference_choices(field, objects):
+    """Render a model choice field from reference rows instead of querying its queryset.
+
+    The field queryset is still used to validate the submitted value.
+    """
+    choices = [(obj.pk, field.label_from_instance(obj)) for obj in objects]
+    if getattr(field, "empty_label", None) is not None:
+        choices.insert(0, ("", field.empty_label))
+    field.choices = choices
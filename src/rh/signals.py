@@ -1,10 +1,12 @@
 from django.contrib.auth.models import Group
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
 from django.dispatch import receiver
 
 from users.utils import assign_default_permissions_to_group
 
-from .models import Cluster
+from .models import ActivityPlan, Cluster, Project, TargetLocation
+from .reference_data import REFERENCE_DATA_MODELS, invalidate_reference_data
+from .utils import invalidate_projects_counters, schedule_organization_stats_refresh
 
 
 @receiver(post_save, sender=Cluster)
@@ -14,3 +16,75 @@ def post_create_cluster(sender, instance, created, **kwargs):
         if created:
             # Assign default permissions to the group
             assign_default_permissions_to_group(source_group_name="BASE_CLUSTER_LEAD", target_group=group)
+
+
+@receiver(post_init, sender=Project)
+def post_init_project(sender, instance, **kwargs):
+    # Deferred fields are not loaded, the saves of such projects always refresh the stats
+    instance._initial_organization_id = instance.__dict__.get("organization_id")
+    instance._initial_state = instance.__dict__.get("state")
+    instance._initial_code = instance.__dict__.get("code")
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def post_change_project(sender, instance, **kwargs):
+    # Cached projects list counters are outdated
+    invalidate_projects_counters()
+
+    # Only the in-progress projects are counted in the organizations home stats, the map shows their codes
+    if (
+        kwargs.get("created")
+        or kwargs["signal"] is post_delete
+        or instance.state != instance._initial_state
+        or instance.organization_id != instance._initial_organization_id
+        or instance.code != instance._initial_code
+    ):
+        schedule_organization_stats_refresh(
+            [instance.organization_id, instance._initial_organization_id], locations=not kwargs.get("created")
+        )
+
+    instance._initial_organization_id = instance.organization_id
+    instance._initial_state = instance.state
+    instance._initial_code = instance.code
+
+
+@receiver(m2m_changed, sender=Project.clusters.through)
+@receiver(m2m_changed, sender=Project.activity_domains.through)
+@receiver(m2m_changed, sender=Project.donors.through)
+@receiver(m2m_changed, sender=Project.implementing_partners.through)
+@receiver(m2m_changed, sender=Project.programme_partners.through)
+def project_relations_changed(sender, instance, action, **kwargs):
+    if action in ["post_add", "post_remove", "post_clear"]:
+        invalidate_projects_counters()
+
+        if sender is Project.implementing_partners.through:
+            if isinstance(instance, Project):
+                schedule_organization_stats_refresh([instance.organization_id])
+            elif kwargs["pk_set"]:
+                schedule_organization_stats_refresh(project_ids=kwargs["pk_set"])
+
+
+@receiver(post_save, sender=ActivityPlan)
+@receiver(post_delete, sender=ActivityPlan)
+@receiver(post_save, sender=TargetLocation)
+@receiver(post_delete, sender=TargetLocation)
+def post_change_project_activity(sender, instance, **kwargs):
+    # The activity plans and districts counters, and the locations map, of the project organization are outdated
+    if sender is ActivityPlan and kwargs["signal"] is post_save and not kwargs["created"]:
+        return
+    schedule_organization_stats_refresh(project_ids=[instance.project_id], locations=sender is TargetLocation)
+
+
+def reference_data_changed(sender, action=None, **kwargs):
+    # The reference table is reloaded by every worker on its next access
+    if action is None or action.startswith("post_"):
+        invalidate_reference_data(REFERENCE_DATA_MODELS[sender])
+
+
+for model in REFERENCE_DATA_MODELS:
+    if model._meta.auto_created:
+        m2m_changed.connect(reference_data_changed, sender=model)
+    else:
+        post_save.connect(reference_data_changed, sender=model)
+        post_delete.connect(reference_data_changed, sender=model)
@@ -1,9 +1,44 @@
-from django.contrib.auth.models import User
-from django.test import Client, TestCase
+import datetime
+import json
+import os
+import tempfile
+from io import BytesIO, StringIO
+
+import pandas as pd
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from extra_settings.models import Setting
+from openpyxl import load_workbook
 
-from rh.models import Cluster, Location, Organization
+from core.pagination import KeysetPaginator
+from core.xlsx import create_workbook, write_rows, write_sheet
+from project_reports.models import DisaggregationLocationReport, ReachFact
+from project_reports.utils import REACH_REPORT_STATES
+from rh.filters import ProjectsFilter
+from rh.models import (
+    ActivityDomain,
+    ActivityPlan,
+    ActivityType,
+    Cluster,
+    ExportJob,
+    Indicator,
+    Location,
+    Organization,
+    Project,
+    TargetLocation,
+)
+from rh.utils import get_projects_states_counts, paginate_projects
+from users.authorization import prime_user_caches
+from users.backends import get_user_with_profile
 from users.models import Profile
+from users.utils import is_cluster_lead, is_cluster_lead_of
 
 
 class TestLoggedInViews(TestCase):
@@ -97,3 +132,521 @@ class TestNotLoggedInViews(TestCase):
         response = self.client.get(self.load_facility_sites_url, params)
 
         self.assertEqual(response.status_code, 302)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestProjectsExportJob(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.user.user_permissions.add(Permission.objects.get(codename="add_project"))
+        org = Organization.objects.create(name="immap", code="immap")
+        Profile.objects.create(user=self.user, organization=org)
+
+        today = timezone.now()
+        Project.objects.create(
+            organization=org,
+            user=self.user,
+            title="Winterization",
+            code="winter-1",
+            state="in-progress",
+            start_date=today,
+            end_date=today + datetime.timedelta(days=90),
+        )
+
+        self.client.login(username="testuser", password="testpassword")
+
+    def test_excel_export_is_generated_by_a_job(self):
+        response = self.client.post(
+            reverse("export_project_excel", args=["xls"]), data="[]", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["state"], "queued")
+
+        call_command("run_export_jobs", "--once", stdout=StringIO())
+
+        status = self.client.get(response.json()["status_url"]).json()
+        self.assertEqual(status["state"], "completed")
+        self.assertEqual(status["progress"], 100)
+
+        download = self.client.get(status["file_url"])
+        self.assertEqual(download.status_code, 200)
+        self.assertIn(status["file_name"], download["Content-Disposition"])
+        self.assertTrue(ExportJob.objects.get().file.name.startswith("exports/"))
+
+    def test_jobs_left_running_by_a_crashed_worker_fail(self):
+        stale_job = ExportJob.objects.create(
+            user=self.user,
+            export_type="projects",
+            state="running",
+            started_at=timezone.now() - datetime.timedelta(hours=2),
+        )
+        running_job = ExportJob.objects.create(
+            user=self.user, export_type="projects", state="running", started_at=timezone.now()
+        )
+
+        call_command("run_export_jobs", "--once", "--timeout", "60", stdout=StringIO())
+
+        stale_job.refresh_from_db()
+        self.assertEqual(stale_job.state, "failed")
+        self.assertIsNotNone(stale_job.finished_at)
+        self.assertIn("60 minutes", stale_job.error)
+        self.assertEqual(ExportJob.objects.get(pk=running_job.pk).state, "running")
+
+
+class TestKeysetPagination(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpassword")
+        org = Organization.objects.create(name="immap", code="immap")
+
+        today = timezone.now()
+        for i in range(12):
+            Project.objects.create(
+                organization=org,
+                user=user,
+                title=f"Project {i}",
+                code=f"project-{i}",
+                start_date=today,
+                end_date=today + datetime.timedelta(days=90),
+            )
+
+        # Projects updated at the same time are ordered by id, projects never updated are last
+        projects = list(Project.objects.order_by("pk"))
+        for i, project in enumerate(projects[:9]):
+            Project.objects.filter(pk=project.pk).update(updated_at=today - datetime.timedelta(days=i // 2))
+        Project.objects.filter(pk__in=[project.pk for project in projects[9:]]).update(updated_at=None)
+
+        self.expected = [p.pk for p in sorted(projects[:9], key=lambda p: (projects.index(p) // 2, -p.pk))] + [
+            p.pk for p in reversed(projects[9:])
+        ]
+
+    def test_pages_follow_the_keyset_ordering(self):
+        paginator = KeysetPaginator(Project.objects.all(), per_page=5)
+
+        pages = [paginator.get_page(None)]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_page_number()))
+
+        self.assertEqual(
+            [[p.pk for p in page] for page in pages], [self.expected[:5], self.expected[5:10], self.expected[10:]]
+        )
+        self.assertEqual(
+            [(page.number, page.start_index(), page.end_index()) for page in pages],
+            [(1, 1, 5), (2, 6, 10), (3, 11, 12)],
+        )
+
+        previous = paginator.get_page(pages[2].previous_page_number())
+        self.assertEqual([p.pk for p in previous], self.expected[5:10])
+        self.assertTrue(previous.has_previous())
+        first = paginator.get_page(previous.previous_page_number())
+        self.assertEqual([p.pk for p in first], self.expected[:5])
+        self.assertFalse(first.has_previous())
+
+        self.assertEqual([p.pk for p in paginator.get_page("invalid")], self.expected[:5])
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestProjectsCounters(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = user = User.objects.create_user(username="testuser", password="testpassword")
+        org = Organization.objects.create(name="immap", code="immap")
+        self.cluster = Cluster.objects.create(title="ESNFI", code="esnfi")
+        Profile.objects.create(user=user, organization=org).clusters.add(self.cluster)
+
+        today = timezone.now()
+        for i, state in enumerate(["in-progress", "in-progress", "in-progress", "draft", "draft", "completed"]):
+            Project.objects.create(
+                organization=org,
+                user=user,
+                title=f"Project {i}",
+                code=f"project-{i}",
+                state=state,
+                start_date=today,
+                end_date=today + datetime.timedelta(days=90),
+            )
+        Project.objects.get(code="project-0").clusters.add(self.cluster)
+
+    def paginate(self, **params):
+        request = RequestFactory().get("/", params)
+        request.user = self.user
+        project_filter = ProjectsFilter(request.GET, request=request, queryset=Project.objects.order_by("-updated_at"))
+        return paginate_projects(request, project_filter, scope="organization:1")
+
+    def test_states_are_counted_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_projects_states_counts(ProjectsFilter({}, queryset=Project.objects.all()), "organization:1"),
+                {"in-progress": 3, "draft": 2, "completed": 1},
+            )
+
+        # The cached counts give the paginator total, only the page is fetched
+        with self.assertNumQueries(1):
+            page, counters = self.paginate(state="draft", per_page=1)
+            self.assertEqual([project.state for project in page], ["draft"])
+        self.assertEqual((page.paginator.count, page.paginator.num_pages), (2, 2))
+        self.assertEqual(
+            counters,
+            {
+                "draft_projects_count": 2,
+                "active_projects_count": 3,
+                "completed_projects_count": 1,
+                "archived_projects_count": 0,
+                "projects_count": 6,
+            },
+        )
+
+    def test_counters_are_invalidated(self):
+        self.assertEqual(self.paginate()[1]["draft_projects_count"], 2)
+        self.assertEqual(self.paginate(clusters=self.cluster.pk)[1]["projects_count"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            project = Project.objects.get(code="project-1")
+            project.state = "draft"
+            project.save()
+        self.assertEqual(self.paginate()[1]["draft_projects_count"], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            project.clusters.add(self.cluster)
+        self.assertEqual(self.paginate(clusters=self.cluster.pk)[1]["projects_count"], 2)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestReferenceData(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+        user = User.objects.create_user(username="testuser", password="testpassword")
+        Profile.objects.create(user=user, organization=Organization.objects.create(name="immap", code="immap"))
+
+        self.activity_domain = ActivityDomain.objects.create(name="Shelter", code="shelter")
+        activity_type = ActivityType.objects.create(name="Tents", code="tents", activity_domain=self.activity_domain)
+        ActivityType.objects.create(name="Blankets", code="blankets", activity_domain=self.activity_domain)
+        Indicator.objects.create(name="Tents distributed").activity_types.add(activity_type)
+
+        self.client.login(username="testuser", password="testpassword")
+
+    def test_htmx_select_options_are_served_from_memory(self):
+        url = reverse("activity-domains-types")
+        params = {"activity_domain": self.activity_domain.pk}
+        self.client.get(url, params)
+
+        # Only the session and user queries of the request remain
+        with self.assertNumQueries(2):
+            response = self.client.get(url, params)
+        self.assertContains(response, "<option", count=3)
+
+        ActivityType.objects.create(name="Stoves", code="stoves", activity_domain=self.activity_domain)
+        response = self.client.get(url, params)
+        self.assertContains(response, "Stoves")
+
+
+class TestImportActivityPlans(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+        country = Location.objects.create(name="Afghanistan", code="AF", parent=None)
+        kabul = Location.objects.create(name="Kabul", code="AF01", parent=country, level=1)
+        Location.objects.create(name="Kapisa", code="AF02", parent=country, level=1)
+        paghman = Location.objects.create(name="Paghman", code="AF0102", parent=kabul, level=2)
+        Location.objects.create(name="Qala-e-Malik", code="AF010201", parent=paghman, level=3)
+
+        user = User.objects.create_user(username="testuser", password="testpassword")
+        org = Organization.objects.create(name="immap", code="immap")
+        Profile.objects.create(user=user, organization=org)
+
+        activity_domain = ActivityDomain.objects.create(name="Shelter", code="shelter")
+        activity_type = ActivityType.objects.create(name="Tents", code="tents", activity_domain=activity_domain)
+        Indicator.objects.create(name="Tents distributed").activity_types.add(activity_type)
+
+        today = timezone.now()
+        self.project = Project.objects.create(
+            organization=org,
+            user=user,
+            title="Winterization",
+            code="winter-1",
+            start_date=today,
+            end_date=today + datetime.timedelta(days=90),
+        )
+        self.project.activity_domains.add(activity_domain)
+
+        self.client.login(username="testuser", password="testpassword")
+
+    def import_rows(self, *locations):
+        header = [
+            "activity_domain",
+            "activity_type",
+            "indicator",
+            "hrp_beneficiary",
+            "package_type",
+            "unit_type",
+            "transfer_value",
+            "no_of_transfers",
+            "ration_size",
+            "ration_type",
+            "grant_type",
+            "transfer_category",
+            "transfer_mechanism_type",
+            "implement_modality_type",
+            "implementing_partner_code",
+            "admin0pcode",
+            "admin1pcode",
+            "admin2pcode",
+            "admin3pcode",
+        ]
+        rows = [",".join(header)]
+        for location in locations:
+            rows.append(",".join(["Shelter", "Tents", "Tents distributed", "", "", "", "0", "0"] + [""] * 7 + location))
+
+        file = SimpleUploadedFile("activity_plans.csv", "\n".join(rows).encode(), content_type="text/csv")
+        return self.client.post(reverse("projects-import-activity-plans", args=[self.project.pk]), {"file": file})
+
+    def test_locations_follow_the_hierarchy(self):
+        response = self.import_rows(["AF", "AF01", "AF0102", "AF010201"])
+        self.assertEqual(response.context["errors"], [])
+        self.assertEqual(
+            list(TargetLocation.objects.values_list("province__code", "district__code", "zone__code")),
+            [("AF01", "AF0102", "AF010201")],
+        )
+
+        # The district exists under another province
+        response = self.import_rows(["AF", "AF02", "AF0102", ""])
+        self.assertIn("Row 2: District 'AF0102' does not exist. Check the District code.", response.context["errors"])
+        # The zone of another district is ignored
+        response = self.import_rows(["AF", "AF01", "AF0102", "AF02"])
+        self.assertEqual(response.context["errors"], [])
+        self.assertEqual(
+            sorted(TargetLocation.objects.values_list("province__code", "district__code", "zone__code"), key=str),
+            sorted([("AF01", "AF0102", "AF010201"), ("AF01", "AF0102", None)], key=str),
+        )
+
+
+class TestMaintenanceMode(TestCase):
+    def test_settings_changes_are_applied(self):
+        client = Client()
+        response = client.get(reverse("login"))
+        self.assertEqual(response.status_code, 200)
+
+        setting = Setting.objects.get(name="MAINTENANCE_MODE_ENABLED")
+        setting.value = True
+        setting.save()
+
+        response = client.get(reverse("login"))
+        self.assertRedirects(response, reverse("maintenance"), fetch_redirect_response=False)
+
+        # The settings are served from memory until they change again
+        with self.assertNumQueries(0):
+            client.get(reverse("login"))
+
+        setting.value = False
+        setting.save()
+
+        response = client.get(reverse("login"))
+        self.assertEqual(response.status_code, 200)
+
+
+class TestLoadProjects(TestCase):
+    def setUp(self):
+        country = Location.objects.create(name="Afghanistan", code="AF", parent=None)
+        province = Location.objects.create(name="Kabul", code="AF01", parent=country, level=1)
+        district = Location.objects.create(name="Paghman", code="AF0102", parent=province, level=2)
+        activity_domain = ActivityDomain.objects.create(name="Shelter", code="shelter")
+        activity_type = ActivityType.objects.create(name="Tents", code="tents", activity_domain=activity_domain)
+        indicator = Indicator.objects.create(name="Tents distributed")
+
+        today = timezone.now()
+        project = Project.objects.create(
+            organization=Organization.objects.create(name="immap", code="immap"),
+            user=User.objects.create_user(username="testuser", password="testpassword"),
+            title="Winterization",
+            code="winter-1",
+            old_id="old-1",
+            start_date=today,
+            end_date=today + datetime.timedelta(days=90),
+        )
+        self.plans = plans = [
+            ActivityPlan.objects.create(
+                project=project, activity_domain=activity_domain, activity_type=activity_type, indicator=indicator
+            )
+            for _ in range(2)
+        ]
+        TargetLocation.objects.create(
+            project=project,
+            activity_plan=plans[0],
+            state="in-progress",
+            country=country,
+            province=province,
+            district=district,
+        )
+
+    def test_target_locations_are_loaded_in_chunks(self):
+        rows = [
+            # Created for the second activity plan, exists for the first one
+            {"project_id": "old-1", "admin1pcode": "AF01", "admin2pcode": "AF0102"},
+            # Repeated in the file
+            {"project_id": "old-1", "admin1pcode": "AF01", "admin2pcode": "AF0102"},
+            # Without district, created for both activity plans then repeated
+            {"project_id": "old-1", "admin1pcode": "AF01", "admin2pcode": None},
+            {"project_id": "old-1", "admin1pcode": "AF01", "admin2pcode": None},
+            # Unknown project
+            {"project_id": "old-2", "admin1pcode": "AF01", "admin2pcode": "AF0102"},
+        ]
+        with tempfile.NamedTemporaryFile(suffix=".xlsx") as file:
+            pd.DataFrame(rows).to_excel(file.name, index=False)
+
+            out = StringIO()
+            call_command("load_projects", "--target-locations-path", file.name, "--chunk-size", "2", stdout=out)
+
+        output = out.getvalue()
+        self.assertIn("Processed 2/5 rows, 1 Target Locations created", output)
+        self.assertIn("Processed 4/5 rows, 3 Target Locations created", output)
+        self.assertIn("Processed 5/5 rows, 3 Target Locations created", output)
+        self.assertIn("3 Target Locations - created successfully", output)
+        self.assertIn("5 Target Locations - Already Exists", output)
+        self.assertEqual(
+            sorted(TargetLocation.objects.values_list("activity_plan_id", "district__code"), key=str),
+            sorted([(plan.pk, code) for plan in self.plans for code in ["AF0102", None]], key=str),
+        )
+
+
+class TestGenerateDataset(TestCase):
+    def test_generate_dataset(self):
+        call_command("generate_dataset", projects=20, months=3, organizations=3, seed=1, stdout=StringIO())
+
+        self.assertEqual(Project.objects.filter(code__startswith="synthetic-1-").count(), 20)
+        self.assertEqual(
+            ReachFact.objects.count(),
+            DisaggregationLocationReport.objects.filter(
+                target_location_report__activity_plan_report__monthly_report__state__in=REACH_REPORT_STATES
+            ).count(),
+        )
+
+        # The same seed generates the same dataset
+        budgets = list(Project.objects.order_by("code").values_list("budget", flat=True))
+        call_command("generate_dataset", projects=20, months=3, organizations=3, seed=1, flush=True, stdout=StringIO())
+        self.assertEqual(list(Project.objects.order_by("code").values_list("budget", flat=True)), budgets)
+
+
+class TestXlsxWriter(SimpleTestCase):
+    def test_sheet_round_trip(self):
+        columns = [
+            {"header": "code", "type": "string", "width": 20},
+            {"header": "budget", "type": "number", "width": 10},
+            {"header": "start_date", "type": "date", "width": 15},
+        ]
+        rows = [["winter\x07-1", 100, datetime.date(2024, 1, 1)], ["winter-2", None, None]]
+
+        workbook = create_workbook()
+        write_sheet(workbook, "Projects", columns, iter(rows))
+        write_rows(workbook.create_sheet("Empty"), [])
+        file = BytesIO()
+        workbook.save(file)
+
+        workbook = load_workbook(file)
+        self.assertEqual(workbook.sheetnames, ["Projects", "Empty"])
+        sheet = workbook["Projects"]
+        self.assertEqual(sheet.freeze_panes, "A2")
+        self.assertEqual([cell.value for cell in sheet[1]], ["code", "budget", "start_date"])
+        self.assertTrue(all(cell.font.b for cell in sheet[1]))
+        self.assertEqual(sheet.column_dimensions["A"].width, 20)
+        # The illegal characters are stripped
+        self.assertEqual(
+            [[cell.value for cell in row] for row in sheet.iter_rows(min_row=2)],
+            [["winter-1", 100, datetime.datetime(2024, 1, 1)], ["winter-2", None, None]],
+        )
+
+
+class TestRunBenchmarks(TestCase):
+    def test_run_benchmarks(self):
+        call_command("generate_dataset", projects=10, months=2, organizations=2, seed=1, stdout=StringIO())
+        baseline = f"{tempfile.mkdtemp()}/baseline.json"
+
+        call_command("run_benchmarks", baseline=baseline, repeat=1, stdout=StringIO())
+        with open(baseline) as f:
+            results = json.load(f)["results"]
+        self.assertIn("copy_project", results)
+        self.assertFalse(User.objects.filter(username="benchmark").exists())
+        self.assertEqual(set(results["home"]), {"time", "queries", "memory"})
+
+        # A view running more queries than its baseline fails the run
+        results["home"]["queries"] -= 1
+        with open(baseline, "w") as f:
+            json.dump({"results": results}, f)
+        with self.assertRaises(CommandError):
+            call_command("run_benchmarks", "home", baseline=baseline, repeat=1, stdout=StringIO())
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestAuthContext(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        Profile.objects.create(user=self.user, organization=Organization.objects.create(name="immap", code="immap"))
+        Cluster.objects.create(code="esnfi", name="ESNFI", title="ESNFI")
+
+    def test_context_is_cached_and_invalidated(self):
+        self.assertFalse(is_cluster_lead(User.objects.get(pk=self.user.pk), ["esnfi"]))
+
+        # A new request user, loaded with its profile in one query, is served from the cache
+        with self.assertNumQueries(1):
+            user = get_user_with_profile(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(is_cluster_lead(user, ["esnfi"]))
+            self.assertFalse(prime_user_caches(user).has_perm("rh.add_project"))
+            self.assertEqual(user.profile.organization.code, "immap")
+            self.assertEqual(user.profile.cluster_ids, [])
+
+        group = Group.objects.get(name="ESNFI_CLUSTER_LEADS")
+        group.permissions.add(Permission.objects.get(codename="add_project"))
+        self.user.groups.add(group)
+
+        user = prime_user_caches(get_user_with_profile(self.user.pk))
+        self.assertTrue(is_cluster_lead_of(user, "esnfi"))
+        self.assertTrue(user.has_perm("rh.add_project"))
+
+    def test_sessions_of_the_previous_backend_stay_logged_in(self):
+        self.client.force_login(self.user, backend="django.contrib.auth.backends.ModelBackend")
+        self.assertEqual(self.client.get(reverse("home")).context["user"], self.user)
+        # Moved to the backend loading the user with its profile
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], "users.backends.ProfileBackend")
+
+
+class TestMetrics(TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        Profile.objects.create(user=self.user, organization=Organization.objects.create(name="immap", code="immap"))
+
+    def test_requests_are_measured(self):
+        self.client.force_login(self.user)
+        with override_settings(METRICS_DIR=self.metrics_dir, METRICS_TOKEN="", QUERY_BUDGETS={"home": 0}):
+            with self.assertLogs("core.middleware", level="WARNING") as logs:
+                self.assertEqual(self.client.get(reverse("home")).status_code, 200)
+            self.assertIn("Query budget exceeded: home", logs.output[0])
+
+            metrics = self.client.get(reverse("metrics")).content.decode()
+
+        self.assertRegex(metrics, r'rh_http_requests_total\{view="home",method="GET",status="200"\} \d+')
+        self.assertRegex(metrics, r'rh_http_query_budget_exceeded_total\{view="home",method="GET",status="200"\} \d+')
+        self.assertRegex(metrics, r'rh_http_request_duration_seconds_bucket\{view="home",le="\+Inf"\} \d+')
+        self.assertRegex(metrics, r'rh_http_request_db_queries_count\{view="home"\} \d+')
+
+    def test_dead_workers_are_archived(self):
+        dead_worker = {"counters": {json.dumps(["requests_total", "dead", "GET", "200"]): 3}, "histograms": {}}
+        with open(f"{self.metrics_dir}/worker-999999999-1.json", "w") as f:
+            json.dump(dead_worker, f)
+
+        with override_settings(METRICS_DIR=self.metrics_dir, METRICS_TOKEN=""):
+            for _ in range(2):
+                metrics = self.client.get(reverse("metrics")).content.decode()
+                self.assertIn('rh_http_requests_total{view="dead",method="GET",status="200"} 3', metrics)
+
+        self.assertFalse(os.path.exists(f"{self.metrics_dir}/worker-999999999-1.json"))
+        self.assertTrue(os.path.exists(f"{self.metrics_dir}/archive.json"))
+
+    def test_token_is_required(self):
+        with override_settings(METRICS_DIR=self.metrics_dir, METRICS_TOKEN="secret"):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+            response = self.client.get(reverse("metrics"), headers={"authorization": "Bearer secret"})
+            self.assertEqual(response.status_code, 200)
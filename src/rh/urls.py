@@ -244,6 +244,8 @@ urlpatterns = [
         export_views.project_export_excel_view,
         name="export_project_excel",
     ),
+    path("exports/jobs/<int:pk>", export_views.export_job_status, name="export-job-status"),
+    path("exports/jobs/<int:pk>/download", export_views.export_job_download, name="export-job-download"),
     # single project export
     path(
         "project/export/<str:pk>/<str:format>",
@@ -1,11 +1,30 @@
+import hashlib
 import json
+import logging
+import tempfile
+import time
 from datetime import datetime
+from datetime import timezone as dt_timezone
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count
+from django.http import QueryDict
+from django.utils import timezone
 
-from rh.models import Project, TargetLocation
+from core.pagination import paginate
+from core.xlsx import create_workbook, write_sheet
+from project_reports.models import ProjectMonthlyReport
+from rh.filters import ProjectsFilter
+from rh.models import ActivityPlan, ExportJob, Organization, OrganizationStats, Project, TargetLocation
+from users.authorization import get_auth_context
 from users.utils import is_cluster_lead
 
+logger = logging.getLogger(__name__)
+
 
 def has_permission(user: User, project: Project = None, clusters: list = [], permission: str = ""):
     if user.is_superuser:
@@ -16,7 +35,7 @@ def has_permission(user: User, project: Project = None, clusters: list = [], per
             return False
 
     if project:
-        if not (project.user == user or user.profile.organization == project.organization):
+        if not (project.user_id == user.pk or get_auth_context(user).organization_id == project.organization_id):
             project_clusters = project.clusters.values_list("code", flat=True)
             if not is_cluster_lead(user=user, clusters=project_clusters):
                 return False
@@ -47,3 +66,530 @@ def update_project_plan_state(project: Project, state: str):
 
     project.state = state
     project.save()
+
+
+# ##############################################
+# ############## Dashboards Cache ##############
+# ##############################################
+
+DASHBOARD_CACHE_TIMEOUT = 60 * 60  # 1 hour
+
+DASHBOARD_CACHE_VIEWS = ["cluster_5w_dashboard", "org_5w_dashboard", "stock_dashbaord"]
+
+
+def normalize_filter_params(query_dict, fields) -> dict:
+    """Returns the non-empty values of the filter `fields` in a QueryDict, sorted so
+    the same filter always produces the same cache key whatever the parameters order.
+    """
+    params = {}
+    for field in sorted(fields):
+        values = sorted(value for value in query_dict.getlist(field) if value)
+        if values:
+            params[field] = values
+    return params
+
+
+def _dashboard_version_key(scope: str) -> str:
+    return f"dashboard_version:{scope}"
+
+
+def get_dashboard_cache_key(view: str, scopes: list, params: dict) -> str:
+    """Cache key of a dashboard result. It includes the version of each scope
+    (ex: `cluster:1`, `organization:5`) so that bumping a scope's version invalidates
+    every cached result of that scope.
+    """
+    version_keys = [_dashboard_version_key(scope) for scope in scopes]
+    versions = cache.get_many(version_keys)
+    scope_versions = [f"{scope}@{versions.get(key, 0)}" for scope, key in zip(scopes, version_keys)]
+
+    params_hash = hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f"dashboard:{view}:{':'.join(scope_versions)}:{params_hash}"
+
+
+# Version keys of the cached results changed in the current transaction
+_stale_cache_versions = set()
+
+
+def _bump_stale_cache_versions():
+    version_keys = set(_stale_cache_versions)
+    _stale_cache_versions.clear()
+    if version_keys:
+        version = time.time_ns()
+        cache.set_many({key: version for key in version_keys}, timeout=None)
+
+
+def _schedule_cache_versions_bump(version_keys):
+    """Bump the cache versions once the current transaction is committed, a result computed before the
+    commit is cached under the previous version. The keys changed several times in a transaction are bumped once.
+    """
+    _stale_cache_versions.update(version_keys)
+    # The first callback bumps all the stale versions, the next ones have nothing left to do
+    transaction.on_commit(_bump_stale_cache_versions)
+
+
+def invalidate_dashboard_cache(scopes: list):
+    """Invalidate the cached dashboards results of the given scopes when the current transaction is committed"""
+    _schedule_cache_versions_bump([_dashboard_version_key(scope) for scope in scopes])
+
+
+def _count_dashboard_cache(view: str, result: str):
+    key = f"dashboard_cache_stats:{view}:{result}"
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The cache backend does not keep the values (ex: DummyCache)
+        pass
+
+
+def get_cached_dashboard_data(view: str, scopes: list, params: dict, compute):
+    """Return the cached result of a dashboard, or compute and cache it"""
+    key = get_dashboard_cache_key(view, scopes, params)
+
+    data = cache.get(key)
+    if data is None:
+        _count_dashboard_cache(view, "misses")
+        data = compute()
+        cache.set(key, data, timeout=DASHBOARD_CACHE_TIMEOUT)
+    else:
+        _count_dashboard_cache(view, "hits")
+
+    return data
+
+
+def get_dashboard_cache_stats() -> dict:
+    """Hits and misses counters of the dashboards cache"""
+    counters = cache.get_many(
+        [f"dashboard_cache_stats:{view}:{result}" for view in DASHBOARD_CACHE_VIEWS for result in ["hits", "misses"]]
+    )
+
+    stats = {}
+    for view in DASHBOARD_CACHE_VIEWS:
+        hits = counters.get(f"dashboard_cache_stats:{view}:hits", 0)
+        misses = counters.get(f"dashboard_cache_stats:{view}:misses", 0)
+        stats[view] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return stats
+
+
+# ##############################################
+# ############ Projects List Counters ##########
+# ##############################################
+
+PROJECTS_COUNTERS_CACHE_TIMEOUT = 60 * 15  # 15 minutes
+
+PROJECTS_COUNTERS_VERSION_KEY = "projects_counters_version"
+
+# The context counter of every project state
+PROJECTS_STATES_COUNTERS = {
+    "draft": "draft_projects_count",
+    "in-progress": "active_projects_count",
+    "completed": "completed_projects_count",
+    "archived": "archived_projects_count",
+}
+
+
+def invalidate_projects_counters():
+    """Invalidate the cached projects counters when the current transaction is committed"""
+    _schedule_cache_versions_bump([PROJECTS_COUNTERS_VERSION_KEY])
+
+
+def get_projects_states_counts(project_filter, scope: str) -> dict:
+    """Count the filtered projects of each state in one grouped query.
+
+    The state filter is not applied so that the list tabs show the count of every state.
+    The counts are cached per scope (ex: `cluster:1`) and filter parameters.
+    """
+    params = normalize_filter_params(project_filter.data, [name for name in project_filter.filters if name != "state"])
+    version = cache.get(PROJECTS_COUNTERS_VERSION_KEY, 0)
+    params_hash = hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    key = f"projects_counters:{scope}:{version}:{params_hash}"
+
+    states_counts = cache.get(key)
+    if states_counts is None:
+        queryset = project_filter.queryset
+        if project_filter.is_valid():
+            for name, value in project_filter.form.cleaned_data.items():
+                if name != "state":
+                    queryset = project_filter.filters[name].filter(queryset, value)
+
+        states_counts = {
+            row["state"]: row["count"]
+            for row in queryset.order_by().values("state").annotate(count=Count("id", distinct=True))
+        }
+        cache.set(key, states_counts, timeout=PROJECTS_COUNTERS_CACHE_TIMEOUT)
+
+    return states_counts
+
+
+def paginate_projects(request, project_filter, scope: str):
+    """Paginate the filtered projects and count them by state.
+
+    The total of the paginator is taken from the states counts, so a page load only runs
+    the grouped count query (or none when cached) and the page query.
+    Returns the page and the projects counters.
+    """
+    states_counts = get_projects_states_counts(project_filter, scope)
+
+    counters = {counter: states_counts.get(state, 0) for state, counter in PROJECTS_STATES_COUNTERS.items()}
+    counters["projects_count"] = sum(states_counts.values())
+
+    state = project_filter.form.cleaned_data.get("state") if project_filter.is_valid() else None
+    count = states_counts.get(state, 0) if state else counters["projects_count"]
+
+    p_projects = paginate(request, project_filter.qs, count=count)
+
+    return p_projects, counters
+
+
+# ##############################################
+# ########## Organizations Home Stats ##########
+# ##############################################
+
+# Organizations and projects changed in the current transaction, with whether their target locations changed
+_stale = {"organizations": {}, "projects": {}}
+
+
+def refresh_organization_stats(organization_ids):
+    """Recompute the home page counters of the in-progress projects of the organizations.
+
+    Each counter is computed for all the organizations in one grouped query and the rows are upserted.
+    """
+    organization_ids = {pk for pk in organization_ids if pk}
+    if not organization_ids:
+        return
+    # The organizations deleted, or created in a rolled back transaction, since they were scheduled
+    organization_ids = set(Organization.objects.filter(pk__in=organization_ids).values_list("pk", flat=True))
+
+    projects = {"project__state": "in-progress", "project__organization_id__in": organization_ids}
+    counters = {
+        "active_projects_count": Project.objects.filter(state="in-progress", organization_id__in=organization_ids)
+        .values_list("organization_id")
+        .annotate(count=Count("id")),
+        "implementing_partners_count": Project.implementing_partners.through.objects.filter(**projects)
+        .values_list("project__organization_id")
+        .annotate(count=Count("organization_id", distinct=True)),
+        "activity_plans_count": ActivityPlan.objects.filter(**projects)
+        .values_list("project__organization_id")
+        .annotate(count=Count("id")),
+        "target_locations_count": TargetLocation.objects.filter(district__isnull=False, **projects)
+        .values_list("project__organization_id")
+        .annotate(count=Count("district_id", distinct=True)),
+        "pending_reports_count": ProjectMonthlyReport.objects.filter(state="pending", **projects)
+        .values_list("project__organization_id")
+        .annotate(count=Count("id")),
+    }
+
+    stats = {pk: OrganizationStats(organization_id=pk) for pk in organization_ids}
+    for counter, queryset in counters.items():
+        for organization_id, count in queryset.order_by():
+            setattr(stats[organization_id], counter, count)
+
+    OrganizationStats.objects.bulk_create(
+        stats.values(),
+        update_conflicts=True,
+        unique_fields=["organization"],
+        update_fields=[*counters, "updated_at"],
+    )
+
+
+def refresh_organization_locations_map(organization_ids) -> dict:
+    """Serialize the home page map payload of the organizations and return their `{id: (payload, etag)}`.
+
+    The target locations of the in-progress projects are grouped by district, in one compact JSON document:
+    `{"projects": {id: code}, "districts": [[id, name, code, province, lat, long, [[location id, project id,
+    facility name], ...]], ...]}`. The organizations must have their stats row.
+    """
+    organization_ids = {pk for pk in organization_ids if pk}
+    if not organization_ids:
+        return {}
+
+    maps = {pk: {"projects": {}, "districts": {}} for pk in organization_ids}
+    target_locations = (
+        TargetLocation.objects.filter(
+            project__organization_id__in=organization_ids, project__state="in-progress", district__isnull=False
+        )
+        .order_by("province__name", "district__name", "pk")
+        .values_list(
+            "project__organization_id",
+            "pk",
+            "project_id",
+            "project__code",
+            "facility_name",
+            "district_id",
+            "district__name",
+            "district__code",
+            "province__name",
+            "district__lat",
+            "district__long",
+        )
+    )
+    for organization_id, pk, project_id, project_code, facility_name, district_id, *district in target_locations:
+        locations_map = maps[organization_id]
+        locations_map["projects"][project_id] = project_code
+        if district_id not in locations_map["districts"]:
+            locations_map["districts"][district_id] = [district_id, *district, []]
+        locations_map["districts"][district_id][-1].append([pk, project_id, facility_name])
+
+    payloads = {}
+    for organization_id, locations_map in maps.items():
+        payload = json.dumps(
+            {"projects": locations_map["projects"], "districts": list(locations_map["districts"].values())},
+            separators=(",", ":"),
+        )
+        payloads[organization_id] = (payload, hashlib.md5(payload.encode()).hexdigest())
+
+    OrganizationStats.objects.bulk_create(
+        [
+            OrganizationStats(organization_id=pk, locations_map=payload, locations_map_etag=etag)
+            for pk, (payload, etag) in payloads.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["organization"],
+        update_fields=["locations_map", "locations_map_etag"],
+    )
+    return payloads
+
+
+def get_organization_locations_map(organization_id: int):
+    """Return the serialized home page map payload of an organization and its ETag, or None when the
+    organization does not exist. The payload is built on the first access.
+    """
+    stats = (
+        OrganizationStats.objects.filter(organization_id=organization_id)
+        .values_list("locations_map", "locations_map_etag")
+        .first()
+    )
+    if stats is not None and stats[0] is not None:
+        return stats
+
+    if stats is None:
+        refresh_organization_stats([organization_id])
+        if not OrganizationStats.objects.filter(organization_id=organization_id).exists():
+            return None
+    return refresh_organization_locations_map([organization_id])[organization_id]
+
+
+def _refresh_stale_organization_stats():
+    # {organization id: whether its target locations changed}
+    organizations = dict(_stale["organizations"])
+    if _stale["projects"]:
+        for project_id, organization_id in Project.objects.filter(pk__in=_stale["projects"]).values_list(
+            "pk", "organization_id"
+        ):
+            organizations[organization_id] = organizations.get(organization_id) or _stale["projects"][project_id]
+    _stale["organizations"].clear()
+    _stale["projects"].clear()
+
+    refresh_organization_stats(organizations)
+    refresh_organization_locations_map(
+        Organization.objects.filter(pk__in=[pk for pk, locations in organizations.items() if locations]).values_list(
+            "pk", flat=True
+        )
+    )
+
+
+def schedule_organization_stats_refresh(organization_ids=(), project_ids=(), locations=False):
+    """Refresh the counters of the organizations, or of the projects organizations, once the current
+    transaction is committed. The organizations changed several times in a transaction are refreshed once.
+    Their map payload is serialized again when `locations` is set.
+    """
+    for key, pks in [("organizations", organization_ids), ("projects", project_ids)]:
+        for pk in pks:
+            if pk:
+                _stale[key][pk] = _stale[key].get(pk, False) or locations
+    # The first callback refreshes all the stale organizations, the next ones have nothing left to do
+    transaction.on_commit(_refresh_stale_organization_stats)
+
+
+def get_organization_stats(organization) -> OrganizationStats:
+    """Return the home page counters of an organization, computed on the first access"""
+    stats = OrganizationStats.objects.defer("locations_map").filter(organization=organization).first()
+    if stats is None:
+        refresh_organization_stats([organization.pk])
+        stats = OrganizationStats.objects.defer("locations_map").get(organization=organization)
+    return stats
+
+
+# ##############################################
+# ############### Projects Export ##############
+# ##############################################
+
+PROJECTS_EXPORT_STATES = ["in-progress", "completed", "archived"]
+
+PROJECTS_EXPORT_COLUMNS = [
+    {"header": "Project Title", "type": "string", "width": 40},
+    {"header": "Code", "type": "string", "width": 20},
+    {"header": "Focal Person", "type": "string", "width": 20},
+    {"header": "Email", "type": "string", "width": 25},
+    {"header": "Organization", "type": "string", "width": 40},
+    {"header": "Organization Type", "type": "string", "width": 40},
+    {"header": "Status", "type": "string", "width": 10},
+    {"header": "Cluster", "type": "string", "width": 50},
+    {"header": "HRP project", "type": "string", "width": 50},
+    {"header": "Project HRP Code", "type": "string", "width": 20},
+    {"header": "Project Start Date", "type": "date", "width": 20},
+    {"header": "Project End Date", "type": "date", "width": 30},
+    {"header": "Project Budget", "type": "float", "width": 20},
+    {"header": "Budget Received", "type": "float", "width": 20},
+    {"header": "Budget Gap", "type": "float", "width": 20},
+    {"header": "Project Budget Currency", "type": "string", "width": 20},
+    {"header": "Project Donors", "type": "string", "width": 30},
+    {"header": "Implementing Partners", "type": "string", "width": 30},
+    {"header": "Programme Partners", "type": "string", "width": 30},
+    {"header": "Activity Domain", "type": "string", "width": 50},
+    {"header": "Description & Objective", "type": "string", "width": 50},
+]
+
+
+def get_projects_export_queryset(user: User, selected_projects_id: list = None, query_params: QueryDict = None):
+    """Returns the projects the user can export, or None if the user is not allowed to export projects"""
+    project_queryset = Project.objects.select_related("organization", "budget_currency", "user__profile__organization")
+    project_queryset = project_queryset.prefetch_related(
+        "implementing_partners", "programme_partners", "donors", "clusters", "activity_domains"
+    )
+
+    # check the user permission
+    if not (
+        user.has_perm("rh.view_cluster_projects")
+        or user.has_perm("rh.add_organization")
+        or user.has_perm("rh.view_org_projects")
+        or user.has_perm("rh.add_project")
+        or user.has_perm("users.view_org_users")
+    ):
+        return None
+
+    projects = project_queryset.filter(organization=user.profile.organization)
+
+    if selected_projects_id:
+        projects = projects.filter(id__in=selected_projects_id)
+
+    # filter integration
+    if query_params:
+        projects = ProjectsFilter(query_params, queryset=projects).qs
+
+    return projects.filter(state__in=PROJECTS_EXPORT_STATES)
+
+
+def get_projects_export_rows(projects):
+    """Yields the export row of every project"""
+    for project in projects:
+        yield [
+            project.title,
+            project.code,
+            project.user.username if project.user else None,
+            project.user.email if project.user else None,
+            project.user.profile.organization.code
+            if project.user and project.user.profile and project.user.profile.organization
+            else None,
+            project.user.profile.organization.type
+            if project.user and project.user.profile and project.user.profile.organization
+            else None,
+            project.state,
+            ", ".join([clusters.code for clusters in project.clusters.all()]),
+            "yes" if project.is_hrp_project == 1 else None,
+            project.hrp_code if project.hrp_code else None,
+            project.start_date.astimezone(dt_timezone.utc).replace(tzinfo=None),
+            project.end_date.astimezone(dt_timezone.utc).replace(tzinfo=None),
+            project.budget if project.budget else None,
+            project.budget_received if project.budget_received else None,
+            project.budget_gap if project.budget_gap else None,
+            project.budget_currency.name if project.budget_currency else None,
+            ", ".join([donor.name for donor in project.donors.all()]) if project.donors else None,
+            ", ".join([implementing_partner.code for implementing_partner in project.implementing_partners.all()])
+            if project.implementing_partners
+            else None,
+            ", ".join([programme_partner.code for programme_partner in project.programme_partners.all()])
+            if project.programme_partners
+            else None,
+            ", ".join([activity_domain.name for activity_domain in project.activity_domains.all()])
+            if project.activity_domains
+            else None,
+            project.description if project.description else None,
+        ]
+
+
+def write_projects_export_sheet(workbook, projects, progress=None):
+    """Write the projects export sheet, `progress(done, total)` is called while writing the rows"""
+    total = projects.count()
+    write_sheet(
+        workbook,
+        "Project",
+        PROJECTS_EXPORT_COLUMNS,
+        get_projects_export_rows(projects.iterator(chunk_size=EXPORT_JOB_CHUNK_SIZE)),
+        progress=(lambda done: progress(done, total)) if progress else None,
+    )
+
+
+# ##############################################
+# ################# Export Jobs ################
+# ##############################################
+
+EXPORT_JOB_CHUNK_SIZE = 500
+
+
+def export_projects_job(job: ExportJob, file, progress):
+    projects = get_projects_export_queryset(
+        job.user,
+        selected_projects_id=job.params.get("selected_projects_id"),
+        query_params=QueryDict(job.params.get("query_string", "")),
+    )
+    if projects is None:
+        raise PermissionDenied("Permission Denied !")
+
+    workbook = create_workbook()
+    write_projects_export_sheet(workbook, projects, progress=progress)
+    workbook.save(file)
+
+    return f"{job.user.profile.organization}_projects_extracted_on_{job.created_at.date()}.xlsx"
+
+
+# The function generating the file of every export type
+EXPORT_JOB_HANDLERS = {
+    "projects": export_projects_job,
+}
+
+
+def enqueue_export_job(user: User, export_type: str, params: dict, format: str = "xlsx") -> ExportJob:
+    """Queue an export to be generated by the `run_export_jobs` worker"""
+    return ExportJob.objects.create(user=user, export_type=export_type, params=params, format=format)
+
+
+def claim_export_job():
+    """Mark the oldest queued export job as running and return it, or None if no job is queued.
+    The state is updated conditionally so that several workers never run the same job.
+    """
+    queued_jobs = ExportJob.objects.filter(state="queued").order_by("created_at", "pk")
+    for job_id in queued_jobs.values_list("pk", flat=True)[:10]:
+        if ExportJob.objects.filter(pk=job_id, state="queued").update(state="running", started_at=timezone.now()):
+            return ExportJob.objects.select_related("user__profile__organization").get(pk=job_id)
+    return None
+
+
+def run_export_job(job: ExportJob):
+    """Generate the file of a running export job and store it in MEDIA_ROOT"""
+
+    def progress(done, total):
+        if total:
+            ExportJob.objects.filter(pk=job.pk).update(progress=min(99, int(done * 100 / total)))
+
+    try:
+        with tempfile.TemporaryFile() as file:
+            file_name = EXPORT_JOB_HANDLERS[job.export_type](job, file, progress)
+            file.seek(0)
+            job.file.save(f"{job.export_type}_{job.pk}.{job.format}", File(file), save=False)
+
+        job.file_name = file_name
+        job.state = "completed"
+        job.progress = 100
+    except Exception as e:
+        logger.exception("Export job %s failed", job.pk)
+        job.state = "failed"
+        job.error = str(e)
+
+    job.finished_at = timezone.now()
+    job.save()
+    return job
@@ -8,7 +8,8 @@ from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.views.decorators.http import require_http_methods, require_POST
 from django_htmx.http import HttpResponseClientRedirect
-from extra_settings.models import Setting
+
+from core.settings_snapshot import get_setting
 
 from ..filters import ActivityPlansFilter
 from ..forms import (
@@ -23,9 +24,8 @@ from ..models import (
     Indicator,
     Project,
     TargetLocation,
-    TransferMechanismType,
-    UnitType,
 )
+from ..reference_data import get_reference_index, get_reference_object_or_404
 
 
 @require_http_methods(["POST"])
@@ -234,7 +234,7 @@ def list_activity_plans(request, project):
         project=project,
     )
 
-    RECORDS_PER_PAGE = Setting.get("RECORDS_PER_PAGE", default=10)
+    RECORDS_PER_PAGE = get_setting("RECORDS_PER_PAGE", default=10)
 
     per_page = request.GET.get("per_page", RECORDS_PER_PAGE)
     paginator = Paginator(ap_filter.qs, per_page=per_page)  # Show 10 activity plans per page
@@ -262,8 +262,10 @@ def update_indicator_type(request):
 def get_transfer_mechanism_types(request):
     """Get transfer mechanism types"""
     implement_type_id = request.GET.get("implement_modality_type")
-    implement_types = get_object_or_404(ImplementationModalityType, pk=implement_type_id)
-    transfer_mechanism = TransferMechanismType.objects.filter(modality=implement_types)
+    implement_types = get_reference_object_or_404("implementation_modality_types", implement_type_id)
+    transfer_mechanism = get_reference_index("transfer_mechanism_types", "modality_id", unique=False).get(
+        implement_types.pk, []
+    )
 
     return render(request, "rh/projects/views/_indicator_types.html", {"options": transfer_mechanism})
 
@@ -271,7 +273,7 @@ def get_transfer_mechanism_types(request):
 def get_unit_types(request):
     """Get unit types"""
     transfer_mechanism_id = request.GET.get("transfer_mechanism_type")
-    transfer_mechanism = get_object_or_404(TransferMechanismType, pk=transfer_mechanism_id)
-    unit_types = UnitType.objects.filter(modality=transfer_mechanism.modality)
+    transfer_mechanism = get_reference_object_or_404("transfer_mechanism_types", transfer_mechanism_id)
+    unit_types = get_reference_index("unit_types", "modality_id", unique=False).get(transfer_mechanism.modality_id, [])
 
     return render(request, "rh/projects/views/_indicator_types.html", {"options": unit_types})
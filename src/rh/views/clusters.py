@@ -2,8 +2,8 @@ from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
 from django.db.models import Count
 from django.shortcuts import get_object_or_404, render
-from extra_settings.models import Setting
 
+from core.settings_snapshot import get_setting
 from project_reports.filters import MonthlyReportsFilter
 from project_reports.models import ProjectMonthlyReport
 
@@ -30,7 +30,7 @@ def pending_reports(request, cluster: str):
     )
 
     # Setup Pagination
-    RECORDS_PER_PAGE = Setting.get("RECORDS_PER_PAGE", default=10)
+    RECORDS_PER_PAGE = get_setting("RECORDS_PER_PAGE", default=10)
     per_page = request.GET.get("per_page", RECORDS_PER_PAGE)
     p = Paginator(reports_filter.qs, per_page=per_page)
     page = request.GET.get("page", 1)
@@ -1,222 +1,93 @@
-import base64
 import csv
 import datetime
 import json
-from io import BytesIO
 
-from django.db.models import Prefetch
-from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404
-from openpyxl import Workbook
-from openpyxl.styles import Font, NamedStyle
-from openpyxl.utils import get_column_letter
+from django.urls import reverse
 
-from rh.utils import DateTimeEncoder
+from core.xlsx import XLSX_CONTENT_TYPE, create_workbook, write_sheet
+from rh.utils import (
+    PROJECTS_EXPORT_COLUMNS,
+    DateTimeEncoder,
+    enqueue_export_job,
+    get_projects_export_queryset,
+    get_projects_export_rows,
+)
 
-from ..filters import ProjectsFilter
-from ..models import ActivityPlan, Disaggregation, DisaggregationLocation, Project, TargetLocation
+from ..models import Disaggregation, ExportJob, Project
 
 #############################################
 ############### Export Views #################
 #############################################
 
-# Define the header style
-header_style = NamedStyle(name="header")
-header_style.font = Font(bold=True)
-
 
 def project_export_excel_view(request, format):
     selected_projects_id = json.loads(request.body)
-    user = request.user
-    user_org = user.profile.organization
-    project_state = ["in-progress", "completed", "archived"]
-    project_queryset = Project.objects.select_related("organization", "budget_currency", "user").prefetch_related(
-        "implementing_partners",
-        "programme_partners",
-        "donors",
-        "clusters",
-        Prefetch(
-            "activityplan_set",
-            queryset=ActivityPlan.objects.prefetch_related(
-                Prefetch(
-                    "targetlocation_set",
-                    queryset=TargetLocation.objects.prefetch_related(
-                        Prefetch(
-                            "disaggregationlocation_set",
-                            queryset=DisaggregationLocation.objects.select_related("disaggregation"),
-                        )
-                    ),
-                )
-            ),
-        ),
-    )
-
-    # check the user permission
-    if user.has_perm("rh.view_cluster_projects") or user.has_perm("rh.add_organization"):
-        projects = project_queryset.filter(organization=user_org)
-    elif (
-        user.has_perm("rh.view_org_projects")
-        or user.has_perm("rh.add_project")
-        or user.has_perm("users.view_org_users")
-    ):
-        projects = project_queryset.filter(organization=user_org)
-    else:
+    projects = get_projects_export_queryset(request.user, selected_projects_id, request.GET)
+    if projects is None:
         return HttpResponseForbidden("Permission Denied !")
 
-    if selected_projects_id:
-        projects = projects.filter(id__in=selected_projects_id)
-
-    # filter integration
-    if request.GET:
-        project_filter = ProjectsFilter(request.GET, request=request, queryset=projects)
-        if project_filter.qs.exists():
-            projects = project_filter.qs
-        else:
-            projects = project_filter.qs
-    projects = projects.filter(state__in=project_state)
-
     try:
-        # selectedData = json.loads(request.POST.get("exportData"))
-
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = "Project"
-
-        # form the filename with today date
-        today_date = datetime.date.today()
-        # define CSV file
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = "attachment; filename='project.csv'"
-        writer = csv.writer(response)
-
-        # defining columns
-        columns = [
-            {"header": "Project Title", "type": "string", "width": 40},
-            {"header": "Code", "type": "string", "width": 20},
-            {"header": "Focal Person", "type": "string", "width": 20},
-            {"header": "Email", "type": "string", "width": 25},
-            {"header": "Organization", "type": "string", "width": 40},
-            {"header": "Organization Type", "type": "string", "width": 40},
-            {"header": "Status", "type": "string", "width": 10},
-            {"header": "Cluster", "type": "string", "width": 50},
-            {"header": "HRP project", "type": "string", "width": 50},
-            {"header": "Project HRP Code", "type": "string", "width": 20},
-            {"header": "Project Start Date", "type": "date", "width": 20},
-            {"header": "Project End Date", "type": "date", "width": 30},
-            {"header": "Project Budget", "type": "float", "width": 20},
-            {"header": "Budget Received", "type": "float", "width": 20},
-            {"header": "Budget Gap", "type": "float", "width": 20},
-            {"header": "Project Budget Currency", "type": "string", "width": 20},
-            {"header": "Project Donors", "type": "string", "width": 30},
-            {"header": "Implementing Partners", "type": "string", "width": 30},
-            {"header": "Programme Partners", "type": "string", "width": 30},
-            {"header": "Activity Domain", "type": "string", "width": 50},
-            {"header": "Description & Objective", "type": "string", "width": 50},
-        ]
-        for idx, column in enumerate(columns, start=1):
-            cell = sheet.cell(row=1, column=idx, value=column["header"])
-            cell.style = header_style
-
-            column_letter = get_column_letter(idx)
-            if column["type"] == "number":
-                sheet.column_dimensions[column_letter].number_format = "General"
-            elif column["type"] == "date":
-                sheet.column_dimensions[column_letter].number_format = "mm-dd-yyyy"
-
-            sheet.column_dimensions[column_letter].width = column["width"]
+        # Excel files are generated in the background by the export jobs worker
+        if format == "xls":
+            job = enqueue_export_job(
+                request.user,
+                "projects",
+                params={"selected_projects_id": selected_projects_id, "query_string": request.GET.urlencode()},
+            )
+            return JsonResponse(get_export_job_status(job), status=202)
 
-        # defining the csv header file
+        rows = get_projects_export_rows(projects)
         if format == "csv":
-            header_list = []
-            for item in columns:
-                header_list.append(item["header"])
-            writer.writerow(header_list)
-
-        # defining rows
-        rows = []
-        for project in projects:
-            row = [
-                project.title,
-                project.code,
-                project.user.username if project.user else None,
-                project.user.email if project.user else None,
-                project.user.profile.organization.code
-                if project.user and project.user.profile and project.user.profile.organization
-                else None,
-                project.user.profile.organization.type
-                if project.user and project.user.profile and project.user.profile.organization
-                else None,
-                project.state,
-                ", ".join([clusters.code for clusters in project.clusters.all()]),
-                "yes" if project.is_hrp_project == 1 else None,
-                project.hrp_code if project.hrp_code else None,
-                project.start_date.astimezone(datetime.timezone.utc).replace(tzinfo=None),
-                project.end_date.astimezone(datetime.timezone.utc).replace(tzinfo=None),
-                project.budget if project.budget else None,
-                project.budget_received if project.budget_received else None,
-                project.budget_gap if project.budget_gap else None,
-                project.budget_currency.name if project.budget_currency else None,
-                ", ".join([donor.name for donor in project.donors.all()]) if project.donors else None,
-                ", ".join([implementing_partner.code for implementing_partner in project.implementing_partners.all()])
-                if project.implementing_partners
-                else None,
-                ", ".join([programme_partner.code for programme_partner in project.programme_partners.all()])
-                if project.programme_partners
-                else None,
-                ", ".join([activity_domain.name for activity_domain in project.activity_domains.all()])
-                if project.activity_domains
-                else None,
-                project.description if project.description else None,
-            ]
-
-            # Add row to the list of rows
-            rows.append(row)
-
-            # write row for CSV file
-            writer.writerow(row)
-
-        for row_idx, row in enumerate(rows, start=2):
-            for col_idx, value in enumerate(row, start=1):
-                try:
-                    sheet.cell(row=row_idx, column=col_idx, value=value)
-                except Exception as e:
-                    print("Error:", e)
-
-        sheet.freeze_panes = sheet["A2"]
-        excel_file = BytesIO()
-        workbook.save(excel_file)
-        excel_file.seek(0)
-        # form the filename with today date
-        today_date = datetime.date.today()
-        # check the requested format
-        if format == "xls":
-            response = {
-                "file_url": "data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,"
-                + base64.b64encode(excel_file.read()).decode("utf-8"),
-                "file_name": f"{request.user.profile.organization}_projects_extracted_on_{today_date}.xlsx",
-            }
-            return JsonResponse(response)
-        elif format == "csv":
+            response = HttpResponse(content_type="text/csv")
+            response["Content-Disposition"] = "attachment; filename='project.csv'"
+            writer = csv.writer(response)
+            writer.writerow([column["header"] for column in PROJECTS_EXPORT_COLUMNS])
+            writer.writerows(rows)
             return response
         elif format == "json":
             # serialize the none serialze data and create dump data
-            json_data = json.dumps(rows, cls=DateTimeEncoder, indent=4)
+            json_data = json.dumps(list(rows), cls=DateTimeEncoder, indent=4)
 
             response = HttpResponse(json_data, content_type="application/json")
             response["Content-Disposition"] = 'attachment; filename="projects.json"'
             return response
 
+        response = {"error": f"Unsupported format {format}"}
     except Exception as e:
         response = {"error": str(e)}
     return JsonResponse(response, status=500)
 
 
+def get_export_job_status(job: ExportJob) -> dict:
+    return {
+        "id": job.pk,
+        "state": job.state,
+        "progress": job.progress,
+        "status_url": reverse("export-job-status", args=[job.pk]),
+        "file_url": reverse("export-job-download", args=[job.pk]) if job.state == "completed" else None,
+        "file_name": job.file_name,
+        "error": job.error,
+    }
+
+
+@login_required
+def export_job_status(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+    return JsonResponse(get_export_job_status(job))
+
+
+@login_required
+def export_job_download(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user, state="completed")
+    return FileResponse(job.file.open("rb"), as_attachment=True, filename=job.file_name)
+
+
 def single_project_export(request, pk, format):
     project = get_object_or_404(Project, pk=pk)
     try:
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = "Project"
         # get today's date for filename
         today_date = datetime.date.today()
         # set response object for csv
@@ -297,18 +168,6 @@ def single_project_export(request, pk, format):
             for disaggregation_col in disaggregation_cols:
                 columns.append(disaggregation_col)
 
-        for idx, column in enumerate(columns, start=1):
-            cell = sheet.cell(row=1, column=idx, value=column["header"])
-            cell.style = header_style
-
-            column_letter = get_column_letter(idx)
-            if column["type"] == "number":
-                sheet.column_dimensions[column_letter].number_format = "General"
-            elif column["type"] == "date":
-                sheet.column_dimensions[column_letter].number_format = "mm-dd-yyyy"
-
-            sheet.column_dimensions[column_letter].width = column["width"]
-
         # defining the csv header file
         if format == "csv":
             header_list = []
@@ -430,25 +289,14 @@ def single_project_export(request, pk, format):
                 # write row for CSV file
                 writer.writerow(row)
 
-        for row_idx, row in enumerate(rows, start=2):
-            for col_idx, value in enumerate(row, start=1):
-                try:
-                    sheet.cell(row=row_idx, column=col_idx, value=value)
-                except Exception as e:
-                    print("Error:", e)
-
-        sheet.freeze_panes = sheet["A2"]
-        excel_file = BytesIO()
-        workbook.save(excel_file)
-        excel_file.seek(0)
-        # form the filename with today date
-        today_date = datetime.date.today()
         # check the requested format
         if format == "xlsx":
-            response = HttpResponse(
-                excel_file, content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            workbook = create_workbook()
+            write_sheet(workbook, "Project", columns, rows)
+
+            response = HttpResponse(content_type=XLSX_CONTENT_TYPE)
             response["Content-Disposition"] = f'attachment; filename="project_extracted_on_{today_date}.xlsx"'
+            workbook.save(response)
             return response
         elif format == "json":
             # serialize the none serialze data and create dump data
@@ -1,11 +1,14 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
-from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404, render
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
 
-from rh.models import Organization, TargetLocation
+from rh.models import Organization
+from rh.utils import get_organization_locations_map
+from users.authorization import get_auth_context
 from users.utils import is_cluster_lead
 
 from ..forms import (
@@ -40,7 +43,7 @@ def search(request):
 def show(request, code):
     org = get_object_or_404(Organization, code=code)
 
-    if not org.code == request.user.profile.organization.code and not is_cluster_lead(
+    if not org.pk == get_auth_context(request.user).organization_id and not is_cluster_lead(
         request.user, org.clusters.values_list("code", flat=True)
     ):
         raise PermissionDenied
@@ -61,54 +64,28 @@ def show(request, code):
 
 @login_required
 def target_locations(request, org_pk):
-    target_locations = cache.get(f"{org_pk}-target_locations")
-
-    if not target_locations:
-        target_locations = (
-            TargetLocation.objects.select_related("project", "district", "province")
-            .filter(project__organization_id=org_pk, project__state="in-progress")
-            .order_by("province__name")
-        )
-        cache.set(f"{org_pk}-target_locations", target_locations, timeout=86400)  # Set timeout to 1 day (86400 seconds)
-
-    districts_grouped = {}
-
-    for target_location in target_locations:
-        if target_location.district is None:
-            continue
-
-        district_id = target_location.district.id
-        district_name = target_location.district.name
-
-        if district_id not in districts_grouped:
-            districts_grouped[district_id] = {
-                "district_name": district_name,
-                "district_id": district_id,
-                "province_name": target_location.province.name,
-                "district_code": target_location.district.code,
-                "district_lat": target_location.district.lat,
-                "district_long": target_location.district.long,
-                "location_count": 0,
-                "target_locations": [],
-            }
-
-        districts_grouped[district_id]["target_locations"].append(
-            {
-                "id": target_location.id,
-                "project_code": target_location.project.code,
-                "project_id": target_location.project.id,
-                "state": target_location.state,
-                "facility_name": target_location.facility_name,
-            }
-        )
-
-        # Increment the location count
-        districts_grouped[district_id]["location_count"] += 1
-
-    # Convert the dictionary back to a list of dictionaries as per the desired output format
-    districts_grouped_list = list(districts_grouped.values())
-
-    return JsonResponse({"locations": districts_grouped_list})
+    """
+    District grouped target locations of the organization home page map, see `refresh_organization_locations_map`
+    for the payload format. The payload is serialized when the organization locations change.
+    Route: /organizations/<org_pk>/target-locations
+    """
+    locations_map = get_organization_locations_map(org_pk)
+    if locations_map is None:
+        raise Http404
+
+    payload, etag = locations_map
+    etag = quote_etag(etag)
+
+    # The browser revalidates the payload it has with the ETag
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in parse_etags(if_none_match)):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(payload, content_type="application/json")
+    response.headers["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+
+    return response
 
 
 # Registration Organizations
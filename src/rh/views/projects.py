@@ -1,12 +1,10 @@
 import csv
 import random
-from copy import copy
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.models import User
 from django.core.exceptions import PermissionDenied, ValidationError
-from django.core.paginator import Paginator
 from django.db import transaction
 from django.db.models import Count, Prefetch, Q
 from django.http import HttpResponse
@@ -16,8 +14,9 @@ from django.utils.safestring import mark_safe
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_http_methods
 from django_htmx.http import HttpResponseClientRedirect
-from extra_settings.models import Setting
 
+from core.clone import bulk_clone
+from core.pagination import paginate
 from project_reports.models import ProjectMonthlyReport
 from users.views.users import UsersFilter
 
@@ -30,20 +29,12 @@ from ..models import (
     Cluster,
     Disaggregation,
     DisaggregationLocation,
-    GrantType,
-    ImplementationModalityType,
-    Location,
     Organization,
-    PackageType,
     Project,
-    RationSize,
-    RationType,
     TargetLocation,
-    TransferCategory,
-    TransferMechanismType,
-    UnitType,
 )
-from ..utils import has_permission
+from ..reference_data import get_activity_domain_types, get_activity_type_indicators, get_reference_index
+from ..utils import has_permission, paginate_projects, schedule_organization_stats_refresh
 
 IMPORT_ERRORS = {
     "no_file": "No file provided for import.",
@@ -58,17 +49,19 @@ def _preload_project_data(project):
     return {
         "activity_domains": {ad.name: ad for ad in project.activity_domains.all()},
         "beneficiaries": {b.name: b for b in BeneficiaryType.objects.all()},
-        "package_types": {pt.name: pt for pt in PackageType.objects.all()},
-        "unit_types": {ut.name: ut for ut in UnitType.objects.all()},
-        "ration_types": {rt.name: rt for rt in RationType.objects.all()},
-        "ration_sizes": {rs.name: rs for rs in RationSize.objects.all()},
-        "grant_types": {gt.name: gt for gt in GrantType.objects.all()},
-        "transfer_categories": {tc.name: tc for tc in TransferCategory.objects.all()},
-        "transfer_mechanisms": {tm.name: tm for tm in TransferMechanismType.objects.all()},
-        "implementation_modalities": {im.name: im for im in ImplementationModalityType.objects.all()},
-        "locations": {loc.code: loc for loc in Location.objects.select_related("parent")},
+        "package_types": get_reference_index("package_types", "name"),
+        "unit_types": get_reference_index("unit_types", "name"),
+        "ration_types": get_reference_index("ration_types", "name"),
+        "ration_sizes": get_reference_index("ration_sizes", "name"),
+        "grant_types": get_reference_index("grant_types", "name"),
+        "transfer_categories": get_reference_index("transfer_categories", "name"),
+        "transfer_mechanisms": get_reference_index("transfer_mechanism_types", "name"),
+        "implementation_modalities": get_reference_index("implementation_modality_types", "name"),
+        "locations": get_reference_index("locations", "code"),
+        # Index of the locations by their parent, level and code to validate the locations hierarchy
+        "locations_index": get_reference_index("locations", "parent_id", "level", "code"),
         "organizations": {org.code: org for org in Organization.objects.all()},
-        "disaggregations": {d.name: d for d in Disaggregation.objects.all()},
+        "disaggregations": get_reference_index("disaggregations", "name"),
     }
 
 
@@ -78,7 +71,14 @@ def _validate_activity_data(row, project_data, project, errors, line_num):
         errors.append(IMPORT_ERRORS["activity_domain_missing"].format(line=line_num, value=row["activity_domain"]))
         return None, None, None
 
-    activity_type = activity_domain.activitytype_set.filter(name=row["activity_type"]).first()
+    activity_type = next(
+        (
+            activity_type
+            for activity_type in get_activity_domain_types(activity_domain.pk, active_only=False)
+            if activity_type.name == row["activity_type"]
+        ),
+        None,
+    )
     if not activity_type:
         errors.append(
             IMPORT_ERRORS["activity_type_missing"].format(
@@ -87,7 +87,14 @@ def _validate_activity_data(row, project_data, project, errors, line_num):
         )
         return None, None, None
 
-    indicator = activity_type.indicator_set.filter(name=row["indicator"]).first()
+    indicator = next(
+        (
+            indicator
+            for indicator in get_activity_type_indicators(activity_type.pk, active_only=False)
+            if indicator.name == row["indicator"]
+        ),
+        None,
+    )
     if not indicator:
         errors.append(
             IMPORT_ERRORS["indicator_missing"].format(line=line_num, type=activity_type.name, value=row["indicator"])
@@ -97,6 +104,11 @@ def _validate_activity_data(row, project_data, project, errors, line_num):
     return activity_domain, activity_type, indicator
 
 
+def _get_child_location(project_data, parent, level, code):
+    parent_id = parent.pk if parent else None
+    return project_data["locations_index"].get((parent_id, level, code))
+
+
 def _validate_location_hierarchy(row, project_data, errors, line_num):
     country = project_data["locations"].get(row["admin0pcode"])
     if not country or country.level != 0:
@@ -105,14 +117,7 @@ def _validate_location_hierarchy(row, project_data, errors, line_num):
 
     province = None
     if row.get("admin1pcode"):
-        province = next(
-            (
-                loc
-                for loc in project_data["locations"].values()
-                if loc.parent == country and loc.code == row["admin1pcode"] and loc.level == 1
-            ),
-            None,
-        )
+        province = _get_child_location(project_data, country, 1, row["admin1pcode"])
         if not province:
             errors.append(
                 IMPORT_ERRORS["location_missing"].format(line=line_num, level="Province", code=row["admin1pcode"])
@@ -121,14 +126,7 @@ def _validate_location_hierarchy(row, project_data, errors, line_num):
 
     district = None
     if row.get("admin2pcode"):
-        district = next(
-            (
-                loc
-                for loc in project_data["locations"].values()
-                if loc.parent == province and loc.code == row["admin2pcode"] and loc.level == 2
-            ),
-            None,
-        )
+        district = _get_child_location(project_data, province, 2, row["admin2pcode"])
         if not district:
             errors.append(
                 IMPORT_ERRORS["location_missing"].format(line=line_num, level="District", code=row["admin2pcode"])
@@ -137,14 +135,7 @@ def _validate_location_hierarchy(row, project_data, errors, line_num):
 
     zone = None
     if row.get("admin3pcode"):
-        zone = next(
-            (
-                loc
-                for loc in project_data["locations"].values()
-                if loc.parent == district and loc.code == row["admin3pcode"] and loc.level == 3
-            ),
-            None,
-        )
+        zone = _get_child_location(project_data, district, 3, row["admin3pcode"])
         # if not zone:
         #     errors.append(
         #         IMPORT_ERRORS["location_missing"].format(line=line_num, level="Zone", code=row["admin3pcode"])
@@ -252,6 +243,7 @@ def import_activity_plans(request, pk):
                 CashInKindDetail.objects.bulk_create(cash_in_kind_details)
                 TargetLocation.objects.bulk_create(target_locations)
                 DisaggregationLocation.objects.bulk_create(disaggregation_locations)
+                schedule_organization_stats_refresh(project_ids=[project.pk], locations=True)
 
             messages.success(request, "Activities imported successfully.")
 
@@ -412,6 +404,7 @@ def cluster_projects_list(request, cluster: str):
                 cluster,
             ]
         )
+        .distinct()
         .select_related("organization", "user")
         .only(
             "id",
@@ -431,33 +424,12 @@ def cluster_projects_list(request, cluster: str):
         .order_by("-updated_at"),
     )
 
-    # Setup Pagination
-    RECORDS_PER_PAGE = Setting.get("RECORDS_PER_PAGE", default=10)
-    per_page = request.GET.get("per_page", RECORDS_PER_PAGE)
-    p = Paginator(project_filter.qs, per_page=per_page)
-    page = request.GET.get("page", 1)
-    p_projects = p.get_page(page)
-    p_projects.adjusted_elided_pages = p.get_elided_page_range(page)
-
-    projects = Project.objects.filter(
-        clusters__in=[
-            cluster,
-        ]
-    ).aggregate(
-        projects_count=Count("id"),
-        draft_projects_count=Count("id", filter=Q(state="draft")),
-        active_projects_count=Count("id", filter=Q(state="in-progress")),
-        completed_projects_count=Count("id", filter=Q(state="completed")),
-        archived_projects_count=Count("id", filter=Q(state="archived")),
-    )
+    # Setup Pagination and the projects counters
+    p_projects, counters = paginate_projects(request, project_filter, scope=f"cluster:{cluster.pk}")
 
     context = {
         "projects": p_projects,
-        "projects_count": projects["projects_count"],
-        "draft_projects_count": projects["draft_projects_count"],
-        "active_projects_count": projects["active_projects_count"],
-        "completed_projects_count": projects["completed_projects_count"],
-        "archived_projects_count": projects["archived_projects_count"],
+        **counters,
         "project_filter": project_filter,
     }
 
@@ -470,12 +442,11 @@ def users_clusters_projects_list(request):
     """List Projects for user's cluster
     url: /projects/clusters
     """
-    user_clusters = request.user.profile.clusters.all()
-
     project_filter = ProjectsFilter(
         request.GET,
         request=request,
-        queryset=Project.objects.filter(clusters__in=user_clusters)
+        queryset=Project.objects.filter(clusters__in=request.user.profile.cluster_ids)
+        .distinct()
         .select_related("organization", "user")
         .only(
             "id",
@@ -495,29 +466,13 @@ def users_clusters_projects_list(request):
         .order_by("-updated_at"),
     )
 
-    # Setup Pagination
-    RECORDS_PER_PAGE = Setting.get("RECORDS_PER_PAGE", default=10)
-    per_page = request.GET.get("per_page", RECORDS_PER_PAGE)
-    p = Paginator(project_filter.qs, per_page=per_page)
-    page = request.GET.get("page", 1)
-    p_projects = p.get_page(page)
-    p_projects.adjusted_elided_pages = p.get_elided_page_range(page)
-
-    projects = Project.objects.filter(clusters__in=user_clusters).aggregate(
-        projects_count=Count("id"),
-        draft_projects_count=Count("id", filter=Q(state="draft")),
-        active_projects_count=Count("id", filter=Q(state="in-progress")),
-        completed_projects_count=Count("id", filter=Q(state="completed")),
-        archived_projects_count=Count("id", filter=Q(state="archived")),
-    )
+    # Setup Pagination and the projects counters
+    clusters_scope = ",".join(str(pk) for pk in sorted(request.user.profile.cluster_ids))
+    p_projects, counters = paginate_projects(request, project_filter, scope=f"clusters:{clusters_scope}")
 
     context = {
         "projects": p_projects,
-        "projects_count": projects["projects_count"],
-        "draft_projects_count": projects["draft_projects_count"],
-        "active_projects_count": projects["active_projects_count"],
-        "completed_projects_count": projects["completed_projects_count"],
-        "archived_projects_count": projects["archived_projects_count"],
+        **counters,
         "project_filter": project_filter,
     }
 
@@ -547,16 +502,12 @@ def org_projects_list(request):
         .order_by("-updated_at"),
     )
 
-    # Setup Pagination
-    RECORDS_PER_PAGE = Setting.get("RECORDS_PER_PAGE", default=10)
-    per_page = request.GET.get("per_page", RECORDS_PER_PAGE)
-    p = Paginator(project_filter.qs, per_page=per_page)
-    page = request.GET.get("page", 1)
-    p_projects = p.get_page(page)
-    p_projects.adjusted_elided_pages = p.get_elided_page_range(page)
+    # Setup Pagination and the projects counters
+    p_projects, counters = paginate_projects(request, project_filter, scope=f"organization:{user_org.pk}")
 
     context = {
         "projects": p_projects,
+        **counters,
         "project_filter": project_filter,
     }
 
@@ -761,52 +712,21 @@ def copy_project(request, pk):
             new_project.programme_partners.set(project.programme_partners.all())
             new_project.implementing_partners.set(project.implementing_partners.all())
 
-            # Copy ActivityPlan
-            original_activity_plans = project.activityplan_set.all()
-            new_activity_plans = []
-            for plan in original_activity_plans:
-                new_plan = copy(plan)
-                new_plan.pk = None
-                new_plan.project = new_project
-
-                new_activity_plans.append(new_plan)
-
-            new_activity_plans = ActivityPlan.objects.bulk_create(new_activity_plans)
-
-            activity_plan_mapping = {}
-            for old_plan, new_plan in zip(original_activity_plans, new_activity_plans):
-                activity_plan_mapping[old_plan.pk] = new_plan.pk
-
-            # Copy TargetLocation
-            original_target_locations = list(TargetLocation.objects.filter(activity_plan__project=project))
-            new_target_locations = []
-            for location in original_target_locations:
-                new_location = copy(location)
-                new_location.pk = None
-                new_location.project = new_project
-                new_location.activity_plan_id = activity_plan_mapping[location.activity_plan_id]
-
-                new_target_locations.append(new_location)
-
-            new_target_locations = TargetLocation.objects.bulk_create(new_target_locations)
-
-            target_location_mapping = {}
-            for old, new in zip(original_target_locations, new_target_locations):
-                target_location_mapping[old.id] = new.id
-
-            # Copy DisaggregationLocation
-            original_disagg_locations = DisaggregationLocation.objects.filter(
-                target_location__in=original_target_locations
+            # Copy the activity plans with their cash and in-kind details, target locations and disaggregations
+            activity_plans = bulk_clone(project.activityplan_set.all(), values={"project_id": new_project.pk})
+            bulk_clone(
+                CashInKindDetail.objects.filter(activity_plan__project=project),
+                parents={"activity_plan_id": activity_plans},
+            )
+            target_locations = bulk_clone(
+                TargetLocation.objects.filter(activity_plan__project=project),
+                values={"project_id": new_project.pk},
+                parents={"activity_plan_id": activity_plans},
+            )
+            bulk_clone(
+                DisaggregationLocation.objects.filter(target_location__activity_plan__project=project),
+                parents={"target_location_id": target_locations},
             )
-            new_disagg_locations = []
-            for disagg_location in original_disagg_locations:
-                new_disagg_location = copy(disagg_location)
-                new_disagg_location.pk = None
-                new_disagg_location.target_location_id = target_location_mapping[disagg_location.target_location_id]
-
-                new_disagg_locations.append(new_disagg_location)
-
-            DisaggregationLocation.objects.bulk_create(new_disagg_locations)
     except Exception as e:
         messages.error(request, f"Error duplicating project : {str(e)}")
         return HttpResponse(500)
@@ -857,12 +777,7 @@ def cluster_users(request, cluster: str):
         .order_by("-last_login"),
     )
 
-    RECORDS_PER_PAGE = Setting.get("RECORDS_PER_PAGE", default=10)
-    per_page = request.GET.get("per_page", RECORDS_PER_PAGE)
-    paginator = Paginator(users_filter.qs, per_page=per_page)
-    page_number = request.GET.get("page", 1)
-    paginated_users = paginator.get_page(page_number)
-    paginated_users.adjusted_elided_pages = paginator.get_elided_page_range(page_number)
+    paginated_users = paginate(request, users_filter.qs, key="profile__updated_at")
 
     users = User.objects.filter(profile__clusters=cl).aggregate(
         users_count=Count("id"),
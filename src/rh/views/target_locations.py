@@ -9,7 +9,8 @@ from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.views.decorators.http import require_http_methods
 from django_htmx.http import HttpResponseClientRedirect
-from extra_settings.models import Setting
+
+from core.settings_snapshot import get_setting
 
 from ..filters import TargetLocationFilter
 from ..forms import (
@@ -214,7 +215,7 @@ def list_target_locations(request, project):
         project=project,
     )
 
-    RECORDS_PER_PAGE = Setting.get("RECORDS_PER_PAGE", default=10)
+    RECORDS_PER_PAGE = get_setting("RECORDS_PER_PAGE", default=10)
     per_page = request.GET.get("per_page", RECORDS_PER_PAGE)
     paginator = Paginator(tl_filter.qs, per_page=per_page)
     page = request.GET.get("page", 1)
@@ -2,7 +2,7 @@ import json
 
 from django.contrib.auth.decorators import login_required
 from django.core.cache import cache
-from django.db.models import Count, Prefetch
+from django.db.models import Prefetch
 from django.http import JsonResponse
 from django.shortcuts import render
 from django.views.decorators.cache import cache_page
@@ -10,7 +10,9 @@ from django.views.decorators.cache import cache_page
 from project_reports.models import ProjectMonthlyReport
 from users.decorators import unauthenticated_user
 
-from ..models import ActivityDomain, ActivityType, Cluster, Indicator, Location, Project, TargetLocation
+from .. import reference_data
+from ..models import ActivityDomain, Cluster, Project
+from ..utils import get_organization_stats
 
 
 def test_email(request, template_name):
@@ -52,30 +54,14 @@ def home(request):
         .distinct()
     )
 
-    counts_cache_key = f"home_projects_counts_{user_org.code}"
-    projects_counts = cache.get(counts_cache_key)
-    if projects_counts is None:
-        projects_counts = (
-            Project.objects.filter(state="in-progress")
-            .filter(organization=user_org)
-            .aggregate(
-                implementing_partners_count=Count("implementing_partners", distinct=True),
-                activity_plans_count=Count("activityplan", distinct=True),
-                # TODO: optimize this part. It takes too much time and gunicorn timesout
-                # target_locations_count=Count("targetlocation__district"),
-            )
-        )
-        cache.set(counts_cache_key, projects_counts, timeout=60 * 60)  # Cache for 1 hour
-
-    projects_counts["pending_reports_count"] = pending_reports.count()
-
-    projects_counts["target_locations_count"] = (
-        TargetLocation.objects.filter(project__organization=user_org, project__state="in-progress")
-        .order_by()
-        .values("district")
-        .distinct()
-        .count()
-    )
+    # The counters are maintained by the projects, activity plans, locations and reports changes
+    stats = get_organization_stats(user_org)
+    projects_counts = {
+        "implementing_partners_count": stats.implementing_partners_count,
+        "activity_plans_count": stats.activity_plans_count,
+        "target_locations_count": stats.target_locations_count,
+        "pending_reports_count": stats.pending_reports_count,
+    }
 
     context = {"active_projects": active_projects, "counts": projects_counts, "pending_reports": pending_reports}
 
@@ -92,7 +78,8 @@ def landing_page(request):
 
 @login_required
 def get_locations_details(request):
-    parents = Location.objects.filter(pk=list(request.GET.values())[0]).select_related("parent")
+    parent = reference_data.get_reference_index("locations", "pk").get(int(list(request.GET.values())[0]))
+    parents = [(parent, reference_data.get_location_children(parent.pk))] if parent else []
     return render(request, "rh/target_locations/_location_select_options.html", {"parents": parents})
 
 
@@ -105,11 +92,9 @@ def get_activity_domain_types(request):
     activity_domain_pk = request.GET.get("activity_domain")
 
     if activity_domain_pk:
-        activity_types = ActivityType.objects.filter(activity_domain=activity_domain_pk, is_active=True).order_by(
-            "name"
-        )
+        activity_types = reference_data.get_activity_domain_types(int(activity_domain_pk))
     else:
-        activity_types = ActivityType.objects.none()
+        activity_types = []
 
     return render(request, "rh/activity_plans/_select_options.html", {"options": activity_types})
 
@@ -123,9 +108,9 @@ def get_activity_type_indicators(request):
     activity_type_pk = request.GET.get("activity_type")
 
     if activity_type_pk:
-        indicators = Indicator.objects.filter(activity_types=activity_type_pk, is_active=True).order_by("name")
+        indicators = reference_data.get_activity_type_indicators(int(activity_type_pk))
     else:
-        indicators = Indicator.objects.none()
+        indicators = []
 
     return render(request, "rh/activity_plans/_select_options.html", {"options": indicators})
 
@@ -0,0 +1,5 @@
+// Draw the plotly figures specs of the page, see core/charts.py
+for (const element of document.querySelectorAll("[data-plotly-figure]")) {
+    const figure = JSON.parse(element.dataset.plotlyFigure);
+    Plotly.newPlot(element, figure.data, figure.layout, { responsive: true });
+}
@@ -33,10 +33,27 @@ L.control.zoom({ position: "bottomleft" }).addTo(map);
 const locationList = document.querySelector(".location-select");
 targetLocationUrl = document.getElementById("map").getAttribute('data-locations-url')
 
+// Payload: {projects: {id: code}, districts: [[id, name, code, province, lat, long, [[id, project id, facility name]]]]}
 fetch(targetLocationUrl)
     .then(response => response.json())
     .then(data => {
-        data.locations.forEach(loc=> {
+        const locations = data.districts.map(([district_id, district_name, district_code, province_name, district_lat, district_long, target_locations]) => ({
+            district_id,
+            district_name,
+            district_code,
+            province_name,
+            district_lat,
+            district_long,
+            location_count: target_locations.length,
+            target_locations: target_locations.map(([id, project_id, facility_name]) => ({
+                id,
+                project_id,
+                project_code: data.projects[project_id],
+                facility_name,
+            })),
+        }));
+
+        locations.forEach(loc=> {
             location_name = loc.district_name
             lat = loc.district_lat
             long = loc.district_long
@@ -82,7 +99,7 @@ fetch(targetLocationUrl)
             }
 
             const template = `
-                <div class="location-item px-2 font-medium border border-gray-f5 py-2 cursor-pointer flex justify-between" data-tl-id="${loc.id}" data-lat="${lat}" data-long="${long}">
+                <div class="location-item px-2 font-medium border border-gray-f5 py-2 cursor-pointer flex justify-between" data-tl-id="${loc.district_id}" data-lat="${lat}" data-long="${long}">
                     <span class="flex-wrap">${loc.province_name}, ${location_name} <em>(${loc.district_code})</em></span>
                     <span class="rounded-full bg-gray-f5 px-2 py-1">${loc.location_count}</span>
                 </div>
@@ -92,8 +109,8 @@ fetch(targetLocationUrl)
         });
         
         // Adjust map view to fit all markers
-        if (data.locations.length > 0) {
-            const bounds = L.latLngBounds(data.locations.map(loc => [loc.district_lat, loc.district_long]));
+        if (locations.length > 0) {
+            const bounds = L.latLngBounds(locations.map(loc => [loc.district_lat, loc.district_long]));
             map.fitBounds(bounds);
         }
     }).then(()=>{
@@ -102,8 +102,7 @@ function exportButton(event) {
 		body: JSON.stringify(selected_project_list),
 	})
 		.then((response) => {
-			console.log(response);
-			if (response.status === 200 && response.ok === true) {
+			if (response.ok === true) {
 				if (fileFormat === "csv" || fileFormat === "json") {
 					return response.blob();
 				}
@@ -128,13 +127,16 @@ function exportButton(event) {
 				document.body.removeChild(link);
 				window.URL.revokeObjectURL(url);
 			} else if (fileFormat === "xlsx") {
-				const link = document.createElement("a");
-				link.href = data.file_url; // Use the base64-encoded URL
-				link.download = data.file_name; // Set the filename for download
-				// Append the link to the body, click it to start download, and then remove it
-				document.body.appendChild(link);
-				link.click();
-				document.body.removeChild(link);
+				// Excel files are generated by a background export job
+				return waitForExportJob(data).then((job) => {
+					const link = document.createElement("a");
+					link.href = job.file_url;
+					link.download = job.file_name; // Set the filename for download
+					// Append the link to the body, click it to start download, and then remove it
+					document.body.appendChild(link);
+					link.click();
+					document.body.removeChild(link);
+				});
 			}
 		})
 		.catch((error) => {
@@ -147,3 +149,17 @@ function exportButton(event) {
 		});
 }
 
+
+// poll the export job status until its file is generated
+function waitForExportJob(job, interval = 2000) {
+	if (job.state === "completed") {
+		return Promise.resolve(job);
+	}
+	if (job.state === "failed") {
+		return Promise.reject(Error(job.error));
+	}
+	return new Promise((resolve) => setTimeout(resolve, interval))
+		.then(() => fetch(job.status_url))
+		.then((response) => response.json())
+		.then((data) => waitForExportJob(data, interval));
+}
@@ -5,3 +5,7 @@ class StockConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "stock"
     verbose_name = "Stock Management"
+
+    def ready(self):
+        # ruff: noqa
+        import stock.signals
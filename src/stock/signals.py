@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rh.utils import invalidate_dashboard_cache
+
+from .models import StockMonthlyReport, StockReport, Warehouse
+
+
+def invalidate_stock_dashboard(organization_ids):
+    """Invalidate the cached stock dashboards of the organizations"""
+    invalidate_dashboard_cache([f"stock:{organization_id}" for organization_id in set(organization_ids)])
+
+
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+def post_change_warehouse(sender, instance, **kwargs):
+    invalidate_stock_dashboard([instance.organization_id])
+
+
+@receiver(post_save, sender=StockMonthlyReport)
+@receiver(post_delete, sender=StockMonthlyReport)
+def post_change_stock_monthly_report(sender, instance, **kwargs):
+    invalidate_stock_dashboard(
+        Warehouse.objects.filter(pk=instance.warehouse_location_id).values_list("organization_id", flat=True)
+    )
+
+
+@receiver(post_save, sender=StockReport)
+@receiver(post_delete, sender=StockReport)
+def post_change_stock_report(sender, instance, **kwargs):
+    invalidate_stock_dashboard(
+        Warehouse.objects.filter(stockmonthlyreport=instance.monthly_report_id).values_list(
+            "organization_id", flat=True
+        )
+    )
@@ -1 +1,43 @@
-# Create your tests here.
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rh.models import Organization
+from rh.utils import get_dashboard_cache_stats
+from stock.models import StockMonthlyReport, StockReport, Warehouse
+from users.models import Profile
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestStockDashboardCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        organization = Organization.objects.create(name="immap", code="immap")
+        user = User.objects.create_user(username="testuser", password="testpassword")
+        Profile.objects.create(user=user, organization=organization)
+
+        warehouse = Warehouse.objects.create(organization=organization, user=user, name="Kabul")
+        self.monthly_report = StockMonthlyReport.objects.create(
+            warehouse_location=warehouse, state="submitted", from_date=datetime.datetime(2024, 1, 1)
+        )
+        StockReport.objects.create(monthly_report=self.monthly_report, qty_in_stock=10, beneficiary_coverage=5)
+
+        self.client.force_login(user)
+
+    def test_cache_is_invalidated_on_stock_report_change(self):
+        url = reverse("stock-dashboard")
+
+        response = self.client.get(url)
+        self.assertEqual(response.context["data"]["total_stock"], 10)
+        self.client.get(url)
+        self.assertEqual(get_dashboard_cache_stats()["stock_dashbaord"], {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StockReport.objects.create(monthly_report=self.monthly_report, qty_in_stock=5)
+
+        response = self.client.get(url)
+        self.assertEqual(response.context["data"]["total_stock"], 15)
+        self.assertEqual(get_dashboard_cache_stats()["stock_dashbaord"]["misses"], 2)
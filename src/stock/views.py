@@ -7,7 +7,6 @@ import plotly.express as px
 import plotly.graph_objects as go
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.db.models import Count, Prefetch, Sum
 from django.db.models.functions import Coalesce
 from django.http import HttpResponse
@@ -15,8 +14,10 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.utils.safestring import mark_safe
 from django_htmx.http import HttpResponseClientRedirect
-from extra_settings.models import Setting
 
+from core.charts import get_chart_spec
+from core.pagination import paginate
+from rh.utils import get_cached_dashboard_data, normalize_filter_params
 from stock.filter import StockDashboardFilter, StockFilter, StockMonthlyReportFilter, StockReportFilter
 from stock.utils import write_csv_columns_and_rows
 
@@ -43,13 +44,7 @@ def stock_index_view(request):
         request.GET,
         queryset=warehouse_queryset,
     )
-    RECORDS_PER_PAGE = Setting.get("RECORDS_PER_PAGE", default=10)
-
-    per_page = request.GET.get("per_page", RECORDS_PER_PAGE)
-    paginator = Paginator(ap_filter.qs, per_page=per_page)  # Show 10 activity plans per page
-    page = request.GET.get("page", 1)
-    w_locations = paginator.get_page(page)
-    w_locations.adjusted_elided_pages = paginator.get_elided_page_range(page)
+    w_locations = paginate(request, ap_filter.qs)
 
     context = {
         "organization": user_org,
@@ -152,13 +147,7 @@ def stock_report_period_list(request, pk):
         request.GET,
         queryset=StockMonthlyReport.objects.filter(warehouse_location=warehouse).order_by("-updated_at"),
     )
-    RECORDS_PER_PAGE = Setting.get("RECORDS_PER_PAGE", default=10)
-
-    per_page = request.GET.get("per_page", RECORDS_PER_PAGE)
-    paginator = Paginator(ap_filter.qs, per_page=per_page)  # Show 10 activity plans per page
-    page = request.GET.get("page", 1)
-    reports = paginator.get_page(page)
-    reports.adjusted_elided_pages = paginator.get_elided_page_range(page)
+    reports = paginate(request, ap_filter.qs)
 
     context = {
         "stock_reports": reports,
@@ -178,13 +167,7 @@ def stock_details_view(request, pk):
         request.GET,
         queryset=StockReport.objects.filter(monthly_report=monthly_reports).order_by("-updated_at"),
     )
-    RECORDS_PER_PAGE = Setting.get("RECORDS_PER_PAGE", default=10)
-
-    per_page = request.GET.get("per_page", RECORDS_PER_PAGE)
-    paginator = Paginator(ap_filter.qs, per_page=per_page)  # Show 10 activity plans per page
-    page = request.GET.get("page", 1)
-    stock_report_details = paginator.get_page(page)
-    stock_report_details.adjusted_elided_pages = paginator.get_elided_page_range(page)
+    stock_report_details = paginate(request, ap_filter.qs)
     context = {
         "stock_report": monthly_reports,
         "stock_report_details": stock_report_details,
@@ -404,7 +387,36 @@ def stock_dashbaord(request):
     )
 
     warehouses_filter = StockDashboardFilter(request.GET, queryset=ware, request=request)
-    warehouses = warehouses_filter.qs
+
+    # The aggregates are cached per organization and filter, see `stock.signals`
+    dashboard_data = get_cached_dashboard_data(
+        view="stock_dashbaord",
+        scopes=[f"stock:{request.user.profile.organization_id}"],
+        params=normalize_filter_params(request.GET, warehouses_filter.filters),
+        compute=lambda: get_stock_dashboard_data(warehouses_filter.qs),
+    )
+
+    # The charts specs are cached per data, the pages draw them with the shared plotly.js bundle
+    bar_chart = get_chart_spec(
+        "stock_warehouses_beneficiary", dashboard_data["warehouse_beneficiary"], get_warehouses_beneficiary_chart
+    )
+    line_chart = get_chart_spec(
+        "stock_monthly_beneficiary", dashboard_data["months_beneficiary"], get_monthly_beneficiary_chart
+    )
+    clusters_chart = get_chart_spec("stock_clusters", dashboard_data["clusters"], get_clusters_stock_chart)
+
+    context = {
+        "bar_chart": bar_chart,
+        "pie_chart": clusters_chart,
+        "line_chart": line_chart,
+        "data": dashboard_data["data"],
+        "warehouse_filter": warehouses_filter,
+    }
+    return render(request, "stock/stock_dashboard.html", context)
+
+
+def get_stock_dashboard_data(warehouses) -> dict:
+    """Aggregate the stock reports of the filtered warehouses for the dashboard counters and charts"""
     # Prepare the aggregated data for the response.
     data_calculate = {
         "total_beneficiary_coverage": warehouses.aggregate(
@@ -490,7 +502,25 @@ def stock_dashbaord(request):
     number_in_pipeline = list(cluster_pipeline_list.values())
     beneficiary_coverage = list(clusters_beneficiary_dict.values())
 
-    df = pd.DataFrame(warehouse_beneficiary)
+    data_calculate["total_cluster"] = total_clusters
+    return {
+        "data": data_calculate,
+        "warehouse_beneficiary": warehouse_beneficiary,
+        "months_beneficiary": {
+            "months": list(months_beneficiary.keys()),
+            "beneficiary": list(months_beneficiary.values()),
+        },
+        "clusters": {
+            "clusters": clusters,
+            "in_stock": number_in_stock,
+            "in_pipeline": number_in_pipeline,
+            "beneficiary_coverage": beneficiary_coverage,
+        },
+    }
+
+
+def get_warehouses_beneficiary_chart(data):
+    df = pd.DataFrame(data)
     fig = px.bar(df, x="warehouse_name", y="total_beneficiary")
 
     fig.update_traces(marker=dict(color="#a52824"))
@@ -507,12 +537,16 @@ def stock_dashbaord(request):
             },
         },
     )
+    return fig
+
+
+def get_monthly_beneficiary_chart(data):
     # Line chart
     # Create the DataFrame for the line chart using pd.Series constructor
     df = pd.DataFrame(
         {
-            "x": pd.Series(months_beneficiary.keys()).fillna("unknown"),
-            "y": pd.Series(months_beneficiary.values()).fillna(0),
+            "x": pd.Series(data["months"]).fillna("unknown"),
+            "y": pd.Series(data["beneficiary"]).fillna(0),
         }
     )
     df = df.sort_values(by="y")
@@ -539,13 +573,16 @@ def stock_dashbaord(request):
         mode="lines+markers",
         hovertemplate="<b>Month:</b> %{x}<br><b>Beneficiary:</b> %{y}<br><extra></extra>",
     )
+    return line_chart
+
 
+def get_clusters_stock_chart(data):
     fig2 = go.Figure()
     # Plot each metric as a line
     fig2.add_trace(
         go.Scatter(
-            x=clusters,
-            y=number_in_stock,
+            x=data["clusters"],
+            y=data["in_stock"],
             mode="lines+markers",
             name="Quantity in Stock",
             hovertemplate="<b>cluster:</b> %{x}<br><b>quantity in stock:</b> %{y}<br><extra></extra>",
@@ -554,8 +591,8 @@ def stock_dashbaord(request):
     )
     fig2.add_trace(
         go.Scatter(
-            x=clusters,
-            y=number_in_pipeline,
+            x=data["clusters"],
+            y=data["in_pipeline"],
             mode="lines+markers",
             name="Quantity in Pipeline",
             hovertemplate="<b>cluster:</b> %{x}<br><b>quantity in pipeline:</b> %{y}<br><extra></extra>",
@@ -564,8 +601,8 @@ def stock_dashbaord(request):
     )
     fig2.add_trace(
         go.Scatter(
-            x=clusters,
-            y=beneficiary_coverage,
+            x=data["clusters"],
+            y=data["beneficiary_coverage"],
             mode="lines+markers",
             name="Beneficiary Coverage",
             hovertemplate="<b>cluster:</b> %{x}<br><b>beneficiary coverage:</b> %{y}<br><extra></extra>",
@@ -588,15 +625,7 @@ def stock_dashbaord(request):
             },
         },
     )
-    data_calculate["total_cluster"] = total_clusters
-    context = {
-        "bar_chart": fig.to_html(),
-        "pie_chart": fig2.to_html(),
-        "line_chart": line_chart.to_html(),
-        "data": data_calculate,
-        "warehouse_filter": warehouses_filter,
-    }
-    return render(request, "stock/stock_dashboard.html", context)
+    return fig2
 
 
 def export_org_stock_beneficiary(request):
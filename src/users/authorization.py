@@ -0,0 +1,109 @@
+"""Authorization context of the users.
+
+The permissions, groups, lead clusters and profile organization, country and clusters of a user are
+loaded in one `AuthContext`, memoized on the user object for the request and cached for
+`AUTH_CONTEXT_TIMEOUT` seconds across the requests. The cached contexts are deleted by the groups,
+permissions, users and profiles changes (see `users.signals`).
+"""
+
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .models import Profile
+
+AUTH_CONTEXT_TIMEOUT = 60 * 5  # 5 minutes
+
+# Bumped when the cached data changes
+AUTH_CONTEXT_VERSION = 2
+
+CLUSTER_LEADS_SUFFIX = "_CLUSTER_LEADS"
+
+
+class AuthContext:
+    """Authorization data of a user, built from the cached values of `load_auth_context`"""
+
+    def __init__(self, data: dict):
+        self.permissions = set(data["permissions"])
+        self.groups = set(data["groups"])
+        # Upper case codes of the clusters the user is lead of
+        self.lead_clusters = {
+            group[: -len(CLUSTER_LEADS_SUFFIX)] for group in self.groups if group.endswith(CLUSTER_LEADS_SUFFIX)
+        }
+        self.profile_id = data["profile_id"]
+        self.organization_id = data["organization_id"]
+        self.country_id = data["country_id"]
+        self.clusters = set(data["clusters"])
+        self.cluster_ids = list(data["cluster_ids"])
+
+    def is_cluster_lead(self, clusters) -> bool:
+        """Whether the user is lead of at least one of the clusters codes"""
+        return any(cluster.upper() in self.lead_clusters for cluster in clusters)
+
+    @property
+    def lead_cluster_codes(self) -> list:
+        return sorted(cluster.lower() for cluster in self.lead_clusters)
+
+
+ANONYMOUS_DATA = {
+    "permissions": [],
+    "groups": [],
+    "profile_id": None,
+    "organization_id": None,
+    "country_id": None,
+    "clusters": [],
+    "cluster_ids": [],
+}
+
+
+def _auth_context_key(user_id: int) -> str:
+    return f"auth_context:{AUTH_CONTEXT_VERSION}:{user_id}"
+
+
+def load_auth_context(user) -> dict:
+    """Query the authorization data of a user"""
+    profile = Profile.objects.filter(user=user).values("pk", "organization_id", "country_id").first() or {}
+    clusters = list(
+        Profile.clusters.through.objects.filter(profile__user=user).values_list("cluster_id", "cluster__code")
+    )
+    return {
+        "permissions": sorted(ModelBackend().get_all_permissions(user)),
+        "groups": list(user.groups.values_list("name", flat=True)),
+        "profile_id": profile.get("pk"),
+        "organization_id": profile.get("organization_id"),
+        "country_id": profile.get("country_id"),
+        "clusters": [code for _, code in clusters],
+        "cluster_ids": [pk for pk, _ in clusters],
+    }
+
+
+def get_auth_context(user) -> AuthContext:
+    """Return the authorization context of a user, from the user object, the cache or the database"""
+    if not user.is_authenticated:
+        return AuthContext(ANONYMOUS_DATA)
+
+    context = getattr(user, "_auth_context", None)
+    if context is None:
+        key = _auth_context_key(user.pk)
+        data = cache.get(key)
+        if data is None:
+            data = load_auth_context(user)
+            cache.set(key, data, timeout=AUTH_CONTEXT_TIMEOUT)
+        context = user._auth_context = AuthContext(data)
+    return context
+
+
+def invalidate_auth_context(user_ids):
+    """Delete the cached authorization contexts of the users"""
+    cache.delete_many([_auth_context_key(user_id) for user_id in user_ids if user_id])
+
+
+def prime_user_caches(user):
+    """Fill the permissions cache of `ModelBackend` and the profile cluster ids from the authorization
+    context, so the `user.has_perm()`, templates `perms` and profile clusters checks run no query"""
+    if user.is_authenticated and user.is_active:
+        context = get_auth_context(user)
+        user._perm_cache = context.permissions
+        profile = getattr(user, "profile", None)
+        if profile is not None:
+            profile.cluster_ids = context.cluster_ids
+    return user
@@ -4,6 +4,24 @@ from django.contrib.auth.backends import ModelBackend
 UserModel = get_user_model()
 
 
+def get_user_with_profile(user_id):
+    """Load a user with its profile, profile organization and country in one joined query"""
+    try:
+        return UserModel._default_manager.select_related("profile__organization", "profile__country").get(pk=user_id)
+    except UserModel.DoesNotExist:
+        return None
+
+
+class ProfileBackend(ModelBackend):
+    """
+    Username and password authentication backend loading the session user with its profile.
+    """
+
+    def get_user(self, user_id):
+        user = get_user_with_profile(user_id)
+        return user if user and self.user_can_authenticate(user) else None
+
+
 class EmailBackend(ModelBackend):
     """
     Custom authentication backend that allows users to authenticate using their email and password.
@@ -47,8 +65,4 @@ class EmailBackend(ModelBackend):
         Returns:
             User: The user instance if found, None otherwise.
         """
-        UserModel = get_user_model()
-        try:
-            return UserModel.objects.get(pk=user_id)
-        except UserModel.DoesNotExist:
-            return None
+        return get_user_with_profile(user_id)
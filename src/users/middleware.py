@@ -0,0 +1,30 @@
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.middleware import get_user
+from django.utils.functional import SimpleLazyObject
+
+from .authorization import prime_user_caches
+
+# Backends of the sessions opened before ProfileBackend, and the backend loading their user now
+PREVIOUS_SESSION_BACKENDS = {
+    "django.contrib.auth.backends.ModelBackend": "users.backends.ProfileBackend",
+}
+
+
+class AuthContextMiddleware:
+    """Serve the permissions checks of the request user from its cached authorization context.
+    Must be after `AuthenticationMiddleware`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user = SimpleLazyObject(lambda: prime_user_caches(get_user(self.migrate_session_backend(request))))
+        return self.get_response(request)
+
+    def migrate_session_backend(self, request):
+        """Move the sessions of a previous backend to its replacement, which is the only one configured"""
+        backend = request.session.get(BACKEND_SESSION_KEY)
+        if backend in PREVIOUS_SESSION_BACKENDS:
+            request.session[BACKEND_SESSION_KEY] = PREVIOUS_SESSION_BACKENDS[backend]
+        return request
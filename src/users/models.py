@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils.functional import cached_property
 
 from rh.models import Cluster, Location, Organization
 
@@ -33,6 +34,11 @@ class Profile(models.Model):
         "Returns the person's full name."
         return f"{self.user.first_name} {self.user.last_name}"
 
+    @cached_property
+    def cluster_ids(self) -> list:
+        """Ids of the profile clusters, filled from the authorization context for the request user"""
+        return list(self.clusters.values_list("pk", flat=True))
+
     def __str__(self):
         return f"{self.name}'s Profile"
 
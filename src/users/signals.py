@@ -1,7 +1,11 @@
-from django.contrib.auth.models import User
-from django.db.models.signals import post_save, pre_save
+from django.contrib.auth.models import Group, User
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
+from rh.models import Cluster
+
+from .authorization import invalidate_auth_context
 from .models import Profile
 
 
@@ -21,3 +25,41 @@ def pre_save_profile(sender, instance, **kwargs):
 def create_profile(sender, instance, created, **kwargs):
     if created and instance.is_superuser:
         Profile.objects.create(user=instance)
+
+
+def _users_of(model, pks):
+    """Ids of the users of the users, profiles, groups, permissions or clusters"""
+    if model is User:
+        return list(pks)
+    if model is Profile:
+        return Profile.objects.filter(pk__in=pks).values_list("user_id", flat=True)
+    if model is Cluster:
+        return Profile.objects.filter(clusters__in=pks).values_list("user_id", flat=True)
+    if model is Group:
+        return User.objects.filter(groups__in=pks).values_list("pk", flat=True)
+    return User.objects.filter(Q(user_permissions__in=pks) | Q(groups__permissions__in=pks)).values_list(
+        "pk", flat=True
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def authorization_changed(sender, instance, **kwargs):
+    # The active and superuser flags, the profile organization and country, the cluster leads groups names
+    invalidate_auth_context([instance.user_id] if sender is Profile else _users_of(sender, [instance.pk]))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(m2m_changed, sender=Profile.clusters.through)
+def authorization_relations_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    # The users of the instance are changed, or the users of the added or removed objects on the reverse side
+    if action in ["post_add", "post_remove"] and reverse:
+        invalidate_auth_context(_users_of(model, pk_set))
+    elif action in ["post_add", "post_remove", "pre_clear"]:
+        invalidate_auth_context(_users_of(type(instance), [instance.pk]))
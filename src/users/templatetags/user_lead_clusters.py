@@ -2,6 +2,7 @@ from django import template
 from django.contrib.auth.models import User
 
 from rh.models import Cluster
+from users.authorization import get_auth_context
 
 register = template.Library()
 
@@ -11,8 +12,4 @@ def user_lead_clusters(user: User) -> Cluster:
     if not isinstance(user, User) or not user.is_authenticated:
         return Cluster.objects.none()
 
-    user_groups = user.groups.filter(name__endswith="_CLUSTER_LEADS")
-
-    cluster_ids = [group.name.split("_")[0].lower() for group in user_groups]
-
-    return Cluster.objects.filter(code__in=cluster_ids)
+    return Cluster.objects.filter(code__in=get_auth_context(user).lead_cluster_codes)
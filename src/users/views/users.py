@@ -7,7 +7,6 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.models import Group, User
 from django.core.exceptions import PermissionDenied
-from django.core.paginator import Paginator
 from django.db.models import Count, Prefetch, Q
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
@@ -15,9 +14,9 @@ from django.template import loader
 from django.urls import reverse_lazy
 from django.views.decorators.http import require_http_methods
 from django_htmx.http import HttpResponseClientRedirect
-from extra_settings.models import Setting
-from openpyxl import Workbook
 
+from core.pagination import paginate
+from core.xlsx import XLSX_CONTENT_TYPE, create_workbook
 from rh.models import Cluster, Organization
 
 from ..forms import (
@@ -69,12 +68,7 @@ def org_users_list(request):
         .order_by("-last_login"),
     )
 
-    RECORDS_PER_PAGE = Setting.get("RECORDS_PER_PAGE", default=10)
-    per_page = request.GET.get("per_page", RECORDS_PER_PAGE)
-    paginator = Paginator(users_filter.qs, per_page=per_page)
-    page_number = request.GET.get("page", 1)
-    paginated_users = paginator.get_page(page_number)
-    paginated_users.adjusted_elided_pages = paginator.get_elided_page_range(page_number)
+    paginated_users = paginate(request, users_filter.qs, key="profile__updated_at")
 
     users = User.objects.filter(profile__organization=user_org).aggregate(
         users_count=Count("id"),
@@ -267,12 +261,12 @@ def export_organization_users(request):
                 users_list = users_filter.qs
 
         # define the excel workbook
-        workbook = Workbook()
+        workbook = create_workbook()
         write_users_sheet(workbook, users_list)
 
         # get today date
         today = date.today()
-        response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        response = HttpResponse(content_type=XLSX_CONTENT_TYPE)
         response["Content-Disposition"] = f'attachment; filename="{user_org}_users_{today}.xlsx"'
 
         # Save the workbook to the response
@@ -297,12 +291,12 @@ def export_cluster_users(request, cluster: str):
             .order_by("-last_login"),
         )
         # define the excel workbook
-        workbook = Workbook()
+        workbook = create_workbook()
         write_users_sheet(workbook, users_filter.qs)
 
         # get today date
         today = date.today()
-        response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        response = HttpResponse(content_type=XLSX_CONTENT_TYPE)
         response["Content-Disposition"] = f'attachment; filename="{cl}_users_{today}.xlsx"'
 
         # Save the workbook to the response